@@ -0,0 +1,407 @@
+"""
+Headless batch screener: runs the income and/or buy screens over a large ticker
+file, sharded across a process pool, and streams the results to JSON Lines or
+Parquet with a resumable checkpoint.
+
+    wtf-scan tickers.txt --mode income --out screens/income.jsonl
+    wtf-scan sp500.txt --mode all --out screens/nightly --format parquet --processes 8
+
+wtf-backtest replays the income screen over recorded snapshots instead (see
+backtest_main).
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pandas as pd
+import yaml
+
+from .services.backtest import run_backtest
+from .services.options_service import BUY_STRATEGIES, INCOME_STRATEGIES, run_scan
+from .utils.governor import REQUEST_STATS
+from .utils.market_data import configure_governor
+from .utils.providers import SnapshotProvider, SyntheticProvider, YahooProvider
+
+logger = logging.getLogger(__name__)
+
+MODES = {
+    'income': INCOME_STRATEGIES,
+    'buy': BUY_STRATEGIES,
+    'all': INCOME_STRATEGIES + BUY_STRATEGIES,
+}
+
+# Set in each worker process by _init_worker
+_provider = None
+
+def read_tickers(path):
+    """
+    Reads a ticker file: symbols separated by newlines and/or commas, '#' starts a
+    comment. Returns the upper-cased symbols in file order, without duplicates.
+    """
+    symbols = []
+    with open(path) as f:
+        for line in f:
+            line = line.split('#', 1)[0]
+            symbols.extend(s.strip().upper() for s in line.split(','))
+    return [s for s in dict.fromkeys(symbols) if s]
+
+def load_filters(config_path, overrides=()):
+    """
+    The config.yaml filters (upper-cased keys, as scans expect), with KEY=VALUE
+    overrides applied; values are parsed as YAML, so numbers stay numbers.
+    """
+    with open(config_path) as f:
+        config = yaml.safe_load(f)
+    filters = {key.upper(): value for key, value in config['filters'].items()}
+    for override in overrides:
+        key, sep, value = override.partition('=')
+        if not sep:
+            raise ValueError(f"Filter override {override!r} is not KEY=VALUE")
+        filters[key.strip().upper()] = yaml.safe_load(value)
+    return filters, config.get('scan', {})
+
+def make_provider(spec):
+    """
+    Builds a data provider from a picklable spec: ('yahoo',), ('replay', path) or
+    ('synthetic', seed).
+    """
+    kind = spec[0]
+    if kind == 'replay':
+        return SnapshotProvider(spec[1])
+    if kind == 'synthetic':
+        return SyntheticProvider(seed=spec[1])
+    return YahooProvider()
+
+def governor_settings(scan_config, processes=1):
+    """
+    configure_governor keyword arguments from the scan config section, with the
+    request rate and burst split evenly across processes, since each worker
+    process paces its own requests.
+    """
+    processes = max(processes or 1, 1)
+    rate = scan_config.get('rate_per_second')
+    burst = scan_config.get('burst')
+    return {
+        'rate_per_second': rate / processes if rate else None,
+        'burst': max(int(burst) // processes, 1) if burst else None,
+        'max_concurrency': scan_config.get('max_workers'),
+        'max_retries': scan_config.get('max_retries'),
+        'backoff': scan_config.get('backoff_seconds'),
+    }
+
+def _init_worker(provider_spec, log_level, governor=None):
+    global _provider
+    logging.basicConfig(level=log_level, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    _provider = make_provider(provider_spec)
+    if governor:
+        configure_governor(**governor)
+
+def _scan_shard(shard_index, ticker_symbols, strategies, filters, max_workers, context, repair_iv=False):
+    """
+    Runs one shard in a worker process. Returns (shard_index, table, stage_counts,
+    request_stats), where table stacks the result tables, each row tagged with the
+    result list it belongs to ('strategy'), and request_stats is run_scan's.
+    """
+    tickers = ','.join(ticker_symbols)
+    params = {
+        'putTickers': tickers,
+        'callTickers': tickers,
+        'buyTickers': tickers,
+        'filters': filters,
+        'maxWorkers': max_workers,
+        'repairIv': repair_iv,
+    }
+    results = run_scan(params, strategies, context=context, provider=_provider)
+    stage_counts = results.pop('stageCounts')
+    request_stats = results.pop('requestStats')
+    tables = [table.assign(strategy=result_key) for result_key, table in results.items() if len(table)]
+    table = pd.concat(tables, ignore_index=True) if tables else pd.DataFrame()
+    return shard_index, table, stage_counts, request_stats
+
+class JsonLinesSink:
+    """
+    Appends rows to one .jsonl file. position() is the committed file size, which
+    the checkpoint stores so a resumed run can cut off a half-written shard.
+    """
+
+    def __init__(self, path, resume_at=None):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, 'a+b' if resume_at is not None else 'wb')
+        if resume_at is not None:
+            self._file.truncate(resume_at)
+            self._file.seek(resume_at)
+
+    def write(self, shard_index, table):
+        if table.empty:
+            return
+        # to_json writes NaN as null, which plain json.dumps would not
+        self._file.write(table.to_json(orient='records', lines=True, double_precision=15).rstrip('\n').encode() + b'\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def position(self):
+        return self._file.tell()
+
+    def close(self):
+        self._file.close()
+
+class ParquetSink:
+    """
+    Writes each shard to <dir>/part-<shard>.parquet (atomically, via a temp file), so
+    the directory reads back as one dataset: pd.read_parquet(dir).
+    """
+
+    def __init__(self, path, resume_at=None):
+        self.path = path
+        if resume_at is None and os.path.isdir(path):
+            shutil.rmtree(path)
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, shard_index, table):
+        if table.empty:
+            return
+        part = os.path.join(self.path, f"part-{shard_index:05d}.parquet")
+        table.to_parquet(part + '.tmp', index=False)
+        os.replace(part + '.tmp', part)
+
+    def position(self):
+        return None
+
+    def close(self):
+        pass
+
+SINKS = {'jsonl': JsonLinesSink, 'parquet': ParquetSink}
+
+def _fingerprint(ticker_symbols, strategies, filters, shard_size, output_format, provider_spec, repair_iv):
+    """
+    Identifies a run, so a checkpoint is only resumed by the same run.
+    """
+    run = json.dumps([ticker_symbols, list(strategies), filters, shard_size, output_format, list(provider_spec), repair_iv], sort_keys=True, default=str)
+    return hashlib.sha256(run.encode()).hexdigest()
+
+def _load_checkpoint(path, fingerprint):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('fingerprint') != fingerprint:
+        raise ValueError(
+            f"Checkpoint {path} belongs to a different run (tickers, mode, filters, shard size "
+            f"or output format changed); pass --restart to discard it"
+        )
+    return checkpoint
+
+def _save_checkpoint(path, checkpoint):
+    with open(path + '.tmp', 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(path + '.tmp', path)
+
+def _merge_counts(total, counts):
+    for result_key, stages in counts.items():
+        for stage, rows in stages.items():
+            total.setdefault(result_key, {})[stage] = total.get(result_key, {}).get(stage, 0) + rows
+
+def run_batch(ticker_symbols, strategies, filters, out, output_format='jsonl', shard_size=25,
+              processes=None, max_workers=4, provider_spec=('yahoo',), checkpoint_path=None,
+              restart=False, log_level=logging.WARNING, repair_iv=False, governor=None):
+    """
+    Screens ticker_symbols with the given strategies, shard_size tickers per task on
+    a pool of processes, each fetching with max_workers threads. Rows are written as
+    shards finish (in completion order, tagged with 'strategy'); after each shard the
+    checkpoint records it, so re-running the same command after a crash only scans the
+    shards that had not finished. The checkpoint is removed once every shard is done.
+    repair_iv: re-solve stale implied volatilities from the quotes (params['repairIv']).
+    governor: configure_governor settings for each worker process (see governor_settings).
+    Returns a summary dict: shards, failedShards, tickers, rows, stageCounts, seconds,
+    and requestStats: this run's Yahoo requests, retries, throttled and failed
+    requests plus droppedTickers.
+    """
+    start = time.perf_counter()
+    checkpoint_path = checkpoint_path or f"{out.rstrip(os.sep)}.checkpoint.json"
+    shards = [ticker_symbols[i:i + shard_size] for i in range(0, len(ticker_symbols), shard_size)]
+    fingerprint = _fingerprint(ticker_symbols, strategies, filters, shard_size, output_format, provider_spec, repair_iv)
+
+    checkpoint = None if restart else _load_checkpoint(checkpoint_path, fingerprint)
+    if checkpoint is None:
+        checkpoint = {'fingerprint': fingerprint, 'completed': [], 'position': None, 'rows': 0, 'stageCounts': {}}
+        sink = SINKS[output_format](out)
+    else:
+        logger.warning(f"Resuming from {checkpoint_path}: {len(checkpoint['completed'])}/{len(shards)} shards already done")
+        sink = SINKS[output_format](out, resume_at=checkpoint['position'] or 0)
+    completed = set(checkpoint['completed'])
+    todo = [i for i in range(len(shards)) if i not in completed]
+
+    if governor:
+        configure_governor(**governor)
+    # One spot/rate fetch for the whole universe, so every shard prices off the same snapshot
+    context = make_provider(provider_spec).market_context(ticker_symbols) if todo else None
+
+    failed = []
+    requests = dict.fromkeys(REQUEST_STATS, 0)
+    dropped = []
+    try:
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(provider_spec, log_level, governor)) as pool:
+            pending = {
+                pool.submit(_scan_shard, i, shards[i], strategies, filters, max_workers, context, repair_iv): i
+                for i in todo
+            }
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    shard_index = pending.pop(future)
+                    try:
+                        _, table, stage_counts, request_stats = future.result()
+                    except Exception as e:
+                        logger.error(f"Shard {shard_index} ({shards[shard_index][0]}…) failed: {e}")
+                        failed.append(shard_index)
+                        continue
+                    sink.write(shard_index, table)
+                    checkpoint['completed'].append(shard_index)
+                    checkpoint['position'] = sink.position()
+                    checkpoint['rows'] += len(table)
+                    _merge_counts(checkpoint['stageCounts'], stage_counts)
+                    for name in REQUEST_STATS:
+                        requests[name] += request_stats[name]
+                    dropped.extend(request_stats['droppedTickers'])
+                    _save_checkpoint(checkpoint_path, checkpoint)
+                    print(
+                        f"shard {len(checkpoint['completed'])}/{len(shards)} · {len(table)} rows · "
+                        f"{time.perf_counter() - start:.0f}s",
+                        file=sys.stderr,
+                    )
+    finally:
+        sink.close()
+
+    if not failed and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return {
+        'shards': len(shards),
+        'failedShards': sorted(failed),
+        'tickers': len(ticker_symbols),
+        'rows': checkpoint['rows'],
+        'stageCounts': checkpoint['stageCounts'],
+        'requestStats': {**requests, 'droppedTickers': dropped},
+        'seconds': round(time.perf_counter() - start, 2),
+    }
+
+def _output_format(out, requested):
+    if requested:
+        return requested
+    return 'parquet' if out.endswith('.parquet') or os.path.isdir(out) else 'jsonl'
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='wtf-scan', description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('tickers', help="ticker file: symbols separated by newlines or commas, '#' comments")
+    parser.add_argument('--mode', choices=list(MODES), default='income', help="screens to run (default: income)")
+    parser.add_argument('--out', required=True, help="output .jsonl file, or directory of Parquet parts")
+    parser.add_argument('--format', choices=list(SINKS), help="output format (default: from --out; jsonl unless it ends in .parquet)")
+    parser.add_argument('--config', default='config.yaml', help="config file providing the filters (default: config.yaml)")
+    parser.add_argument('--filter', action='append', default=[], metavar='KEY=VALUE', help="override one filter, e.g. --filter dte_max=45")
+    parser.add_argument('--processes', type=int, default=os.cpu_count(), help="worker processes (default: CPU count)")
+    parser.add_argument('--shard-size', type=int, default=25, help="tickers per shard, the unit of work and of checkpointing (default: 25)")
+    parser.add_argument('--max-workers', type=int, help="concurrent requests per process (default: scan.max_workers from the config)")
+    parser.add_argument('--repair-iv', action=argparse.BooleanOptionalAction, help="re-solve stale implied volatilities from bid/ask (default: scan.repair_iv from the config)")
+    parser.add_argument('--replay', metavar='SNAPSHOT', help="screen a recorded snapshot directory instead of live data")
+    parser.add_argument('--synthetic', action='store_true', help="screen generated chains (offline testing)")
+    parser.add_argument('--checkpoint', help="checkpoint file (default: <out>.checkpoint.json)")
+    parser.add_argument('--restart', action='store_true', help="ignore an existing checkpoint and start over")
+    parser.add_argument('-v', '--verbose', action='store_true', help="log progress of each ticker")
+    args = parser.parse_args(argv)
+
+    log_level = logging.INFO if args.verbose else logging.WARNING
+    logging.basicConfig(level=log_level, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    ticker_symbols = read_tickers(args.tickers)
+    if not ticker_symbols:
+        parser.error(f"no tickers in {args.tickers}")
+    try:
+        filters, scan_config = load_filters(args.config, args.filter)
+    except ValueError as e:
+        parser.error(str(e))
+    provider_spec = ('replay', args.replay) if args.replay else ('synthetic', 0) if args.synthetic else ('yahoo',)
+    max_workers = args.max_workers or int(scan_config.get('max_workers', 8))
+    governor = governor_settings({**scan_config, 'max_workers': max_workers}, args.processes)
+
+    try:
+        summary = run_batch(
+            ticker_symbols, MODES[args.mode], filters, args.out,
+            output_format=_output_format(args.out, args.format),
+            shard_size=max(args.shard_size, 1),
+            processes=args.processes,
+            max_workers=max_workers,
+            provider_spec=provider_spec,
+            checkpoint_path=args.checkpoint,
+            restart=args.restart,
+            log_level=log_level,
+            repair_iv=bool(scan_config.get('repair_iv', False)) if args.repair_iv is None else args.repair_iv,
+            governor=governor,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    print(json.dumps(summary, indent=2))
+    return 1 if summary['failedShards'] else 0
+
+def backtest_main(argv=None):
+    """
+    wtf-backtest: replays the income screen over every trading day recorded under a
+    snapshot directory, sells each day's best picks and holds them to expiration.
+
+        wtf-backtest snapshots --picks 5 --out backtest/trades.csv
+        wtf-backtest snapshots --start 2025-01-01 --filter dte_max=45
+    """
+    parser = argparse.ArgumentParser(prog='wtf-backtest', description=backtest_main.__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('snapshots', help="snapshot directory (snapshots.dir), one recorded scan per subdirectory")
+    parser.add_argument('--config', default='config.yaml', help="config file providing the tickers and filters (default: config.yaml)")
+    parser.add_argument('--filter', action='append', default=[], metavar='KEY=VALUE', help="override one filter, e.g. --filter dte_max=45")
+    parser.add_argument('--put-tickers', help="comma-separated tickers to sell puts on (default: screener.income.put_tickers)")
+    parser.add_argument('--call-tickers', help="comma-separated tickers to sell calls on (default: screener.income.call_tickers)")
+    parser.add_argument('--picks', type=int, default=5, help="contracts sold per list and trading day (default: 5)")
+    parser.add_argument('--per-ticker', type=int, default=0, help="max picks per ticker and day (default: no cap)")
+    parser.add_argument('--start', type=datetime.date.fromisoformat, help="first entry day, YYYY-MM-DD")
+    parser.add_argument('--end', type=datetime.date.fromisoformat, help="last entry day, YYYY-MM-DD")
+    parser.add_argument('--out', help="write every trade to this .csv or .parquet file")
+    parser.add_argument('--repair-iv', action=argparse.BooleanOptionalAction, help="re-solve stale implied volatilities from bid/ask (default: scan.repair_iv from the config)")
+    parser.add_argument('-v', '--verbose', action='store_true', help="log progress")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    try:
+        filters, scan_config = load_filters(args.config, args.filter)
+    except ValueError as e:
+        parser.error(str(e))
+    with open(args.config) as f:
+        income = yaml.safe_load(f).get('screener', {}).get('income', {})
+    params = {
+        'putTickers': args.put_tickers if args.put_tickers is not None else income.get('put_tickers', ''),
+        'callTickers': args.call_tickers if args.call_tickers is not None else income.get('call_tickers', ''),
+        'filters': filters,
+        'perTickerCap': args.per_ticker,
+        'repairIv': bool(scan_config.get('repair_iv', False)) if args.repair_iv is None else args.repair_iv,
+    }
+    try:
+        result = run_backtest(args.snapshots, params, picks=args.picks, start=args.start, end=args.end)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+        if args.out.endswith('.parquet'):
+            result.trades.to_parquet(args.out, index=False)
+        else:
+            result.trades.to_csv(args.out, index=False)
+    print(f"{len(result.days)} trading days, {result.days.index[0]} to {result.days.index[-1]}")
+    print(result.summary.round(2).to_string())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
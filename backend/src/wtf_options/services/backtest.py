@@ -0,0 +1,236 @@
+import logging
+import os
+import time
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from ..utils.market_data import MARKET_TZ
+from ..utils.snapshots import Snapshot, SnapshotStore
+from .options_service import (
+    INCOME_STRATEGIES, STRATEGIES, _delta_groups, _dte_mask, _income_mask, _liquidity_mask, _ranking, _repair_iv, _sell_premium,
+    _strategy_tickers,
+)
+
+logger = logging.getLogger(__name__)
+
+# Income result lists the backtest trades: puts are sold cash-secured, calls covered
+BACKTEST_LISTS = tuple(STRATEGIES[strategy][0] for strategy in INCOME_STRATEGIES)
+
+# trades: one row per simulated entry: _ENTRY_COLUMNS plus 'list', 'entryDate',
+#   'settleDate', 'settleSpot', 'assigned', 'pnl' (dollars per contract) and
+#   'realizedAnnualizedReturn'
+# summary: one row per result list plus 'all' (see _summary)
+# days: the snapshot each trading day was replayed from
+BacktestResult = namedtuple('BacktestResult', ['trades', 'summary', 'days'])
+
+_ENTRY_COLUMNS = ['ticker', 'contractSymbol', 'expirationDate', 'DTE', 'strike', 'currentPrice', 'premium', 'annualizedReturn']
+# Chain columns the screen reads; the rest of a recorded chain is never loaded
+_CHAIN_COLUMNS = ['contractSymbol', 'expirationDate', 'side', 'strike', 'bid', 'lastPrice', 'volume', 'openInterest', 'delta']
+# ... and what re-solving stale IVs (repairIv) reads on top
+_REPAIR_COLUMNS = ['ask', 'impliedVolatility']
+# Trading days stacked into one frame per screening pass, bounding memory
+BATCH_DAYS = 20
+
+def _trading_days(store, start=None):
+    """
+    The last snapshot of each market date from start on, oldest first, as a
+    DataFrame indexed by date with 'path' and 'snapshot' (a Snapshot).
+    """
+    days = {}
+    for name in store.names():
+        snapshot = Snapshot(os.path.join(store.root, name))
+        day = snapshot.as_of.astimezone(MARKET_TZ).date()
+        if start is None or day >= start:
+            # Names sort by time, so the day's last snapshot wins
+            days[day] = snapshot
+    index = pd.Index(sorted(days), name='date')
+    return pd.DataFrame({'path': [days[day].path for day in index], 'snapshot': [days[day] for day in index]}, index=index)
+
+def _spot_history(days, tickers):
+    """
+    Spot per (trading day, ticker) from the snapshots' contexts; NaN where a
+    snapshot has no price for the ticker.
+    """
+    return pd.DataFrame(
+        [[snapshot.prices.get(ticker_symbol, (np.nan, None))[0] for ticker_symbol in tickers] for snapshot in days['snapshot']],
+        index=days.index, columns=tickers, dtype=float,
+    )
+
+def _stack_days(days, tickers, columns=_CHAIN_COLUMNS):
+    """
+    The columns of every recorded contract of tickers over a batch of trading days
+    as one frame, tagged with 'ticker', 'currentPrice', 'riskFreeRate', 'entryDate'
+    and 'DTE' (from the entry day). Tickers without a price on a day are skipped,
+    as in a scan.
+    """
+    import pyarrow as pa
+
+    tables, labels = [], []
+    for day, snapshot in days['snapshot'].items():
+        for ticker_symbol in tickers:
+            price = snapshot.prices.get(ticker_symbol, (np.nan, None))[0]
+            table = snapshot.table(ticker_symbol) if not pd.isna(price) else None
+            if table is not None and table.num_rows:
+                tables.append(table.select([name for name in columns if name in table.column_names]))
+                labels.append((ticker_symbol, price, snapshot.risk_free_rate, day, table.num_rows))
+    if not tables:
+        return None
+    # One conversion per batch; chains recorded with different columns are aligned
+    frame = pa.concat_tables(tables, promote_options='default').to_pandas()
+    ticker_symbols, prices, rates, entry_days, lengths = zip(*labels)
+    frame['ticker'] = np.repeat(np.array(ticker_symbols, dtype=object), lengths)
+    frame['currentPrice'] = np.repeat(np.array(prices, dtype=float), lengths)
+    frame['riskFreeRate'] = np.repeat(np.array(rates, dtype=float), lengths)
+    frame['entryDate'] = np.repeat(np.array(entry_days, dtype=object), lengths)
+    codes, expirations = pd.factorize(frame['expirationDate'])
+    entry_ordinal = np.repeat(np.array([day.toordinal() for day in entry_days]), lengths)
+    expiration_ordinal = np.array([pd.Timestamp(exp_str).toordinal() for exp_str in expirations])[codes]
+    frame['DTE'] = expiration_ordinal - entry_ordinal
+    return frame
+
+def _rank_entries(picked, picks, ranking):
+    """
+    Each entry day's best picks rows by annualizedReturn (ties by contractSymbol),
+    after the perTickerCap / perExpiryCap caps, as rank_contracts ranks a scan.
+    """
+    picked = picked.sort_values(
+        ['entryDate', 'annualizedReturn', 'contractSymbol'], ascending=[True, False, True], kind='stable', ignore_index=True,
+    )
+    if ranking and ranking['per_expiry']:
+        picked = picked.loc[picked.groupby(['entryDate', 'ticker', 'expirationDate'], sort=False).cumcount().to_numpy() < ranking['per_expiry']]
+    if ranking and ranking['per_ticker']:
+        picked = picked.loc[picked.groupby(['entryDate', 'ticker'], sort=False).cumcount().to_numpy() < ranking['per_ticker']]
+    return picked.loc[picked.groupby('entryDate', sort=False).cumcount().to_numpy() < picks]
+
+def _entries(days, params, picks):
+    """
+    The income screen on every trading day's snapshot, vectorized across days
+    and tickers: each batch of days is stacked into one frame and filtered with
+    the scan's DTE, liquidity and delta/OTM% masks at once (the delta check per
+    day, ticker and expiration). Keeps each day's picks best contracts per list
+    by annualizedReturn, tagged with 'list' and 'entryDate'.
+    Greeks are not needed to pick or settle, so none are computed; with
+    params['repairIv'] stale IVs are re-solved and the deltas yfinance did not
+    quote computed from them, as in a scan (see _repair_iv).
+    """
+    filters = params.get('filters', {})
+    ranking = _ranking(params)
+    repair_iv = params.get('repairIv', False)
+    sides = {}
+    for strategy in INCOME_STRATEGIES:
+        result_key, side, flag, _ = STRATEGIES[strategy]
+        sides[result_key] = (flag, set(_strategy_tickers(params, strategy)))
+    tickers = list(dict.fromkeys(s for strategy in INCOME_STRATEGIES for s in _strategy_tickers(params, strategy)))
+    picked = {result_key: [] for result_key in sides}
+    for batch in range(0, len(days), BATCH_DAYS):
+        frame = _stack_days(days.iloc[batch:batch + BATCH_DAYS], tickers, _CHAIN_COLUMNS + (_REPAIR_COLUMNS if repair_iv else []))
+        if frame is None:
+            continue
+        if repair_iv:
+            frame = _repair_iv(frame, frame['side'].to_numpy(), frame['currentPrice'], frame['riskFreeRate'])
+        # Per day, ticker, side and expiration, before liquidity drops rows
+        use_delta_filter = _delta_groups(frame, [frame['entryDate'], frame['ticker'], frame['side'], frame['expirationDate']])
+        for result_key, (flag, side_tickers) in sides.items():
+            # One selection for the side, its tickers, DTE and liquidity
+            rows = (
+                (frame['side'] == flag).to_numpy() & frame['ticker'].isin(side_tickers).to_numpy()
+                & (_dte_mask(frame, filters) & _liquidity_mask(frame, filters)).to_numpy()
+            )
+            chain = frame.loc[rows]
+            mask, _ = _income_mask(chain, flag, chain['currentPrice'], filters, use_delta_filter[rows])
+            chain = chain.loc[mask]
+            premium = _sell_premium(chain)
+            base = chain['strike'] if flag == 'p' else chain['currentPrice']
+            with np.errstate(divide='ignore', invalid='ignore'):
+                annualized = ((premium / base) * (365 / chain['DTE']) * 100).where((chain['DTE'] > 0) & (base > 0), 0)
+            chain = chain.assign(premium=premium, annualizedReturn=annualized)[_ENTRY_COLUMNS + ['entryDate']]
+            picked[result_key].append(_rank_entries(chain, picks, ranking).assign(list=result_key))
+    frames = [table for tables in picked.values() for table in tables if len(table)]
+    if not frames:
+        return pd.DataFrame(columns=_ENTRY_COLUMNS + ['entryDate', 'list'])
+    return pd.concat(frames, ignore_index=True).sort_values(['entryDate', 'list'], kind='stable', ignore_index=True)
+
+def _settle(trades, spots):
+    """
+    Settles every trade at once: the spot at expiration is the first trading day
+    on or after expirationDate (later snapshots stand in for missing prices), the
+    option is assigned when it expires in the money, and the option leg's P&L per
+    share is the premium less the intrinsic value paid on assignment. Trades
+    expiring after the last snapshot stay open (NaN settlement).
+    """
+    dates = spots.index.to_numpy()
+    expiration = pd.to_datetime(trades['expirationDate']).dt.date.to_numpy()
+    settle_row = np.searchsorted(dates, expiration, 'left')
+    settled = settle_row < len(dates)
+    filled = spots.bfill().to_numpy()
+    columns = spots.columns.get_indexer(trades['ticker'])
+    settle_spot = np.full(len(trades), np.nan)
+    settle_spot[settled] = filled[settle_row[settled], columns[settled]]
+
+    strike = trades['strike'].to_numpy(dtype=float)
+    is_put = (trades['list'] == 'puts').to_numpy()
+    intrinsic = np.where(is_put, np.maximum(strike - settle_spot, 0), np.maximum(settle_spot - strike, 0))
+    pnl = trades['premium'].to_numpy(dtype=float) - intrinsic
+    # Same bases as the screen: the strike for cash-secured puts, the spot for covered calls
+    base = np.where(is_put, strike, trades['currentPrice'].to_numpy(dtype=float))
+    dte = trades['DTE'].to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        realized = np.where((dte > 0) & (base > 0), pnl / base * (365 / dte) * 100, 0.0)
+    return trades.assign(
+        settleDate=np.where(settled, dates[np.minimum(settle_row, len(dates) - 1)], None),
+        settleSpot=settle_spot,
+        assigned=np.where(np.isnan(settle_spot), np.nan, intrinsic > 0),
+        pnl=pnl * 100,
+        realizedAnnualizedReturn=np.where(np.isnan(settle_spot), np.nan, realized),
+    )
+
+def _summary(trades):
+    """
+    Per result list (and 'all'): trades, how many settled, assignment and win
+    rates, mean screened vs realized annualized return over settled trades, and
+    the total premium and P&L in dollars (one contract per trade).
+    """
+    rows = {}
+    for name, group in [*trades.groupby('list', sort=False), ('all', trades)]:
+        done = group.loc[group['settleSpot'].notna()]
+        rows[name] = {
+            'trades': len(group),
+            'settled': len(done),
+            'open': len(group) - len(done),
+            'assignmentRate': done['assigned'].astype(float).mean() * 100 if len(done) else np.nan,
+            'winRate': (done['pnl'] > 0).mean() * 100 if len(done) else np.nan,
+            'screenedAnnualizedReturn': done['annualizedReturn'].mean(),
+            'realizedAnnualizedReturn': done['realizedAnnualizedReturn'].mean(),
+            'premium': (done['premium'] * 100).sum(),
+            'pnl': done['pnl'].sum(),
+        }
+    return pd.DataFrame.from_dict(rows, orient='index')
+
+def run_backtest(snapshot_dir, params, picks=5, start=None, end=None):
+    """
+    Backtests the income screen over the snapshots recorded under snapshot_dir
+    (see SnapshotStore): on each trading day (its last snapshot) the screen runs
+    with params (putTickers, callTickers, filters and the perTickerCap /
+    perExpiryCap caps, as for analyze_income_options) and sells its picks best
+    puts and covered calls by annualizedReturn, one contract each, held to
+    expiration. Entries are screened in batches of days (see _entries).
+    start / end: optional datetime.date bounds of the entry days
+    Settlement is vectorized over all trades (see _settle); only the option leg is
+    counted, so the realized return of a covered call excludes the stock's move.
+    Returns a BacktestResult; summary compares the screened annualizedReturn with
+    the realized one.
+    """
+    started = time.perf_counter()
+    # Settlement can use snapshots after the last entry day
+    history = _trading_days(SnapshotStore(snapshot_dir), start)
+    days = history if end is None else history.loc[history.index <= end]
+    if days.empty:
+        raise ValueError(f"No snapshots under {snapshot_dir}")
+    tickers = list(dict.fromkeys(s for strategy in INCOME_STRATEGIES for s in _strategy_tickers(params, strategy)))
+    trades = _entries(days, params, picks)
+    trades = _settle(trades, _spot_history(history, tickers))
+    summary = _summary(trades)
+    logger.info(f"Backtested {len(days)} days, {len(trades)} trades in {time.perf_counter() - started:.1f}s")
+    return BacktestResult(trades, summary, days[['path']])
@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+
+class ChainIndex:
+    """
+    One side of a stacked chain frame (see build_superset) indexed per (ticker,
+    expiration): rows sorted by strike with their delta and OTM% alongside, so
+    "the contracts nearest a target delta (or OTM%) in every expiration" is one
+    binary search per expiration instead of a pass over the chain.
+
+    Along the strike axis |delta| rises for puts and falls for calls, and OTM%
+    does the opposite. Quote noise in the IV smile, or quoted and computed deltas
+    side by side (at zero DTE computed deltas are 0 or 1), can break that monotony
+    anywhere, so each axis keeps two sorted envelopes: the running max, before
+    whose hit every value is below the target, and the running min from the right,
+    after whose hit every value is above it. Rows on both envelopes are pivots: no
+    row before one is greater, none after it smaller. A lookup ranks the rows from
+    the count-th pivot before the first hit to the count-th pivot after the second
+    by their actual distance from the target; every row outside is at least as far
+    as those pivots. In a monotone group every row is a pivot, so that is count
+    rows either side; a non-monotone run widens it to the run's ends.
+    """
+
+    def __init__(self, frame, delta, flag, rows=None):
+        """
+        frame: stacked chain with 'ticker', 'expirationDate', 'strike' and
+        'currentPrice' columns
+        delta: per-row delta aligned with frame (NaN where unknown)
+        flag: 'p' or 'c'
+        rows: optional positions of the frame rows to index (default: all)
+        """
+        rows = np.arange(len(frame)) if rows is None else np.asarray(rows)
+        # Factorized column by column: a MultiIndex costs more than the whole lookup
+        ticker_codes, tickers = pd.factorize(frame['ticker'].to_numpy()[rows])
+        expiration_codes, expirations = pd.factorize(frame['expirationDate'].to_numpy()[rows])
+        width = max(len(expirations), 1)
+        codes, pairs = pd.factorize(ticker_codes * width + expiration_codes)
+        strike = frame['strike'].to_numpy(dtype=float)[rows]
+        order = np.lexsort((strike, codes))
+        self.flag = flag
+        # (ticker, expirationDate) per group, in the order they first appear in frame
+        self.keys = list(zip(tickers[pairs // width], expirations[pairs % width]))
+        # Frame positions in (group, strike) order; the arrays below follow it
+        self.rows = rows[order]
+        self.group = codes[order]
+        self.strike = strike[order]
+        self.delta = np.asarray(delta, dtype=float)[self.rows]
+        price = frame['currentPrice'].to_numpy(dtype=float)[self.rows]
+        moneyness = price - self.strike if flag == 'p' else self.strike - price
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.otm_percent = np.where(price > 0, moneyness / price * 100, 0.0)
+        # Each lookup axis holds values that rise with strike within a group
+        self._axes = {
+            'delta': self._axis(np.abs(self.delta) if flag == 'p' else -self.delta),
+            'otm': self._axis(-self.otm_percent if flag == 'p' else self.otm_percent),
+        }
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _axis(self, values):
+        """
+        (members, group, values, search) for the rows with a finite value:
+        positions into the sorted arrays, their group and values, and the search
+        keys (ceiling, floor, pivots, low, span): the two envelopes of the values
+        offset per group by group * span + (value - low), so they grow across
+        groups, and the positions (into members) of the pivots.
+        """
+        members = np.flatnonzero(np.isfinite(values))
+        values = values[members]
+        group = self.group[members]
+        if len(members) == 0:
+            return members, group, values, None
+        low = values.min()
+        span = values.max() - low + 1
+        keys = group * span + (values - low)
+        ceiling = np.maximum.accumulate(keys)
+        floor = np.minimum.accumulate(keys[::-1])[::-1]
+        pivots = np.flatnonzero((keys == ceiling) & (keys == floor))
+        return members, group, values, (ceiling, floor, pivots, low, span)
+
+    def groups_with(self, by):
+        """
+        Group numbers (positions in keys) that have at least one row with a
+        finite value on axis by ('delta' or 'otm').
+        """
+        return np.unique(self._axes[by][1])
+
+    def nearest(self, target, count, by='delta', groups=None):
+        """
+        The count rows nearest target in each group, by |delta| (puts and calls
+        alike, e.g. 0.20) or OTM%.
+        groups: optional group numbers to search; default every group with values
+        Returns (slots, distance): positions into the index's sorted arrays
+        (rows, group, strike, delta, otm_percent), ordered by group and strike,
+        and each one's distance from the target.
+        """
+        members, member_group, values, search = self._axes[by]
+        if by == 'delta':
+            target = target if self.flag == 'p' else -target
+        else:
+            target = -target if self.flag == 'p' else target
+        groups = np.unique(member_group) if groups is None else np.intersect1d(groups, member_group)
+        if len(groups) == 0 or count <= 0:
+            return np.empty(0, dtype=int), np.empty(0)
+        ceiling, floor, pivots, low, span = search
+        first = np.searchsorted(member_group, groups, 'left')
+        last = np.searchsorted(member_group, groups, 'right')
+        key = groups * span + (target - low)
+        # Targets beyond a group's values land in a neighbouring group's keys
+        below = np.clip(np.searchsorted(ceiling, key, 'left'), first, last)
+        above = np.clip(np.searchsorted(floor, key, 'left'), first, last)
+        # Pivots before below are under the target, those from above on are not;
+        # the count-th on each side bounds the window (the group's ends when a
+        # side has fewer)
+        before = np.searchsorted(pivots, below, 'left') - count
+        start = np.maximum(first, np.concatenate(([-1], pivots))[np.maximum(before + 1, 0)])
+        after = np.searchsorted(pivots, above, 'left') + count - 1
+        stop = np.minimum(last, np.concatenate((pivots, [len(members)]))[np.minimum(after, len(pivots))] + 1)
+        lengths = np.maximum(stop - start, 0)
+        window = np.repeat(start, lengths) + np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+        distance = np.abs(values[window] - target)
+        window_group = member_group[window]
+        order = np.lexsort((window, distance, window_group))
+        ranked_group = window_group[order]
+        rank = np.arange(len(order)) - np.searchsorted(ranked_group, ranked_group, 'left')
+        picked = np.sort(order[rank < count])
+        return members[window[picked]], distance[picked]
@@ -0,0 +1,130 @@
+from collections import namedtuple
+
+import numpy as np
+
+from ..utils.market_data import GREEK_NAMES
+
+# Contract keys pack the DTE above the strike in thousandths, so one int64 sorts
+# and compares like (DTE, strike). Within a scan that identifies a contract as
+# well as (expirationDate, strike) does; across days DTE is a greek input anyway.
+_STRIKE_SCALE = 1000
+_DTE_SCALE = 10 ** 10
+
+# A slice's entries: sorted contract keys, their greek inputs (DTE, implied
+# volatility) and greeks (columns in GREEK_NAMES order), row for row
+Entries = namedtuple('Entries', ['keys', 'inputs', 'greeks'])
+
+_NO_ENTRIES = Entries(np.empty(0, dtype=np.int64), np.empty((0, 2)), np.empty((0, len(GREEK_NAMES))))
+
+def contract_keys(frame):
+    """
+    One int64 per row of a chain frame identifying its (DTE, strike).
+    """
+    strike = np.round(frame['strike'].to_numpy(dtype=float) * _STRIKE_SCALE)
+    return frame['DTE'].to_numpy(dtype=np.int64) * _DTE_SCALE + np.nan_to_num(strike).astype(np.int64)
+
+class ChainMemory:
+    """
+    One (result list, ticker) slice of a ScanState while a chain is screened: what
+    the previous scan computed for each contract (Entries), and what this scan
+    computes. The inputs (DTE, implied volatility), with the strike, spot and rate,
+    determine the greeks. Rows are matched by binary search over the sorted keys.
+    """
+
+    def __init__(self, previous=_NO_ENTRIES):
+        self.previous = previous
+        self.current = _NO_ENTRIES
+
+    def match(self, frame):
+        """
+        Compares every row of a chain frame with the previous scan.
+        Returns (keys, inputs, unchanged) where unchanged[i] is True when row i has
+        the same greek inputs as the same contract last time.
+        """
+        keys = contract_keys(frame)
+        volatility = frame['impliedVolatility'].to_numpy(dtype=float) if 'impliedVolatility' in frame.columns else np.zeros(len(frame))
+        inputs = np.column_stack([frame['DTE'].to_numpy(dtype=float), volatility])
+        if len(self.previous.keys) == 0:
+            return keys, inputs, np.zeros(len(keys), dtype=bool)
+        position = self._positions(keys)
+        # NaN inputs never compare equal, so such rows are always recomputed
+        unchanged = (self.previous.keys[position] == keys) & (self.previous.inputs[position] == inputs).all(axis=1)
+        return keys, inputs, unchanged
+
+    def _positions(self, keys):
+        """
+        Where each key is, or would be inserted, in the previous entries (clipped
+        to the last row, so the positions always index them).
+        """
+        return np.minimum(np.searchsorted(self.previous.keys, keys), len(self.previous.keys) - 1)
+
+    def reused_greeks(self, keys, unchanged):
+        """
+        Returns (mask, {name: values}) for the rows whose inputs are unchanged, with
+        the greeks the previous scan computed for them, the form _compute_greeks
+        reuses.
+        """
+        values = self.previous.greeks[self._positions(keys[unchanged])]
+        return unchanged, dict(zip(GREEK_NAMES, values.T))
+
+    def remember_all(self, keys, inputs, greeks):
+        """
+        Records this scan's rows: keys and inputs as returned by match, greeks as
+        {name: array} in the same row order.
+        """
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        # A contract listed twice keeps its last row
+        last = np.ones(len(keys), dtype=bool)
+        last[:-1] = keys[1:] != keys[:-1]
+        order = order[last]
+        values = np.column_stack([np.asarray(greeks[name], dtype=float) for name in GREEK_NAMES])
+        self.current = Entries(keys[last], inputs[order], values[order])
+
+class ScanState:
+    """
+    What the last scan computed, so the next one with the same state only redoes
+    the work for contracts whose inputs changed (see run_scan's state argument).
+
+    Per (result list, ticker) it keeps each contract's greeks together with their
+    inputs, valid for one spot price and risk-free rate; a changed spot or rate
+    invalidates that ticker's entries. It also keeps the contracts each result list
+    held, so a scan can report which entered or left.
+    """
+
+    def __init__(self):
+        self._buckets = {}   # (result_key, ticker) -> (current_price, risk_free_rate, entries)
+        self.contracts = {}  # result_key -> {ticker: set of (expirationDate, strike)}
+
+    def memory(self, result_key, ticker_symbol, current_price, risk_free_rate):
+        price, rate, entries = self._buckets.get((result_key, ticker_symbol), (None, None, _NO_ENTRIES))
+        if price != current_price or rate != risk_free_rate:
+            entries = _NO_ENTRIES
+        return ChainMemory(entries)
+
+    def store(self, result_key, ticker_symbol, current_price, risk_free_rate, memory, table):
+        """
+        Keeps this scan's entries for one (result list, ticker) and returns the
+        (entered, left) contract keys relative to the previous scan.
+        table: the ticker's result table for that list
+        """
+        self._buckets[(result_key, ticker_symbol)] = (current_price, risk_free_rate, memory.current)
+        return self._replace(result_key, ticker_symbol, set(zip(table['expirationDate'].tolist(), table['strike'].tolist())))
+
+    def drop(self, result_key, ticker_symbol):
+        """
+        Forgets a ticker (failed, skipped or no longer scanned); returns the keys
+        that thereby left the result list.
+        """
+        self._buckets.pop((result_key, ticker_symbol), None)
+        return self._replace(result_key, ticker_symbol, set())[1]
+
+    def tickers(self, result_key):
+        return list(self.contracts.get(result_key, {}))
+
+    def _replace(self, result_key, ticker_symbol, current):
+        by_ticker = self.contracts.setdefault(result_key, {})
+        previous = by_ticker.pop(ticker_symbol, set())
+        if current:
+            by_ticker[ticker_symbol] = current
+        return sorted(current - previous), sorted(previous - current)
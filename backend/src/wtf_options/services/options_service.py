@@ -1,310 +1,1160 @@
-import math
-
-import yfinance as yf
+import numpy as np
 import pandas as pd
-from datetime import date
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from functools import partial
 import logging
-from ..utils.market_data import get_risk_free_rate, calculate_greeks, get_live_or_close_price
+import time
+from ..utils.market_data import (
+    GREEK_NAMES, MARKET_TZ, STALE_IV_RANGE, calculate_greeks_batch, delta_strike_bounds, cache_stats, implied_volatility_batch,
+    request_stats,
+)
+from ..utils.governor import stats_delta
+from ..utils.metrics import metrics
+from ..utils.providers import SnapshotProvider, YahooProvider
+from ..utils.snapshots import SnapshotStore
+from .chain_index import ChainIndex
 
 logger = logging.getLogger(__name__)
 
-def analyze_income_options(params):
+# Upper bound on concurrent Yahoo requests; overridden by scan.max_workers in config.yaml
+DEFAULT_MAX_WORKERS = 8
+
+# Result tables: the columns (and dtypes) each screen returns, in display order.
+# Greeks are NaN where they could not be computed; 'str' is pandas' default string dtype.
+_CONTRACT_COLUMNS = {
+    'ticker': 'str',
+    'contractSymbol': 'str',
+    'expirationDate': 'str',
+    'DTE': 'int32',
+    'strike': 'float64',
+    'currentPrice': 'float64',
+    'premium': 'float64',
+    'bid': 'float64',
+    'ask': 'float64',
+    'lastPrice': 'float64',
+    'volume': 'float64',
+    'openInterest': 'float64',
+    'impliedVolatility': 'float64',
+    'delta': 'float64',
+    'gamma': 'float64',
+    'theta': 'float64',
+    'vega': 'float64',
+}
+INCOME_COLUMNS = {
+    **_CONTRACT_COLUMNS,
+    'otmPercent': 'float64',
+    'collateral': 'float64',
+    'weeklyReturn': 'float64',
+    'annualizedReturn': 'float64',
+}
+BUY_COLUMNS = {**_CONTRACT_COLUMNS, 'buyScore': 'float64'}
+
+def _column(chain, name, default=0):
     """
-    Analyzes options for income strategies (selling puts/calls).
+    Returns a chain column, or a constant column when yfinance did not supply it
+    (the vectorized equivalent of row.get(name, default)).
     """
-    put_tickers = params.get('putTickers', '').split(',')
-    call_tickers = params.get('callTickers', '').split(',')
-    filters = params.get('filters', {})
-    logger.debug(f"Starting income analysis with filters: {filters}")
+    if name in chain.columns:
+        return chain[name]
+    return pd.Series(default, index=chain.index, dtype=float)
 
-    all_puts = []
-    all_calls = []
-    today = date.today()
-    risk_free_rate = get_risk_free_rate()
+_EMPTY_TABLES = {}
 
-    # --- Process Puts ---
-    for ticker_symbol in put_tickers:
-        if not ticker_symbol: continue
-        logger.info(f"Processing puts for {ticker_symbol}")
-        try:
-            ticker = yf.Ticker(ticker_symbol)
-            current_price, price_type = get_live_or_close_price(ticker)
-            logger.info(f"Current price for {ticker_symbol}: {current_price}, price type: {price_type}")
-            if pd.isna(current_price):
-                logger.warning(f"Could not get current price for {ticker_symbol}. Skipping.")
-                continue
+def _result_table(frame, columns, **values):
+    """
+    Projects a screened frame onto a result schema ({column: dtype}), dropping the
+    other yfinance columns; columns the frame lacks are NaN. frame=None gives an
+    empty table.
+    values: columns computed for the frame's rows (arrays, Series or scalars); they
+    take precedence over the frame's own columns.
+    """
+    if frame is None:
+        key = tuple(columns.items())
+        if key not in _EMPTY_TABLES:
+            _EMPTY_TABLES[key] = pd.DataFrame({name: pd.Series(dtype=dtype) for name, dtype in columns.items()})
+        return _EMPTY_TABLES[key].copy()
+    # Built column by column from numpy arrays: assigning into the frame or calling
+    # DataFrame.astype costs milliseconds per call, which adds up over thousands of
+    # small per-ticker tables
+    data = {}
+    for name, dtype in columns.items():
+        dtype = object if dtype == 'str' else dtype
+        value = values[name] if name in values else frame[name] if name in frame.columns else np.nan
+        if np.ndim(value) == 0:
+            data[name] = np.full(len(frame), value, dtype=dtype)
+        else:
+            data[name] = np.asarray(value, dtype=dtype)
+    return pd.DataFrame(data)
 
-            for exp_str in ticker.options:
-                exp_date = pd.to_datetime(exp_str).date()
-                dte = (exp_date - today).days
+def _concat_results(tables, columns):
+    """
+    Concatenates result tables of one schema, skipping empty ones.
+    """
+    tables = [table for table in tables if len(table)]
+    if not tables:
+        return _result_table(None, columns)
+    return pd.concat(tables, ignore_index=True)
 
-                if not (filters.get('DTE_MIN', 0) <= dte <= filters.get('DTE_MAX', 9999)):
-                    logger.debug(f"Skipping expiration {exp_str} for {ticker_symbol} due to DTE: {dte}")
-                    continue
+def _expirations_in_window(expirations, ticker_symbol, filters, today):
+    """
+    Yields (exp_str, dte) for the expirations inside the DTE window.
+    """
+    for exp_str in expirations:
+        exp_date = pd.to_datetime(exp_str).date()
+        dte = (exp_date - today).days
+        if not (filters.get('DTE_MIN', 0) <= dte <= filters.get('DTE_MAX', 9999)):
+            logger.debug(f"Skipping expiration {exp_str} for {ticker_symbol} due to DTE: {dte}")
+            continue
+        yield exp_str, dte
 
-                logger.info(f"Fetching option chain for {ticker_symbol} on {exp_str}")
-                opt_chain = ticker.option_chain(exp_str)
-                puts = opt_chain.puts.to_dict('records')
-                logger.info(f"Found {len(puts)} puts for {ticker_symbol} on {exp_str}")
-
-                use_delta_filter = 'delta' in opt_chain.puts.columns and not opt_chain.puts['delta'].isnull().all()
-
-                for p in puts:
-                    logger.debug(f"Analyzing put {p} for {ticker_symbol} on {exp_str}")
-                    contract_name = f"{ticker_symbol} {exp_str} {p['strike']}P"
-                    p['otmPercent'] = (current_price - p['strike']) / current_price * 100 if current_price > 0 else 0
-
-                    # Common checks
-                    if p.get('volume', 0) < filters.get('MIN_VOLUME', 0):
-                        logger.debug(f"Filtering out {contract_name}: Volume {p.get('volume', 0)} < {filters.get('MIN_VOLUME', 0)}")
-                        continue
-                    if p.get('openInterest', 0) < filters.get('MIN_OPEN_INTEREST', 0):
-                        logger.debug(f"Filtering out {contract_name}: Open Interest {p.get('openInterest', 0)} < {filters.get('MIN_OPEN_INTEREST', 0)}")
-                        continue
-
-                    # Strategy-specific filters
-                    filter_passed = False
-                    if use_delta_filter:
-                        delta_val = abs(p.get('delta', 0))
-                        if filters.get('PUT_DELTA_MIN', 0) <= delta_val <= filters.get('PUT_DELTA_MAX', 1):
-                            filter_passed = True
-                        else:
-                            logger.debug(f"Filtering out {contract_name}: Delta {delta_val} not in range [{filters.get('PUT_DELTA_MIN', 0)}, {filters.get('PUT_DELTA_MAX', 1)}]")
-                    else: # Fallback to OTM
-                        if filters.get('PUT_OTM_PERCENT_MIN', 0) <= p['otmPercent'] <= filters.get('PUT_OTM_PERCENT_MAX', 100):
-                            filter_passed = True
-                        else:
-                            logger.debug(f"Filtering out {contract_name}: OTM % {p['otmPercent']} not in range [{filters.get('PUT_OTM_PERCENT_MIN', 0)}, {filters.get('PUT_OTM_PERCENT_MAX', 100)}]")
-
-                    if not filter_passed:
-                        continue
-
-                    logger.info(f"Contract {contract_name} passed all filters. Adding to results.")
-                    premium = p.get('bid', 0)
-                    if premium == 0:
-                        logger.info("bid is 0, trying lastPrice")
-                        premium = p.get('lastPrice', 0)
-                    p['ticker'] = ticker_symbol
-                    p['expirationDate'] = exp_str
-                    p['premium'] = premium
-                    p['DTE'] = dte
-                    p['currentPrice'] = current_price
-                    p['collateral'] = p['strike'] * 100
-                    p['weeklyReturn'] = (premium / p['strike']) / (dte / 7) * 100 if dte > 0 and p['strike'] > 0 else 0
-                    p['annualizedReturn'] = (premium / p['strike']) * (365 / dte) * 100 if dte > 0 and p['strike'] > 0 else 0
-                    if math.isnan(p['volume']):
-                        p['volume'] = 0
-                    if math.isnan(p['openInterest']):
-                        p['openInterest'] = 0
-
-                    # Calculate greeks
-                    t = dte / 365.0
-                    iv = p.get('impliedVolatility', 0)
-                    greeks = calculate_greeks('p', current_price, p['strike'], t, risk_free_rate, iv)
-                    p.update(greeks)
-
-                    all_puts.append(p)
-        except Exception as e:
-            logger.error(f"Error processing puts for {ticker_symbol}: {e}")
+def _started(started, call, ticker_symbol, *args):
+    """
+    Runs call(ticker_symbol, *args) on a pool thread, noting when the ticker's
+    first request actually started (after any wait in the pool's queue).
+    """
+    started.setdefault(ticker_symbol, time.perf_counter())
+    return call(ticker_symbol, *args)
 
-    # --- Process Calls ---
-    for ticker_symbol in call_tickers:
-        if not ticker_symbol: continue
-        logger.info(f"Processing calls for {ticker_symbol}")
-        try:
-            ticker = yf.Ticker(ticker_symbol)
-            current_price, price_type = get_live_or_close_price(ticker)
-            if pd.isna(current_price):
-                logger.warning(f"Could not get current price for {ticker_symbol}. Skipping.")
-                continue
+def _iter_universe(ticker_symbols, prices, filters, today, max_workers, label, provider, started=None):
+    """
+    Fetches the in-window option chains for a list of tickers concurrently.
+    prices is the MarketContext price map; tickers without a usable price are skipped.
+    provider: data provider the expirations and chains come from (see utils.providers).
+    Expiration lists are fanned out per ticker and chains per (ticker, expiration) on
+    one bounded thread pool, so a scan takes about as long as its slowest fetch.
+    A failure only drops the ticker it belongs to, like the old per-ticker try/except.
+    Yields (ticker_symbol, current_price, chains) as soon as a ticker's last chain
+    arrives, where chains is a list of (exp_str, dte, opt_chain) in expiration order.
+    Skipped or failed tickers are yielded with chains set to None, so every input
+    ticker is reported exactly once.
+    started: optional dict filled with each ticker's perf_counter() start, the moment
+    its expiration list began fetching
+    """
+    ticker_symbols = [s for s in dict.fromkeys(ticker_symbols) if s]
+    chains = {}
+    outstanding = {}
+    failed = set()
 
-            for exp_str in ticker.options:
-                exp_date = pd.to_datetime(exp_str).date()
-                dte = (exp_date - today).days
-                if not (filters.get('DTE_MIN', 0) <= dte <= filters.get('DTE_MAX', 9999)):
-                    logger.debug(f"Skipping expiration {exp_str} for {ticker_symbol} due to DTE: {dte}")
+    for ticker_symbol in ticker_symbols:
+        current_price, price_type = prices.get(ticker_symbol, (np.nan, "UNKNOWN"))
+        logger.info(f"Current price for {ticker_symbol}: {current_price}, price type: {price_type}")
+        if pd.isna(current_price):
+            logger.warning(f"Could not get current price for {ticker_symbol}. Skipping.")
+            failed.add(ticker_symbol)
+            yield ticker_symbol, current_price, None
+
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        list_expirations = provider.expirations if started is None else partial(_started, started, provider.expirations)
+        pending = {
+            pool.submit(list_expirations, symbol): (symbol, None)
+            for symbol in ticker_symbols if symbol not in failed
+        }
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                ticker_symbol, expiration = pending.pop(future)
+                if ticker_symbol in failed:
+                    continue
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"Error processing {label} for {ticker_symbol}: {e}")
+                    failed.add(ticker_symbol)
+                    yield ticker_symbol, prices[ticker_symbol][0], None
                     continue
 
-                logger.info(f"Fetching option chain for {ticker_symbol} on {exp_str}")
-                opt_chain = ticker.option_chain(exp_str)
-                calls = opt_chain.calls.to_dict('records')
-                logger.info(f"Found {len(calls)} calls for {ticker_symbol} on {exp_str}")
-
-                use_delta_filter = 'delta' in opt_chain.calls.columns and not opt_chain.calls['delta'].isnull().all()
-
-                for c in calls:
-                    contract_name = f"{ticker_symbol} {exp_str} {c['strike']}C"
-                    c['otmPercent'] = (c['strike'] - current_price) / current_price * 100 if current_price > 0 else 0
-
-                    if c.get('volume', 0) < filters.get('MIN_VOLUME', 0):
-                        logger.debug(f"Filtering out {contract_name}: Volume {c.get('volume', 0)} < {filters.get('MIN_VOLUME', 0)}")
-                        continue
-                    if c.get('openInterest', 0) < filters.get('MIN_OPEN_INTEREST', 0):
-                        logger.debug(f"Filtering out {contract_name}: Open Interest {c.get('openInterest', 0)} < {filters.get('MIN_OPEN_INTEREST', 0)}")
-                        continue
-
-                    filter_passed = False
-                    if use_delta_filter:
-                        delta_val = c.get('delta', 0)
-                        if filters.get('CALL_DELTA_MIN', 0) <= delta_val <= filters.get('CALL_DELTA_MAX', 1):
-                            filter_passed = True
-                        else:
-                            logger.debug(f"Filtering out {contract_name}: Delta {delta_val} not in range [{filters.get('CALL_DELTA_MIN', 0)}, {filters.get('CALL_DELTA_MAX', 1)}]")
-                    else: # Fallback to OTM
-                        if filters.get('CALL_OTM_PERCENT_MIN', 0) <= c['otmPercent'] <= filters.get('CALL_OTM_PERCENT_MAX', 100):
-                            filter_passed = True
-                        else:
-                            logger.debug(f"Filtering out {contract_name}: OTM % {c['otmPercent']} not in range [{filters.get('CALL_OTM_PERCENT_MIN', 0)}, {filters.get('CALL_OTM_PERCENT_MAX', 100)}]")
-
-                    if not filter_passed:
-                        continue
-
-                    logger.info(f"Contract {contract_name} passed all filters. Adding to results.")
-                    premium = c.get('bid', 0)
-                    if premium == 0:
-                        premium = c.get('lastPrice', 0)
-                    c['ticker'] = ticker_symbol
-                    c['expirationDate'] = exp_str
-                    c['premium'] = premium
-                    c['DTE'] = dte
-                    c['currentPrice'] = current_price
-                    c['collateral'] = current_price * 100
-                    c['weeklyReturn'] = (premium / current_price) / (dte / 7) * 100 if dte > 0 and current_price > 0 else 0
-                    c['annualizedReturn'] = (premium / current_price) * (365 / dte) * 100 if dte > 0 and current_price > 0 else 0
-                    if math.isnan(c['volume']):
-                        c['volume'] = 0
-                    if math.isnan(c['openInterest']):
-                        c['openInterest'] = 0
-
-                    # Calculate greeks
-                    t = dte / 365.0
-                    iv = c.get('impliedVolatility', 0)
-                    greeks = calculate_greeks('c', current_price, c['strike'], t, risk_free_rate, iv)
-                    c.update(greeks)
-
-                    all_calls.append(c)
-        except Exception as e:
-            logger.error(f"Error processing calls for {ticker_symbol}: {e}")
+                if expiration is None:
+                    window = list(_expirations_in_window(result, ticker_symbol, filters, today))
+                    chains[ticker_symbol] = []
+                    outstanding[ticker_symbol] = len(window)
+                    for position, (exp_str, dte) in enumerate(window):
+                        logger.info(f"Fetching option chain for {ticker_symbol} on {exp_str}")
+                        chain_future = pool.submit(provider.option_chain, ticker_symbol, exp_str)
+                        pending[chain_future] = (ticker_symbol, (position, exp_str, dte))
+                else:
+                    chains[ticker_symbol].append((*expiration, result))
+                    outstanding[ticker_symbol] -= 1
+
+                if outstanding[ticker_symbol] == 0:
+                    ordered = [chain[1:] for chain in sorted(chains.pop(ticker_symbol), key=lambda chain: chain[0])]
+                    yield ticker_symbol, prices[ticker_symbol][0], ordered
+    finally:
+        # An abandoned generator must not keep queued fetches running
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def _stack_chains(chains, side):
+    """
+    Concatenates one side ('calls' or 'puts') of several expirations into a single
+    frame, tagging each row with its expirationDate and DTE.
+    """
+    frames = [getattr(opt_chain, side).assign(expirationDate=exp_str, DTE=dte) for exp_str, dte, opt_chain in chains]
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+def _rows(value, rows):
+    # A scalar, or the given rows of a per-row value
+    return value if np.ndim(value) == 0 else np.asarray(value)[rows]
+
+def _repair_iv(chain, flag, current_price, risk_free_rate):
+    """
+    Replaces stale implied volatilities (missing, or outside STALE_IV_RANGE as
+    yfinance reports them off-hours) with the volatility implied by the bid/ask
+    mid, or by the last price when there is no two-sided quote. Rows whose price
+    implies no volatility keep their quote.
+    Also adds 'ivDelta': the delta computed from the (repaired) IV for the rows
+    yfinance quoted no delta for, NaN elsewhere, so the income delta filter
+    works off-hours instead of falling back to OTM% (see _income_delta).
+    flag / current_price / risk_free_rate: scalars, or per row
+    Returns a copy of the chain.
+    """
+    quoted = _column(chain, 'impliedVolatility', np.nan).to_numpy(dtype=float)
+    stale = ~((quoted >= STALE_IV_RANGE[0]) & (quoted <= STALE_IV_RANGE[1]))
+    volatility = quoted
+    if stale.any():
+        with metrics.timer('stage_seconds', stage='iv_repair'):
+            rows = chain.loc[stale]
+            bid = _column(rows, 'bid', np.nan).to_numpy(dtype=float)
+            ask = _column(rows, 'ask', np.nan).to_numpy(dtype=float)
+            price = np.where((bid > 0) & (ask >= bid), (bid + ask) / 2, _column(rows, 'lastPrice', np.nan).to_numpy(dtype=float))
+            solved = implied_volatility_batch(
+                _rows(flag, stale), price, _rows(current_price, stale), rows['strike'], rows['DTE'] / 365.0, _rows(risk_free_rate, stale),
+            )
+            repaired = np.flatnonzero(stale)[np.isfinite(solved)]
+            volatility = quoted.copy()
+            volatility[repaired] = solved[np.isfinite(solved)]
+        metrics.inc('iv_repaired_total', len(repaired))
+        logger.debug(f"Repaired {len(repaired)} of {int(stale.sum())} stale implied volatilities")
+
+    missing = _column(chain, 'delta', np.nan).isna().to_numpy()
+    iv_delta = np.full(len(chain), np.nan)
+    if missing.any():
+        iv_delta[missing] = calculate_greeks_batch(
+            _rows(flag, missing), _rows(current_price, missing), chain['strike'].to_numpy(dtype=float)[missing],
+            chain['DTE'].to_numpy(dtype=float)[missing] / 365.0, _rows(risk_free_rate, missing), volatility[missing],
+        )['delta']
+    return chain.assign(impliedVolatility=volatility, ivDelta=iv_delta)
+
+def _compute_greeks(frame, flag, current_price, risk_free_rate, reused=None):
+    """
+    Computes greeks for every row of a stacked chain frame in a single batch.
+    Returns {name: float array} in row order, NaN where calculate_greeks would
+    return None.
+    reused: optional (mask, values) carrying over the greeks of the rows selected by
+    the boolean mask (values: {name: array} for those rows); only the rest are computed.
+    """
+    with metrics.timer('stage_seconds', stage='greeks'):
+        strike = frame['strike'].to_numpy(dtype=float)
+        dte = frame['DTE'].to_numpy(dtype=float)
+        volatility = _column(frame, 'impliedVolatility').to_numpy(dtype=float)
+        if reused is None:
+            return calculate_greeks_batch(flag, current_price, strike, dte / 365.0, risk_free_rate, volatility)
+        mask, values = reused
+        fresh = ~mask
+        merged = {name: np.empty(len(frame)) for name in GREEK_NAMES}
+        for name in GREEK_NAMES:
+            merged[name][mask] = values[name]
+        if fresh.any():
+            # Plain arrays: selecting DataFrame rows would cost more than the greeks
+            price = np.asarray(current_price, dtype=float)
+            price = price[fresh] if price.ndim else price
+            greeks = calculate_greeks_batch(flag, price, strike[fresh], dte[fresh] / 365.0, risk_free_rate, volatility[fresh])
+            for name in GREEK_NAMES:
+                merged[name][fresh] = greeks[name]
+    return merged
+
+def _dte_mask(chain, filters):
+    return chain['DTE'].between(filters.get('DTE_MIN', 0), filters.get('DTE_MAX', 9999))
+
+def _liquidity_mask(chain, filters):
+    # NaN volume/OI compares False, so such rows pass exactly as they did row by row
+    volume_ok = ~(_column(chain, 'volume') < filters.get('MIN_VOLUME', 0))
+    open_interest_ok = ~(_column(chain, 'openInterest') < filters.get('MIN_OPEN_INTEREST', 0))
+    return volume_ok & open_interest_ok
+
+def _count(stage_counts, stage, rows):
+    stage_counts[stage] = stage_counts.get(stage, 0) + int(rows)
+
+def _income_delta(chain):
+    """
+    The delta the income filter checks: yfinance's quote, or, on chains repaired by
+    _repair_iv (repairIv), the one computed from the repaired IV where there is none.
+    """
+    delta = _column(chain, 'delta', np.nan)
+    if 'ivDelta' in chain.columns:
+        delta = delta.where(delta.notna(), chain['ivDelta'])
+    return delta
 
-    logger.info(f"Income analysis complete. Found {len(all_puts)} puts and {len(all_calls)} calls.")
-    logger.debug(f"all_puts: {all_puts} and all_calls: {all_calls}")
+def _delta_groups(chain, groups):
+    """
+    Per row of an unfiltered chain, whether its group (expiration) has any delta
+    (see _income_delta), as a bool array. Decided before the liquidity filter drops
+    rows, as the per-contract screen did.
+    groups: grouping key(s), e.g. the expirationDate column
+    """
+    if 'delta' not in chain.columns and 'ivDelta' not in chain.columns:
+        return np.zeros(len(chain), dtype=bool)
+    return _income_delta(chain).notna().groupby(groups).transform('any').to_numpy(dtype=bool)
+
+def _income_mask(chain, flag, current_price, filters, use_delta_filter):
+    """
+    The income delta/OTM% filter: contracts are checked by delta in every group
+    (expiration) that has any delta (quoted, or computed from the repaired IV with
+    repairIv), and by OTM% elsewhere.
+    current_price: scalar, or per row when the chain spans several tickers
+    use_delta_filter: per row, from _delta_groups on the chain before liquidity
+    Returns (mask, otm_percent).
+    """
+    side = 'PUT' if flag == 'p' else 'CALL'
+    strike = chain['strike']
+    price = pd.Series(current_price, index=chain.index, dtype=float)
+    moneyness = (price - strike) if flag == 'p' else (strike - price)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        otm_percent = (moneyness / price * 100).where(price > 0, 0.0)
+
+    delta_val = _income_delta(chain)
+    if flag == 'p':
+        delta_val = delta_val.abs()
+    delta_ok = delta_val.between(filters.get(f'{side}_DELTA_MIN', 0), filters.get(f'{side}_DELTA_MAX', 1))
+    otm_ok = otm_percent.between(filters.get(f'{side}_OTM_PERCENT_MIN', 0), filters.get(f'{side}_OTM_PERCENT_MAX', 100))
+    return delta_ok.where(use_delta_filter, otm_ok).astype(bool), otm_percent
+
+def _screen_income_chain(chain, flag, ticker_symbol, current_price, risk_free_rate, filters, stage_counts, memory=None):
+    """
+    Applies the income filters to a stacked chain as boolean masks and returns
+    the surviving contracts as an INCOME_COLUMNS table.
+    flag: 'p' for cash-secured puts, 'c' for covered calls
+    stage_counts: dict accumulating rows left after each stage
+    memory: optional ChainMemory (incremental rescans); survivors whose inputs are
+    unchanged since the previous scan reuse its greeks.
+    """
+    if chain.empty:
+        return _result_table(None, INCOME_COLUMNS)
+    side = 'PUT' if flag == 'p' else 'CALL'
+    _count(stage_counts, 'chain', len(chain))
+
+    # Whether each expiration is checked by delta depends on the whole chain
+    use_delta_filter = _delta_groups(chain, chain['expirationDate'])
+
+    # Stage 1: liquidity and DTE
+    liquid = (_dte_mask(chain, filters) & _liquidity_mask(chain, filters)).to_numpy()
+    chain = chain.loc[liquid]
+    _count(stage_counts, 'liquidity_dte', len(chain))
+
+    # Stage 2: delta, per expiration whenever there is any; otherwise OTM%
+    mask, otm_percent = _income_mask(chain, flag, current_price, filters, use_delta_filter[liquid])
+    _count(stage_counts, 'delta_otm', mask.sum())
+    logger.info(f"{ticker_symbol} {side.lower()}s: {int(mask.sum())} contracts passed filters")
+
+    selected = chain.loc[mask]
+    if selected.empty:
+        return _result_table(None, INCOME_COLUMNS)
+    reused = None
+    if memory is not None:
+        keys, inputs, unchanged = memory.match(selected)
+        reused = memory.reused_greeks(keys, unchanged)
+        _count(stage_counts, 'reused', reused[0].sum())
+
+    # Stage 3: returns and greeks for the survivors only
+    table = _income_table(selected, flag, ticker_symbol, current_price, risk_free_rate, otm_percent[mask], reused)
+    # Only the rows whose greeks were actually computed
+    _count(stage_counts, 'greeks', len(selected) - (reused[0].sum() if reused is not None else 0))
+    if memory is not None:
+        memory.remember_all(keys, inputs, {name: table[name].to_numpy() for name in GREEK_NAMES})
+    _count(stage_counts, 'selected', len(table))
+    return table
+
+def _sell_premium(chain):
+    """
+    Premium a seller collects per share: the bid, or the last price when there is no bid.
+    """
+    bid = _column(chain, 'bid')
+    return bid.where(bid != 0, _column(chain, 'lastPrice'))
+
+def _income_table(selected, flag, ticker_symbol, current_price, risk_free_rate, otm_percent, reused=None, greeks=None):
+    """
+    Computes premium, collateral, returns and greeks for the income survivors and
+    returns them as an INCOME_COLUMNS table.
+    ticker_symbol / current_price: scalars, or per row for a multi-ticker frame
+    reused: optional greeks carried over from the previous scan (see _compute_greeks)
+    greeks: optional precomputed {name: array} for the rows, skipping the computation
+    """
+    premium = _sell_premium(selected)
+    dte = selected['DTE']
+    # Puts are measured against the strike (collateral), calls against the stock price
+    base = selected['strike'] if flag == 'p' else pd.Series(current_price, index=selected.index, dtype=float)
+    has_return = (dte > 0) & (base > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weekly_return = (premium / base) / (dte / 7) * 100
+        annualized_return = (premium / base) * (365 / dte) * 100
+
+    if greeks is None:
+        greeks = _compute_greeks(selected, flag, current_price, risk_free_rate, reused)
+    with metrics.timer('stage_seconds', stage='result_assembly'):
+        return _result_table(
+            selected, INCOME_COLUMNS,
+            ticker=ticker_symbol,
+            premium=premium,
+            currentPrice=current_price,
+            collateral=base * 100,
+            weeklyReturn=weekly_return.where(has_return, 0),
+            annualizedReturn=annualized_return.where(has_return, 0),
+            volume=_column(selected, 'volume').fillna(0),
+            openInterest=_column(selected, 'openInterest').fillna(0),
+            otmPercent=otm_percent,
+            **greeks,
+        )
+
+def _buy_delta_range(flag, filters):
+    if flag == 'c':
+        return filters.get('BUY_CALL_DELTA_MIN', 0.4), filters.get('BUY_CALL_DELTA_MAX', 1.0)
+    return filters.get('BUY_PUT_DELTA_MIN', -1.0), filters.get('BUY_PUT_DELTA_MAX', -0.4)
+
+def _screen_buy_chain(chain, flag, ticker_symbol, current_price, risk_free_rate, filters, stage_counts, memory=None):
+    """
+    Applies the buy filters to a stacked chain, cheapest and most selective first:
+    liquidity and DTE, then the strike window implied by the delta range, and only
+    then greeks for the remaining contracts. Returns the survivors as a
+    BUY_COLUMNS table.
+    flag: 'c' for bullish calls, 'p' for bearish puts
+    stage_counts: dict accumulating rows left after each stage
+    memory: optional ChainMemory (incremental rescans); candidates whose inputs are
+    unchanged since the previous scan reuse its greeks.
+    """
+    if chain.empty:
+        return _result_table(None, BUY_COLUMNS)
+    delta_min, delta_max = _buy_delta_range(flag, filters)
+    _count(stage_counts, 'chain', len(chain))
+
+    # Stage 1: liquidity and DTE
+    chain = chain.loc[_dte_mask(chain, filters) & _liquidity_mask(chain, filters)]
+    _count(stage_counts, 'liquidity_dte', len(chain))
+
+    # Stage 2: greeks are only filled in where yfinance gave no usable delta. Quoted
+    # deltas are checked directly; the rest must at least sit in the strike window
+    # the delta range implies (degenerate rows go on to the exact check).
+    quoted_delta = _column(chain, 'delta', np.nan)
+    needs_greeks = quoted_delta.isna() | (quoted_delta == 0)
+    strike_min, strike_max = delta_strike_bounds(
+        flag, current_price, chain['DTE'] / 365.0, risk_free_rate,
+        _column(chain, 'impliedVolatility'), delta_min, delta_max,
+    )
+    strike = chain['strike'].to_numpy(dtype=float)
+    in_window = ((strike >= strike_min) & (strike <= strike_max)) | np.isnan(strike_min) | (strike <= 0)
+    keep = (needs_greeks & in_window) | (~needs_greeks & quoted_delta.between(delta_min, delta_max))
+    chain = chain.loc[keep]
+    needs_greeks = needs_greeks[keep]
+    _count(stage_counts, 'delta_bounds', len(chain))
+    if memory is not None:
+        keys, inputs, unchanged = memory.match(chain)
+
+    # Stage 3: greeks for the remaining candidates, then the exact delta check
+    delta_val = _column(chain, 'delta', np.nan)
+    greek_values = {name: _column(chain, name, np.nan).to_numpy(dtype=float, copy=True) for name in GREEK_NAMES}
+    reused = None
+    if needs_greeks.any():
+        missing_rows = needs_greeks.to_numpy()
+        missing = chain.loc[missing_rows]
+        if memory is not None:
+            reused = memory.reused_greeks(keys[missing_rows], unchanged[missing_rows])
+            _count(stage_counts, 'reused', reused[0].sum())
+        greeks = _compute_greeks(missing, flag, current_price, risk_free_rate, reused)
+        for name in GREEK_NAMES:
+            greek_values[name][missing_rows] = greeks[name]
+        computed_delta = pd.Series(np.nan_to_num(greeks['delta'], nan=0.0), index=missing.index)
+        delta_val = delta_val.where(~needs_greeks, computed_delta)
+    # Only the rows whose greeks were actually computed
+    _count(stage_counts, 'greeks', needs_greeks.sum() - (reused[0].sum() if reused is not None else 0))
+    if memory is not None:
+        # Only greeks computed here are remembered, for every such candidate (a later
+        # scan with another delta range can reuse them too). Rows with a quoted delta
+        # have none, and must be computed should a later scan lose the quote.
+        computed = needs_greeks.to_numpy()
+        memory.remember_all(keys[computed], inputs[computed], {name: values[computed] for name, values in greek_values.items()})
+
+    mask = delta_val.between(delta_min, delta_max)
+    label = 'bullish calls' if flag == 'c' else 'bearish puts'
+    logger.info(f"{ticker_symbol} {label}: {int(mask.sum())} contracts passed filters")
+
+    positions = np.flatnonzero(mask.to_numpy())
+    if len(positions) == 0:
+        table = _result_table(None, BUY_COLUMNS)
+    else:
+        selected_greeks = {name: values[positions] for name, values in greek_values.items()}
+        table = _buy_table(chain.iloc[positions], flag, ticker_symbol, current_price, delta_val, selected_greeks)
+    _count(stage_counts, 'selected', len(table))
+    return table
+
+def _buy_table(selected, flag, ticker_symbol, current_price, delta_val, greeks):
+    """
+    Computes premium and buyScore for the buy survivors and returns them as a
+    BUY_COLUMNS table.
+    ticker_symbol / current_price: scalars, or per row for a multi-ticker frame
+    delta_val: quoted or computed delta, indexed like the chain the rows came from
+    greeks: {name: array} for the selected rows, quoted where yfinance had them
+    """
+    score_delta = delta_val[selected.index] if flag == 'c' else delta_val[selected.index].abs()
+    buy_score = (score_delta * 100) + (_column(selected, 'volume') / 100) + (_column(selected, 'openInterest') / 1000)
+    with metrics.timer('stage_seconds', stage='result_assembly'):
+        return _result_table(
+            selected, BUY_COLUMNS,
+            ticker=ticker_symbol,
+            currentPrice=current_price,
+            premium=_column(selected, 'ask'),
+            buyScore=buy_score,
+            **greeks,
+        )
+
+# Strategy -> (result key, chain side, option flag, screening function)
+STRATEGIES = {
+    'csp': ('puts', 'puts', 'p', _screen_income_chain),
+    'covered_call': ('calls', 'calls', 'c', _screen_income_chain),
+    'bullish_call': ('bullish_calls', 'calls', 'c', _screen_buy_chain),
+    'bearish_put': ('bearish_puts', 'puts', 'p', _screen_buy_chain),
+}
+INCOME_STRATEGIES = ('csp', 'covered_call')
+BUY_STRATEGIES = ('bullish_call', 'bearish_put')
+# Result key -> table schema
+RESULT_COLUMNS = {
+    'puts': INCOME_COLUMNS,
+    'calls': INCOME_COLUMNS,
+    'bullish_calls': BUY_COLUMNS,
+    'bearish_puts': BUY_COLUMNS,
+}
+
+# Result key -> column the contracts are ranked by, best first
+RANK_COLUMNS = {
+    'puts': 'annualizedReturn',
+    'calls': 'annualizedReturn',
+    'bullish_calls': 'buyScore',
+    'bearish_puts': 'buyScore',
+}
+
+def _ranked(table, column):
+    return table.sort_values([column, 'contractSymbol'], ascending=[False, True], na_position='last', ignore_index=True)
+
+def rank_contracts(table, column, top_k=None, per_ticker=None, per_expiry=None):
+    """
+    Returns a result table's rows best first: by column descending (NaN last), ties
+    by contractSymbol, so the order does not depend on the order rows arrived in.
+    per_expiry / per_ticker: keep at most this many rows per (ticker, expiration) /
+    per ticker, the best ones.
+    top_k: keep the best top_k rows. They are picked with a partial sort
+    (np.partition), so only those candidates are fully sorted.
+    """
+    if per_expiry or per_ticker:
+        table = _ranked(table, column)
+        if per_expiry:
+            table = table.loc[table.groupby(['ticker', 'expirationDate'], sort=False).cumcount().to_numpy() < per_expiry]
+        if per_ticker:
+            table = table.loc[table.groupby('ticker', sort=False).cumcount().to_numpy() < per_ticker]
+        return table.head(top_k).reset_index(drop=True) if top_k else table.reset_index(drop=True)
+    if top_k and len(table) > top_k:
+        values = table[column].to_numpy(dtype=float)
+        values = np.where(np.isnan(values), -np.inf, values)
+        threshold = np.partition(values, len(values) - top_k)[len(values) - top_k]
+        # Everything at or above the k-th best value; ties at the threshold are
+        # settled by the exact ranking below
+        return _ranked(table.loc[values >= threshold], column).head(top_k)
+    return _ranked(table, column)
+
+def _ranking(params):
+    """
+    The rank_contracts options a scan's params ask for (topK, perTickerCap,
+    perExpiryCap), or None to keep results in ticker order.
+    """
+    ranking = {
+        'top_k': params.get('topK') or None,
+        'per_ticker': params.get('perTickerCap') or None,
+        'per_expiry': params.get('perExpiryCap') or None,
+    }
+    return ranking if any(ranking.values()) else None
+
+def _split_tickers(value):
+    return [s for s in value.split(',') if s]
+
+def _strategy_tickers(params, strategy):
+    """
+    Ticker list a strategy runs on: puts are sold on putTickers, calls on callTickers,
+    and the buy screens use buyTickers (or both lists when that is not given).
+    """
+    if strategy == 'csp':
+        return _split_tickers(params.get('putTickers', ''))
+    if strategy == 'covered_call':
+        return _split_tickers(params.get('callTickers', ''))
+    if 'buyTickers' in params:
+        return _split_tickers(params['buyTickers'])
+    return _split_tickers(params.get('putTickers', '')) + _split_tickers(params.get('callTickers', ''))
+
+def _merge_stage_counts(total, counts):
+    for result_key, stages in counts.items():
+        for stage, rows in stages.items():
+            _count(total.setdefault(result_key, {}), stage, rows)
+
+def _record_ticker_metrics(outcome, seconds, stage_counts):
+    metrics.inc('tickers_total', outcome=outcome)
+    metrics.observe('ticker_seconds', seconds)
+    for result_key, counts in stage_counts.items():
+        for stage, rows in counts.items():
+            metrics.inc('filter_rows_total', rows, result=result_key, stage=stage)
+
+def _contract_changes(ticker_symbol, flag, entered, left):
+    option_type = 'put' if flag == 'p' else 'call'
     return {
-        'puts': all_puts,
-        'calls': all_calls
+        name: [
+            {'ticker': ticker_symbol, 'expirationDate': exp_str, 'strike': strike, 'type': option_type}
+            for exp_str, strike in keys
+        ]
+        for name, keys in (('entered', entered), ('left', left))
     }
 
-def analyze_buy_options(params):
+def _merge_changes(total, changes):
+    for result_key, moved in changes.items():
+        for name, contracts in moved.items():
+            total.setdefault(result_key, {'entered': [], 'left': []})[name].extend(contracts)
+
+def _scan_source(params, universe, context, provider):
     """
-    Analyzes options for buying strategies.
+    Resolves where a scan's data comes from: a replayed snapshot when
+    params['replaySnapshot'] is set, else the given provider (live Yahoo data by
+    default). Returns (provider, context, replay).
     """
-    tickers = list(set(params.get('putTickers', '').split(',') + params.get('callTickers', '').split(',')))
-    filters = params.get('filters', {})
-    logger.debug(f"Starting buy analysis with filters: {filters}")
+    replay = bool(params.get('replaySnapshot'))
+    if replay:
+        provider = SnapshotProvider(params['replaySnapshot'])
+        logger.info(f"Replaying market snapshot {provider.snapshot.path}")
+        context = provider.market_context(universe)
+    elif provider is None:
+        provider = YahooProvider()
+    if context is None:
+        context = provider.market_context(universe)
+    return provider, context, replay
 
+def _record_snapshot(snapshot_dir, context, fetched):
+    try:
+        SnapshotStore(snapshot_dir).write(datetime.now(MARKET_TZ), context.prices, context.risk_free_rate, fetched)
+    except Exception as e:
+        logger.error(f"Could not write market snapshot: {e}")
 
-    bullish_calls = []
-    bearish_puts = []
-    today = date.today()
-    risk_free_rate = get_risk_free_rate()
+def _unlisted_changes(state, strategies, tickers_by_strategy):
+    """
+    With a state: forgets the tickers no longer in a strategy's list and returns
+    their contracts as having left its results, in the form of an update's changes.
+    """
+    changes = {}
+    if state is None:
+        return changes
+    for strategy in strategies:
+        result_key, _, flag, _ = STRATEGIES[strategy]
+        for ticker_symbol in state.tickers(result_key):
+            if ticker_symbol not in tickers_by_strategy[strategy]:
+                _merge_changes(changes, {result_key: _contract_changes(ticker_symbol, flag, [], state.drop(result_key, ticker_symbol))})
+    return changes
 
-    for ticker_symbol in tickers:
-        if not ticker_symbol: continue
-        logger.info(f"Processing buy analysis for {ticker_symbol}")
+def _screen_ticker(ticker_symbol, current_price, chains, strategies, tickers_by_strategy, filters, risk_free_rate, repair_iv, ranking, state):
+    """
+    Screens one ticker's fetched chains (None when it was skipped or failed) for
+    every strategy whose list includes it, ranking its tables when asked.
+    Returns (update, stacked): the ticker's iter_scan update without 'completed' /
+    'total' ('changes' only with a state), and its stacked (IV-repaired) chain per
+    side, for reuse.
+    """
+    results = {STRATEGIES[strategy][0]: _result_table(None, RESULT_COLUMNS[STRATEGIES[strategy][0]]) for strategy in strategies}
+    stage_counts = {result_key: {} for result_key in results}
+    outcome = 'skipped' if pd.isna(current_price) else 'failed'
+    screened = []
+    stacked = {}
+    if chains is not None:
+        logger.info(f"Processing {ticker_symbol}")
         try:
-            ticker = yf.Ticker(ticker_symbol)
-            current_price, price_type = get_live_or_close_price(ticker)
-            if pd.isna(current_price):
-                logger.warning(f"Could not get current price for {ticker_symbol}. Skipping.")
+            for strategy in strategies:
+                if ticker_symbol not in tickers_by_strategy[strategy]:
+                    continue
+                result_key, side, flag, screen = STRATEGIES[strategy]
+                if side not in stacked:
+                    stacked[side] = _stack_chains(chains, side)
+                    if repair_iv and not stacked[side].empty:
+                        stacked[side] = _repair_iv(stacked[side], flag, current_price, risk_free_rate)
+                memory = state.memory(result_key, ticker_symbol, current_price, risk_free_rate) if state is not None else None
+                with metrics.timer('stage_seconds', stage='filtering'):
+                    results[result_key] = screen(
+                        stacked[side], flag, ticker_symbol, current_price, risk_free_rate, filters, stage_counts[result_key], memory,
+                    )
+                if ranking is not None:
+                    # Caps are per ticker, and a ticker's own top K holds its share
+                    # of the overall top K, so ranking each ticker loses nothing
+                    results[result_key] = rank_contracts(results[result_key], RANK_COLUMNS[result_key], **ranking)
+                screened.append((result_key, flag, memory))
+            outcome = 'ok'
+        except Exception as e:
+            logger.error(f"Error processing scan for {ticker_symbol}: {e}")
+            results = {result_key: _result_table(None, RESULT_COLUMNS[result_key]) for result_key in results}
+            screened = []
+            stacked = {}
+    update = {'ticker': ticker_symbol, 'results': results, 'stageCounts': stage_counts, 'outcome': outcome}
+    if state is not None:
+        changes = {}
+        # Only remember a ticker once all of its strategies were screened
+        for result_key, flag, memory in screened:
+            entered, left = state.store(result_key, ticker_symbol, current_price, risk_free_rate, memory, results[result_key])
+            _merge_changes(changes, {result_key: _contract_changes(ticker_symbol, flag, entered, left)})
+        for strategy in strategies:
+            result_key, _, flag, _ = STRATEGIES[strategy]
+            if ticker_symbol in tickers_by_strategy[strategy] and result_key not in (r for r, _, _ in screened):
+                _merge_changes(changes, {result_key: _contract_changes(ticker_symbol, flag, [], state.drop(result_key, ticker_symbol))})
+        update['changes'] = changes
+    return update, stacked
+
+def iter_scan(params, strategies=tuple(STRATEGIES), context=None, provider=None, state=None):
+    """
+    Streaming form of run_scan: screens each ticker as soon as its chains arrive
+    and yields one update per ticker, in completion order, so a slow symbol does
+    not hold back the others. Each update is a dict with
+        'ticker'      the ticker just finished
+        'results'     that ticker's result tables, keyed like run_scan's results
+        'stageCounts' that ticker's rows left after each screening stage
+        'outcome'     'ok', 'skipped' (no spot price) or 'failed' (a fetch or the
+                      screen failed after the request governor's retries)
+        'completed'   tickers finished so far (including skipped/failed ones)
+        'total'       tickers in the scan
+        'changes'     with a state only: contracts that entered or left each result
+                      list for this ticker (the first update also carries tickers
+                      that are no longer scanned)
+    With ranking params (see run_scan) each ticker's tables are ranked and capped.
+    Takes the same params, strategies, context, provider and state as run_scan.
+    """
+    scan_start = time.perf_counter()
+    filters = params.get('filters', {})
+    logger.debug(f"Starting scan for {list(strategies)} with filters: {filters}")
+    tickers_by_strategy = {strategy: set(_strategy_tickers(params, strategy)) for strategy in strategies}
+    universe = list(dict.fromkeys(s for strategy in strategies for s in _strategy_tickers(params, strategy)))
+
+    provider, context, replay = _scan_source(params, universe, context, provider)
+    today = provider.today()
+    risk_free_rate = context.risk_free_rate
+    max_workers = params.get('maxWorkers', DEFAULT_MAX_WORKERS)
+    repair_iv = params.get('repairIv', False)
+    ranking = _ranking(params)
+    record = params.get('snapshotDir') and not replay
+    fetched = []
+
+    changes = _unlisted_changes(state, strategies, tickers_by_strategy)
+
+    completed = 0
+    # Each ticker's own start, so its latency does not include waiting for others
+    started = {} if metrics.enabled else None
+    for ticker_symbol, current_price, chains in _iter_universe(universe, context.prices, filters, today, max_workers, 'scan', provider, started):
+        completed += 1
+        if chains is not None and record:
+            fetched.append((ticker_symbol, current_price, chains))
+        update, _ = _screen_ticker(
+            ticker_symbol, current_price, chains, strategies, tickers_by_strategy, filters, risk_free_rate, repair_iv, ranking, state,
+        )
+        if metrics.enabled:
+            # Skipped tickers never started a request and count from the scan's start
+            _record_ticker_metrics(update['outcome'], time.perf_counter() - started.get(ticker_symbol, scan_start), update['stageCounts'])
+        update.update(completed=completed, total=len(universe))
+        if state is not None:
+            _merge_changes(changes, update['changes'])
+            update['changes'] = changes
+            changes = {}
+        yield update
+
+    if record:
+        _record_snapshot(params['snapshotDir'], context, fetched)
+    metrics.inc('scans_total')
+    metrics.observe('scan_seconds', time.perf_counter() - scan_start)
+    logger.info(f"Market data cache: {cache_stats()}")
+
+def run_scan(params, strategies=tuple(STRATEGIES), context=None, provider=None, state=None):
+    """
+    Scans the union of all strategies' tickers, fetching each (ticker, expiration)
+    chain exactly once and evaluating every requested strategy against it in one pass.
+    strategies: names from STRATEGIES
+    context: optional prebuilt MarketContext; fetched from the provider if omitted.
+    provider: where spots, expirations and chains come from (see utils.providers);
+    defaults to live Yahoo data.
+    params['snapshotDir'] records the fetched market data as a snapshot there;
+    params['replaySnapshot'] (a snapshot directory) screens that recorded state
+    instead of live data, with DTE measured from the snapshot's date.
+    params['repairIv'] re-solves stale implied volatilities from the quotes before
+    screening (see _repair_iv), so greeks and computed deltas work off-hours.
+    params['topK'], params['perTickerCap'] and params['perExpiryCap'] rank each
+    result list by RANK_COLUMNS, best first, and keep its best topK contracts, at
+    most perTickerCap per ticker and perExpiryCap per (ticker, expiration); see
+    rank_contracts. Only the running top K is kept while tickers come in.
+    state: optional ScanState carried from one scan to the next (incremental mode).
+    Contracts whose DTE, implied volatility, spot and rate are unchanged since the
+    previous scan reuse its greeks; only the others are recomputed.
+    Returns a dict with one result table per requested strategy, keyed like the
+    analyze_* results ('puts', 'calls', 'bullish_calls', 'bearish_puts'): a
+    DataFrame with the RESULT_COLUMNS schema for that key (INCOME_COLUMNS or
+    BUY_COLUMNS), one row per contract in input ticker order (best first when
+    ranked). Plus
+    'stageCounts': rows left after each screening stage, per result list,
+    'requestStats': the Yahoo requests made while the scan ran ('requests',
+    'retries', 'throttled', 'failed'; see utils.governor) and 'droppedTickers', the
+    tickers that produced no results because a fetch failed or no spot price was
+    found, and, with a state, 'changes': {result key: {'entered': [...], 'left': [...]}} listing the
+    contracts ({'ticker', 'expirationDate', 'strike', 'type'}) that entered or left
+    each result list since the previous scan.
+    """
+    by_ticker = {}
+    stage_counts = {STRATEGIES[strategy][0]: {} for strategy in strategies}
+    changes = {result_key: {'entered': [], 'left': []} for result_key in stage_counts}
+    ranking = _ranking(params)
+    top_k = ranking['top_k'] if ranking is not None else None
+    best = {result_key: _result_table(None, RESULT_COLUMNS[result_key]) for result_key in stage_counts}
+    requests_before = request_stats()
+    dropped = set()
+    for update in iter_scan(params, strategies, context, provider, state):
+        if update['outcome'] != 'ok':
+            dropped.add(update['ticker'])
+        if top_k:
+            # Merge into the running top K, so memory is bounded by K, not the result count
+            for result_key, table in update['results'].items():
+                merged = _concat_results([best[result_key], table], RESULT_COLUMNS[result_key])
+                best[result_key] = rank_contracts(merged, RANK_COLUMNS[result_key], top_k=top_k)
+        else:
+            by_ticker[update['ticker']] = update['results']
+        _merge_stage_counts(stage_counts, update['stageCounts'])
+        _merge_changes(changes, update.get('changes', {}))
+
+    # Reassemble in input ticker order, independent of which fetch finished first
+    universe = dict.fromkeys(s for strategy in strategies for s in _strategy_tickers(params, strategy))
+    results = {}
+    for result_key in stage_counts:
+        if top_k:
+            results[result_key] = best[result_key]
+            continue
+        tables = (by_ticker.get(ticker_symbol, {}).get(result_key) for ticker_symbol in universe)
+        results[result_key] = _concat_results([table for table in tables if table is not None], RESULT_COLUMNS[result_key])
+        if ranking is not None:
+            results[result_key] = rank_contracts(results[result_key], RANK_COLUMNS[result_key])
+
+    for result_key, counts in stage_counts.items():
+        logger.info(f"Rows left after each stage for {result_key}: {counts}")
+    results['stageCounts'] = stage_counts
+    results['requestStats'] = _request_report(requests_before, universe, dropped)
+    if state is not None:
+        for moved in changes.values():
+            for contracts in moved.values():
+                contracts.sort(key=lambda c: (c['ticker'], c['expirationDate'], c['strike']))
+        results['changes'] = changes
+    return results
+
+def _request_report(requests_before, universe, dropped):
+    """
+    requestStats for a scan: request counters since requests_before plus the
+    dropped tickers in universe order.
+    """
+    report = stats_delta(requests_before, request_stats())
+    report['droppedTickers'] = [ticker_symbol for ticker_symbol in universe if ticker_symbol in dropped]
+    if report['retries'] or report['droppedTickers']:
+        logger.warning(f"Yahoo requests: {report['requests']} made, {report['retries']} retried, {report['throttled']} throttled; dropped tickers: {report['droppedTickers']}")
+    return report
+
+def analyze_income_options(params, context=None, provider=None, state=None):
+    """
+    Analyzes options for income strategies (selling puts/calls).
+    context: optional prebuilt MarketContext; fetched from the provider if omitted.
+    provider: optional data provider (see utils.providers); live Yahoo data by default.
+    state: optional ScanState for incremental rescans (see run_scan).
+    """
+    results = run_scan(params, INCOME_STRATEGIES, context, provider, state)
+    logger.info(f"Income analysis complete. Found {len(results['puts'])} puts and {len(results['calls'])} calls.")
+    logger.debug(f"all_puts: {results['puts']} and all_calls: {results['calls']}")
+    return results
+
+def analyze_buy_options(params, context=None, provider=None, state=None):
+    """
+    Analyzes options for buying strategies.
+    context: optional prebuilt MarketContext; fetched from the provider if omitted.
+    provider: optional data provider (see utils.providers); live Yahoo data by default.
+    state: optional ScanState for incremental rescans (see run_scan).
+    """
+    results = run_scan(params, BUY_STRATEGIES, context, provider, state)
+    logger.info(f"Buy analysis complete. Found {len(results['bullish_calls'])} bullish calls and {len(results['bearish_puts'])} bearish puts.")
+    return results
+
+def iter_income_options(params, context=None, provider=None, state=None):
+    """
+    Streaming form of analyze_income_options; yields one iter_scan update per ticker.
+    """
+    return iter_scan(params, INCOME_STRATEGIES, context, provider, state)
+
+def iter_buy_options(params, context=None, provider=None, state=None):
+    """
+    Streaming form of analyze_buy_options; yields one iter_scan update per ticker.
+    """
+    return iter_scan(params, BUY_STRATEGIES, context, provider, state)
+
+# A filter-independent cache of everything a screener's tickers offer, see build_superset
+Superset = namedtuple('Superset', ['sides', 'risk_free_rate', 'dte_max', 'fetched_at', 'replay', 'request_stats'])
+
+def build_superset(params, strategies=tuple(STRATEGIES), dte_max=60, context=None, provider=None, progress=None,
+                   stream=None, state=None):
+    """
+    Fetches every chain up to dte_max days out for the strategies' tickers once and
+    computes greeks for all of its contracts, so screen_superset can then apply any
+    filters in memory. Takes params, context and provider like run_scan; only the
+    DTE window limits what is fetched ('filters' is ignored).
+    progress: optional callable(completed, total, ticker_symbol), called per ticker.
+    stream: optional callable(update) that receives each ticker's iter_scan update,
+    screened with params' filters as soon as its chains arrive, so results can be
+    shown while the rest is still fetching; state: optional ScanState for those
+    screens (greek reuse and 'changes', as in iter_scan). Their stacked chains are
+    reused for the superset.
+    Returns a Superset: sides maps 'calls' / 'puts' to (frame, greeks, rows), where
+    frame stacks the chains of every ticker screened on that side (in ticker
+    order) with 'ticker' and 'currentPrice' columns, greeks is {name: array}
+    aligned with the frame's rows and rows maps each ticker to its (start, stop)
+    positions. fetched_at is the time.time() of the fetch and request_stats reports
+    its Yahoo requests and dropped tickers like run_scan's requestStats.
+    """
+    tickers_by_side = {}
+    for strategy in strategies:
+        tickers_by_side.setdefault(STRATEGIES[strategy][1], set()).update(_strategy_tickers(params, strategy))
+    universe = list(dict.fromkeys(s for strategy in strategies for s in _strategy_tickers(params, strategy)))
+
+    provider, context, replay = _scan_source(params, universe, context, provider)
+    record = params.get('snapshotDir') and not replay
+    window = {'DTE_MIN': 0, 'DTE_MAX': dte_max}
+    max_workers = params.get('maxWorkers', DEFAULT_MAX_WORKERS)
+    fetched_at = time.time()
+    requests_before = request_stats()
+    if stream is not None:
+        tickers_by_strategy = {strategy: set(_strategy_tickers(params, strategy)) for strategy in strategies}
+        changes = _unlisted_changes(state, strategies, tickers_by_strategy)
+    by_ticker = {}
+    stacked = {}
+    completed = 0
+    for ticker_symbol, current_price, chains in _iter_universe(universe, context.prices, window, provider.today(), max_workers, 'superset', provider):
+        completed += 1
+        if chains is not None:
+            by_ticker[ticker_symbol] = (current_price, chains)
+        if stream is not None:
+            # The screens apply the filters' DTE window to the wider superset chains
+            update, stacked[ticker_symbol] = _screen_ticker(
+                ticker_symbol, current_price, chains, strategies, tickers_by_strategy, params.get('filters', {}),
+                context.risk_free_rate, params.get('repairIv', False), _ranking(params), state,
+            )
+            update.update(completed=completed, total=len(universe))
+            if state is not None:
+                _merge_changes(changes, update['changes'])
+                update['changes'] = changes
+                changes = {}
+            stream(update)
+        if progress is not None:
+            progress(completed, len(universe), ticker_symbol)
+    if record:
+        _record_snapshot(params['snapshotDir'], context, [(s, *by_ticker[s]) for s in universe if s in by_ticker])
+
+    sides = {}
+    for side, side_tickers in tickers_by_side.items():
+        frames, rows, start = [], {}, 0
+        for ticker_symbol in universe:
+            if ticker_symbol not in side_tickers or ticker_symbol not in by_ticker:
+                continue
+            current_price, chains = by_ticker[ticker_symbol]
+            try:
+                frame = stacked.get(ticker_symbol, {}).get(side)
+                if frame is None:
+                    frame = _stack_chains(chains, side)
+                    if params.get('repairIv') and not frame.empty:
+                        frame = _repair_iv(frame, 'p' if side == 'puts' else 'c', current_price, context.risk_free_rate)
+                frame = frame.assign(ticker=ticker_symbol, currentPrice=current_price)
+            except Exception as e:
+                logger.error(f"Error processing superset for {ticker_symbol}: {e}")
                 continue
+            frames.append(frame)
+            rows[ticker_symbol] = (start, start + len(frame))
+            start += len(frame)
+        frame = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['ticker', 'currentPrice', 'strike', 'DTE'])
+        flag = 'p' if side == 'puts' else 'c'
+        greeks = _compute_greeks(frame, flag, frame['currentPrice'], context.risk_free_rate)
+        sides[side] = (frame, greeks, rows)
+    logger.info(f"Superset of {len(by_ticker)} tickers: {', '.join(f'{len(s[0])} {side}' for side, s in sides.items())}")
+    dropped = {ticker_symbol for ticker_symbol in universe if ticker_symbol not in by_ticker}
+    return Superset(sides, context.risk_free_rate, dte_max, fetched_at, replay, _request_report(requests_before, universe, dropped))
 
-            for exp_str in ticker.options:
-                exp_date = pd.to_datetime(exp_str).date()
-                dte = (exp_date - today).days
-                if not (filters.get('DTE_MIN', 0) <= dte <= filters.get('DTE_MAX', 9999)):
-                    logger.debug(f"Skipping expiration {exp_str} for {ticker_symbol} due to DTE: {dte}")
-                    continue
+def _refilter_income(chain, greeks, flag, filters, stage_counts):
+    """
+    _screen_income_chain over a superset frame, with its precomputed greeks.
+    """
+    chain = chain.loc[_dte_mask(chain, filters)]
+    _count(stage_counts, 'chain', len(chain))
+    use_delta_filter = _delta_groups(chain, [chain['ticker'], chain['expirationDate']])
+    liquid = _liquidity_mask(chain, filters).to_numpy()
+    chain = chain.loc[liquid]
+    _count(stage_counts, 'liquidity_dte', len(chain))
+    mask, otm_percent = _income_mask(chain, flag, chain['currentPrice'], filters, use_delta_filter[liquid])
+    _count(stage_counts, 'delta_otm', mask.sum())
+    selected = chain.loc[mask]
+    if selected.empty:
+        return _result_table(None, INCOME_COLUMNS)
+    positions = selected.index.to_numpy()
+    table = _income_table(
+        selected, flag, selected['ticker'], selected['currentPrice'], None, otm_percent[mask],
+        greeks={name: values[positions] for name, values in greeks.items()},
+    )
+    _count(stage_counts, 'selected', len(table))
+    return table
 
-                logger.info(f"Fetching option chain for {ticker_symbol} on {exp_str}")
-                opt_chain = ticker.option_chain(exp_str)
-
-                # --- Process Bullish Calls ---
-                calls = opt_chain.calls.to_dict('records')
-                logger.info(f"Found {len(calls)} calls for {ticker_symbol} on {exp_str}")
-                for c in calls:
-                    contract_name = f"{ticker_symbol} {exp_str} {c['strike']}C"
-                    volume = c.get('volume', 0)
-                    open_interest = c.get('openInterest', 0)
-                    delta_val = c.get('delta')
-
-                    t = dte / 365.0
-                    iv = c.get('impliedVolatility', 0)
-
-                    if pd.isna(delta_val) or delta_val == 0:
-                        greeks = calculate_greeks('c', current_price, c['strike'], t, risk_free_rate, iv)
-                        delta_val = greeks.get('delta')
-                        c.update(greeks)
-                    delta_val = delta_val or 0
-
-                    if volume < filters.get('MIN_VOLUME', 0):
-                        logger.debug(f"Filtering out {contract_name}: Volume {volume} < {filters.get('MIN_VOLUME', 0)}")
-                        continue
-                    if open_interest < filters.get('MIN_OPEN_INTEREST', 0):
-                        logger.debug(f"Filtering out {contract_name}: Open Interest {open_interest} < {filters.get('MIN_OPEN_INTEREST', 0)}")
-                        continue
-                    if not (filters.get('BUY_CALL_DELTA_MIN', 0.4) <= delta_val <= filters.get('BUY_CALL_DELTA_MAX', 1.0)):
-                        logger.debug(f"Filtering out {contract_name}: Delta {delta_val} not in range [{filters.get('BUY_CALL_DELTA_MIN', 0.4)}, {filters.get('BUY_CALL_DELTA_MAX', 1.0)}]")
-                        continue
-
-                    logger.info(f"Contract {contract_name} passed all filters. Adding to bullish calls.")
-                    c['ticker'] = ticker_symbol
-                    c['expirationDate'] = exp_str
-                    c['DTE'] = dte
-                    c['currentPrice'] = current_price
-                    c['premium'] = c.get('ask', 0)
-                    c['buyScore'] = (delta_val * 100) + (volume / 100) + (open_interest / 1000)
-                    bullish_calls.append(c)
-
-                # --- Process Bearish Puts ---
-                puts = opt_chain.puts.to_dict('records')
-                logger.info(f"Found {len(puts)} puts for {ticker_symbol} on {exp_str}")
-                for p in puts:
-                    contract_name = f"{ticker_symbol} {exp_str} {p['strike']}P"
-                    volume = p.get('volume', 0)
-                    open_interest = p.get('openInterest', 0)
-                    delta_val = p.get('delta')
-
-                    t = dte / 365.0
-                    iv = p.get('impliedVolatility', 0)
-
-                    if pd.isna(delta_val) or delta_val == 0:
-                        greeks = calculate_greeks('p', current_price, p['strike'], t, risk_free_rate, iv)
-                        delta_val = greeks.get('delta')
-                        p.update(greeks)
-                    delta_val = delta_val or 0
-
-                    if volume < filters.get('MIN_VOLUME', 0):
-                        logger.debug(f"Filtering out {contract_name}: Volume {volume} < {filters.get('MIN_VOLUME', 0)}")
-                        continue
-                    if open_interest < filters.get('MIN_OPEN_INTEREST', 0):
-                        logger.debug(f"Filtering out {contract_name}: Open Interest {open_interest} < {filters.get('MIN_OPEN_INTEREST', 0)}")
-                        continue
-                    if not (filters.get('BUY_PUT_DELTA_MIN', -1.0) <= delta_val <= filters.get('BUY_PUT_DELTA_MAX', -0.4)):
-                        logger.debug(f"Filtering out {contract_name}: Delta {delta_val} not in range [{filters.get('BUY_PUT_DELTA_MIN', -1.0)}, {filters.get('BUY_PUT_DELTA_MAX', -0.4)}]")
-                        continue
-
-                    logger.info(f"Contract {contract_name} passed all filters. Adding to bearish puts.")
-                    p['ticker'] = ticker_symbol
-                    p['expirationDate'] = exp_str
-                    p['DTE'] = dte
-                    p['currentPrice'] = current_price
-                    p['premium'] = p.get('ask', 0)
-                    p['buyScore'] = (abs(delta_val) * 100) + (volume / 100) + (open_interest / 1000)
-                    bearish_puts.append(p)
-        except Exception as e:
-            logger.error(f"Error processing buy analysis for {ticker_symbol}: {e}")
+def _refilter_buy(chain, greeks, flag, filters, stage_counts):
+    """
+    _screen_buy_chain over a superset frame: computed greeks stand in wherever
+    yfinance gave no usable delta, as in the scan.
+    """
+    delta_min, delta_max = _buy_delta_range(flag, filters)
+    chain = chain.loc[_dte_mask(chain, filters)]
+    _count(stage_counts, 'chain', len(chain))
+    chain = chain.loc[_liquidity_mask(chain, filters)]
+    _count(stage_counts, 'liquidity_dte', len(chain))
+    positions = chain.index.to_numpy()
+    quoted_delta = _column(chain, 'delta', np.nan)
+    needs_greeks = (quoted_delta.isna() | (quoted_delta == 0)).to_numpy()
+    computed_delta = pd.Series(np.nan_to_num(greeks['delta'][positions], nan=0.0), index=chain.index)
+    delta_val = quoted_delta.where(~needs_greeks, computed_delta)
 
-    logger.info(f"Buy analysis complete. Found {len(bullish_calls)} bullish calls and {len(bearish_puts)} bearish puts.")
-    return {
-        'bullish_calls': bullish_calls,
-        'bearish_puts': bearish_puts
+    selected_positions = np.flatnonzero(delta_val.between(delta_min, delta_max).to_numpy())
+    if len(selected_positions) == 0:
+        return _result_table(None, BUY_COLUMNS)
+    selected = chain.iloc[selected_positions]
+    selected_greeks = {
+        name: np.where(needs_greeks, greeks[name][positions], _column(chain, name, np.nan).to_numpy(dtype=float))[selected_positions]
+        for name in GREEK_NAMES
     }
+    table = _buy_table(selected, flag, selected['ticker'], selected['currentPrice'], delta_val, selected_greeks)
+    _count(stage_counts, 'selected', len(table))
+    return table
+
+def _refilter_target(chain, greeks, flag, filters, stage_counts):
+    """
+    The target-delta screen over a superset frame (see screen_target_delta): only
+    the contracts a ChainIndex lookup picks get returns and a result row.
+    """
+    side = 'PUT' if flag == 'p' else 'CALL'
+    chain = chain.loc[_dte_mask(chain, filters)]
+    _count(stage_counts, 'chain', len(chain))
+    chain = chain.loc[_liquidity_mask(chain, filters)]
+    _count(stage_counts, 'liquidity_dte', len(chain))
+    positions = chain.index.to_numpy()
+    quoted_delta = _column(chain, 'delta', np.nan).to_numpy(dtype=float)
+    delta = np.where(np.isnan(quoted_delta) | (quoted_delta == 0), greeks['delta'][positions], quoted_delta)
+
+    index = ChainIndex(chain, delta, flag)
+    count = int(filters.get('TARGET_STRIKES', 3))
+    slots, _ = index.nearest(filters.get(f'TARGET_{side}_DELTA', 0.20), count, 'delta')
+    # Expirations without any delta fall back to OTM%, as in the income screen
+    no_delta = np.setdiff1d(np.arange(len(index.keys)), index.groups_with('delta'))
+    if len(no_delta):
+        otm_slots, _ = index.nearest(filters.get(f'TARGET_{side}_OTM_PERCENT', 10.0), count, 'otm', no_delta)
+        slots = np.sort(np.concatenate([slots, otm_slots]))
+    _count(stage_counts, 'nearest', len(slots))
+    if len(slots) == 0:
+        return _result_table(None, INCOME_COLUMNS)
+    selected = chain.iloc[index.rows[slots]]
+    selected_positions = selected.index.to_numpy()
+    table = _income_table(
+        selected, flag, selected['ticker'], selected['currentPrice'], None, index.otm_percent[slots],
+        greeks={**{name: values[selected_positions] for name, values in greeks.items()}, 'delta': index.delta[slots]},
+    )
+    _count(stage_counts, 'selected', len(table))
+    return table
+
+def _screen_sides(superset, params, strategies, refilter=None):
+    """
+    Runs refilter(chain, greeks, flag, filters, stage_counts) over each strategy's
+    rows of a Superset (default: the income or buy refilter matching its result
+    list) and ranks the tables like run_scan's.
+    """
+    filters = params.get('filters', {})
+    ranking = _ranking(params)
+    results = {}
+    stage_counts = {}
+    for strategy in strategies:
+        result_key, side, flag, _ = STRATEGIES[strategy]
+        counts = stage_counts.setdefault(result_key, {})
+        frame, greeks, rows = superset.sides.get(side, (None, None, {}))
+        # Rows of the strategy's tickers, in its ticker order
+        spans = [rows[s] for s in dict.fromkeys(_strategy_tickers(params, strategy)) if s in rows]
+        positions = np.concatenate([np.arange(start, stop) for start, stop in spans]) if spans else np.empty(0, dtype=int)
+        if len(positions) == 0:
+            results[result_key] = _result_table(None, RESULT_COLUMNS[result_key])
+            continue
+        chain = frame if np.array_equal(positions, np.arange(len(frame))) else frame.iloc[positions]
+        side_refilter = refilter or (_refilter_income if RESULT_COLUMNS[result_key] is INCOME_COLUMNS else _refilter_buy)
+        with metrics.timer('stage_seconds', stage='filtering'):
+            results[result_key] = side_refilter(chain, greeks, flag, filters, counts)
+        if ranking is not None:
+            results[result_key] = rank_contracts(results[result_key], RANK_COLUMNS[result_key], **ranking)
+    results['stageCounts'] = stage_counts
+    return results
+
+def screen_superset(superset, params, strategies=tuple(STRATEGIES)):
+    """
+    Screens a Superset with params['filters'] in memory: no fetching and no greeks.
+    Returns the result tables run_scan returns for the same params on the same
+    market data (ranked like its), and 'stageCounts' with the stages that apply in
+    memory: 'chain', 'liquidity_dte', 'delta_otm' (income lists) and 'selected'.
+    The greeks were computed with the superset, so there is no 'greeks' stage, and
+    the buy lists check every contract's delta directly, so no 'delta_bounds'.
+    Tickers the superset lacks yield no rows, and DTE_MAX beyond superset.dte_max
+    only sees the expirations that were fetched.
+    """
+    return _screen_sides(superset, params, strategies)
+
+def screen_target_delta(superset, params, strategies=INCOME_STRATEGIES):
+    """
+    Income screen by target delta over a Superset, in memory: for every (ticker,
+    expiration) in the DTE window, the TARGET_STRIKES liquid contracts whose
+    |delta| is nearest TARGET_PUT_DELTA / TARGET_CALL_DELTA (e.g. "the 0.20-delta
+    put for each expiry"). Delta is the quoted one, or the computed one where
+    yfinance gave none; expirations with no delta at all use the contracts nearest
+    TARGET_PUT_OTM_PERCENT / TARGET_CALL_OTM_PERCENT instead. The income delta and
+    OTM% ranges do not apply.
+    Each side is indexed with a ChainIndex, so the lookups are binary searches per
+    expiration and only the picked contracts are priced into the result tables.
+    Returns INCOME_COLUMNS tables and 'stageCounts' like screen_superset, in
+    (ticker, expiration, strike) order unless params ask for a ranking.
+    """
+    return _screen_sides(superset, params, strategies, _refilter_target)
+
+def analyze_target_delta_options(params, context=None, provider=None):
+    """
+    Fetches the income tickers (see build_superset) and runs screen_target_delta
+    on them; takes the same arguments as analyze_income_options.
+    """
+    dte_max = params.get('filters', {}).get('DTE_MAX', 60)
+    superset = build_superset(params, INCOME_STRATEGIES, dte_max, context, provider)
+    results = screen_target_delta(superset, params)
+    results['requestStats'] = superset.request_stats
+    return results
+
+def result_changes(previous, current):
+    """
+    Contracts that entered or left each result list between two sets of results
+    (run_scan or screen_superset dicts), in the form of run_scan's 'changes':
+    {result key: {'entered': [...], 'left': [...]}} of {'ticker', 'expirationDate',
+    'strike', 'type'}. Result lists missing from previous count as empty.
+    """
+    changes = {}
+    for result_key, _, flag, _ in STRATEGIES.values():
+        if result_key not in current:
+            continue
+        before, after = (
+            set(zip(table['ticker'], table['expirationDate'], table['strike'])) if table is not None else set()
+            for table in (previous.get(result_key), current[result_key])
+        )
+        changes[result_key] = {
+            name: [
+                {'ticker': ticker_symbol, 'expirationDate': exp_str, 'strike': strike, 'type': 'put' if flag == 'p' else 'call'}
+                for ticker_symbol, exp_str, strike in sorted(keys)
+            ]
+            for name, keys in (('entered', after - before), ('left', before - after))
+        }
+    return changes
@@ -0,0 +1,169 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import pandas as pd
+
+from ..utils.market_data import get_expirations, get_market_context, get_option_chain, market_clock, yahoo_finance
+
+logger = logging.getLogger(__name__)
+
+# Name of the job that refreshes every spot price plus the risk-free rate in one request
+SPOT_JOB = '__spot__'
+
+class PrefetchScheduler:
+    """
+    Background thread that keeps the market_data cache warm for a fixed ticker
+    universe (the config.yaml screener lists), so interactive scans are mostly
+    served from memory.
+
+    There is one job for all spot prices plus the rate (a single bulk request) and
+    one job per ticker (its expiration list plus every chain within dte_max days).
+    Each job is rescheduled independently, intervals[0] seconds apart while the
+    market is open and intervals[1] while it is closed, randomized by +/- jitter
+    (a fraction of the interval) so the tickers do not refresh in lockstep. A run
+    is also scheduled right after each open/close, when cached entries expire.
+
+    budget_per_minute caps the Yahoo requests the scheduler makes: jobs wait in a
+    token bucket (capacity one minute's budget) and are deferred while it is empty.
+    """
+
+    def __init__(self, ticker_symbols, dte_max=30, intervals=(90, 3600), jitter=0.2,
+                 budget_per_minute=120, max_workers=4, clock=market_clock):
+        self.ticker_symbols = [s for s in dict.fromkeys(ticker_symbols) if s]
+        self.dte_max = dte_max
+        self.intervals = intervals
+        self.jitter = jitter
+        self.budget_per_minute = budget_per_minute
+        self.max_workers = max_workers
+        self.clock = clock
+
+        self._tokens = float(budget_per_minute)
+        self._tokens_at = time.monotonic()
+        self._cost = {}  # job -> requests it made last time, used to charge the budget up front
+        self._due = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._status = {'runs': 0, 'refreshed': 0, 'deferred': 0, 'errors': 0, 'lastRefresh': None}
+
+    def _interval(self):
+        is_open, seconds_until_change = self.clock()
+        interval = self.intervals[0] if is_open else self.intervals[1]
+        interval *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        # Entries expire when the session changes, so refresh just after it does
+        return min(interval, seconds_until_change + random.uniform(1, 1 + self.jitter * self.intervals[0]))
+
+    def _take_tokens(self, cost):
+        now = time.monotonic()
+        self._tokens = min(
+            float(self.budget_per_minute),
+            self._tokens + (now - self._tokens_at) * self.budget_per_minute / 60.0,
+        )
+        self._tokens_at = now
+        if self._tokens < min(cost, self.budget_per_minute):
+            return False
+        self._tokens -= cost
+        return True
+
+    def _refresh_spots(self):
+        get_market_context(self.ticker_symbols, refresh=True)
+        return 1
+
+    def _refresh_ticker(self, ticker_symbol):
+        # A fresh yf.Ticker, since a reused one would answer .options from memory
+        ticker = yahoo_finance().Ticker(ticker_symbol)
+        requests = 1
+        today = date.today()
+        for exp_str in get_expirations(ticker, refresh=True):
+            if (pd.to_datetime(exp_str).date() - today).days > self.dte_max:
+                continue
+            get_option_chain(ticker, exp_str, refresh=True)
+            requests += 1
+        return requests
+
+    def _run_job(self, job):
+        try:
+            cost = self._refresh_spots() if job == SPOT_JOB else self._refresh_ticker(job)
+            with self._lock:
+                self._cost[job] = cost
+                self._status['refreshed'] += 1
+        except Exception as e:
+            logger.warning(f"Prefetch of {job} failed: {e}")
+            with self._lock:
+                self._status['errors'] += 1
+
+    def run_once(self, pool=None):
+        """
+        Runs every job that is due and within budget, then reschedules them.
+        Returns the jobs that ran.
+        """
+        now = time.monotonic()
+        due = sorted((at, job) for job, at in self._due.items() if at <= now)
+        ready = []
+        for _, job in due:
+            if not self._take_tokens(self._cost.get(job, 1)):
+                with self._lock:
+                    self._status['deferred'] += len(due) - len(ready)
+                break
+            ready.append(job)
+        if not ready:
+            return []
+
+        if pool is None:
+            for job in ready:
+                self._run_job(job)
+        else:
+            list(pool.map(self._run_job, ready))
+        for job in ready:
+            self._due[job] = time.monotonic() + self._interval()
+        with self._lock:
+            self._status['runs'] += 1
+            self._status['lastRefresh'] = time.time()
+        logger.info(f"Prefetched {len(ready)} jobs; {len(due) - len(ready)} deferred by the request budget")
+        return ready
+
+    def _loop(self):
+        # Spread the first refresh over the jitter window instead of one burst
+        start = time.monotonic()
+        self._due = {SPOT_JOB: start}
+        for ticker_symbol in self.ticker_symbols:
+            self._due[ticker_symbol] = start + random.uniform(0, self.jitter * self.intervals[0])
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='prefetch') as pool:
+            while not self._stop.is_set():
+                self.run_once(pool)
+                next_due = min(self._due.values()) - time.monotonic()
+                self._stop.wait(min(max(next_due, 1.0), 60.0))
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name='prefetch-scheduler', daemon=True)
+            self._thread.start()
+            logger.info(f"Prefetch scheduler started for {len(self.ticker_symbols)} tickers")
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def status(self):
+        """
+        Counters for the UI: runs, jobs refreshed/deferred/failed, lastRefresh (epoch
+        seconds or None), nextRefreshIn (seconds until the earliest due job) and
+        tickers (universe size).
+        """
+        with self._lock:
+            status = dict(self._status)
+        if self._due:
+            status['nextRefreshIn'] = max(min(self._due.values()) - time.monotonic(), 0.0)
+        else:
+            status['nextRefreshIn'] = None
+        status['tickers'] = len(self.ticker_symbols)
+        status['running'] = self._thread is not None and self._thread.is_alive()
+        return status
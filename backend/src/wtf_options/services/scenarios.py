@@ -0,0 +1,106 @@
+import logging
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from ..utils.market_data import IV_SOLVER_RANGE, calculate_price_batch
+from ..utils.metrics import metrics
+from .options_service import INCOME_COLUMNS, RESULT_COLUMNS, STRATEGIES
+
+logger = logging.getLogger(__name__)
+
+# Default grid: underlying -10%..+10%, IV -5..+5 vol points, today and a week on
+DEFAULT_SPOT_MOVES = (-0.10, -0.075, -0.05, -0.025, 0.0, 0.025, 0.05, 0.075, 0.10)
+DEFAULT_VOL_SHIFTS = (-0.05, 0.0, 0.05)
+DEFAULT_DAYS = (0, 7)
+
+# Result key -> (flag, position sign): the income lists are sold, the buy lists bought
+POSITIONS = {
+    result_key: (flag, -1 if RESULT_COLUMNS[result_key] is INCOME_COLUMNS else 1)
+    for result_key, _, flag, _ in STRATEGIES.values()
+}
+
+# Repriced result contracts over a spot x vol x time grid.
+# contracts: one row per contract (ticker, contractSymbol, expirationDate, strike,
+#   DTE, currentPrice, premium, impliedVolatility, list, flag, position)
+# value: option value per share, shape (contracts, spot_moves, vol_shifts, days)
+# pnl: position P&L per contract (100 shares) against the premium paid or
+#   collected, same shape
+ScenarioCube = namedtuple('ScenarioCube', ['contracts', 'spot_moves', 'vol_shifts', 'days', 'value', 'pnl'])
+
+_CONTRACT_FIELDS = ['ticker', 'contractSymbol', 'expirationDate', 'strike', 'DTE', 'currentPrice', 'premium', 'impliedVolatility']
+
+def _contracts(results, result_keys):
+    frames = []
+    for result_key in result_keys:
+        table = results.get(result_key)
+        if table is None or table.empty or result_key not in POSITIONS:
+            continue
+        flag, sign = POSITIONS[result_key]
+        frames.append(table[_CONTRACT_FIELDS].assign(list=result_key, flag=flag, position=sign))
+    if not frames:
+        return pd.DataFrame(columns=_CONTRACT_FIELDS + ['list', 'flag', 'position'])
+    return pd.concat(frames, ignore_index=True)
+
+def scenario_cube(results, risk_free_rate, spot_moves=DEFAULT_SPOT_MOVES, vol_shifts=DEFAULT_VOL_SHIFTS,
+                  days=DEFAULT_DAYS, result_keys=tuple(POSITIONS)):
+    """
+    Reprices every contract of a result set (analyze_income_options,
+    analyze_buy_options, run_scan or screen_superset) across a scenario grid in
+    one broadcast Black-Scholes evaluation, instead of pricing contract by
+    contract and scenario by scenario.
+    spot_moves: relative moves of the underlying (0.05 = +5%)
+    vol_shifts: absolute changes of each contract's IV (0.05 = +5 vol points);
+        shifted IVs are floored at the bottom of IV_SOLVER_RANGE
+    days: calendar days passed; contracts past expiry are worth their intrinsic value
+    result_keys: the result lists to include; income lists count as sold, buy
+        lists as bought
+    Returns a ScenarioCube. Contracts without a usable IV (or spot) are NaN across
+    the grid.
+    """
+    contracts = _contracts(results, result_keys)
+    spot_moves, vol_shifts, days = (np.asarray(a, dtype=float) for a in (spot_moves, vol_shifts, days))
+    with metrics.timer('stage_seconds', stage='scenarios'):
+        # Contracts along axis 0, then spot, vol and time
+        flag = contracts['flag'].to_numpy(dtype=object)[:, None, None, None]
+        strike = contracts['strike'].to_numpy(dtype=float)[:, None, None, None]
+        spot = contracts['currentPrice'].to_numpy(dtype=float)[:, None, None, None] * (1 + spot_moves[None, :, None, None])
+        iv = contracts['impliedVolatility'].to_numpy(dtype=float)[:, None, None, None] + vol_shifts[None, None, :, None]
+        iv = np.where(np.isnan(iv), np.nan, np.maximum(iv, IV_SOLVER_RANGE[0]))
+        remaining = contracts['DTE'].to_numpy(dtype=float)[:, None, None, None] - days[None, None, None, :]
+        t = np.maximum(remaining, 0) / 365.0
+
+        price = calculate_price_batch(flag, spot, strike, t, risk_free_rate, iv)
+        intrinsic = np.where(flag == 'p', np.maximum(strike - spot, 0), np.maximum(spot - strike, 0))
+        value = np.where(remaining <= 0, intrinsic, price)
+        value = np.where(np.isnan(iv) | ~(spot > 0), np.nan, value)
+        premium = contracts['premium'].to_numpy(dtype=float)[:, None, None, None]
+        position = contracts['position'].to_numpy(dtype=float)[:, None, None, None]
+        pnl = position * (value - premium) * 100
+    logger.info(f"Repriced {len(contracts)} contracts over {spot_moves.size * vol_shifts.size * days.size} scenarios")
+    return ScenarioCube(contracts, spot_moves, vol_shifts, days, value, pnl)
+
+def pnl_table(cube, vol_shift=0.0, days=0):
+    """
+    One slice of the cube as a table: a row per contract (ticker, contractSymbol,
+    list) and a P&L column per spot move, at the grid's vol shift and days nearest
+    the ones given.
+    """
+    vol_index = int(np.abs(cube.vol_shifts - vol_shift).argmin())
+    days_index = int(np.abs(cube.days - days).argmin())
+    table = cube.contracts[['ticker', 'contractSymbol', 'list']].copy()
+    for position, move in enumerate(cube.spot_moves):
+        table[f'{move:+.1%}'] = cube.pnl[:, position, vol_index, days_index]
+    return table
+
+def portfolio_pnl(cube, result_keys=None):
+    """
+    Total P&L of holding one contract of each row (of result_keys, default all),
+    per scenario: a DataFrame indexed by spot move with a column per
+    (vol shift, days) pair. Contracts without a value are left out.
+    """
+    rows = np.ones(len(cube.contracts), dtype=bool) if result_keys is None else cube.contracts['list'].isin(result_keys).to_numpy()
+    total = np.nansum(cube.pnl[rows], axis=0)
+    columns = pd.MultiIndex.from_product([cube.vol_shifts, cube.days], names=['volShift', 'days'])
+    return pd.DataFrame(total.reshape(len(cube.spot_moves), -1), index=pd.Index(cube.spot_moves, name='spotMove'), columns=columns)
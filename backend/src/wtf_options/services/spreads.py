@@ -0,0 +1,376 @@
+import logging
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from ..utils.market_data import GREEK_NAMES
+from ..utils.metrics import metrics
+from .options_service import (
+    INCOME_STRATEGIES, _column, _count, _delta_groups, _dte_mask, _income_mask, _liquidity_mask, _ranking, _result_table,
+    _sell_premium, _split_tickers, build_superset, rank_contracts,
+)
+
+logger = logging.getLogger(__name__)
+
+# Multi-leg result tables: one row per candidate position, legs that a strategy does
+# not use are NaN. Greeks are the position's net greeks per share (short legs negated).
+SPREAD_COLUMNS = {
+    'ticker': 'str',
+    'contractSymbol': 'str',
+    'expirationDate': 'str',
+    'DTE': 'int32',
+    'currentPrice': 'float64',
+    'shortPutStrike': 'float64',
+    'longPutStrike': 'float64',
+    'shortCallStrike': 'float64',
+    'longCallStrike': 'float64',
+    'width': 'float64',
+    'credit': 'float64',
+    'maxLoss': 'float64',
+    'breakevenLow': 'float64',
+    'breakevenHigh': 'float64',
+    'returnOnRisk': 'float64',
+    'annualizedReturn': 'float64',
+    'delta': 'float64',
+    'gamma': 'float64',
+    'theta': 'float64',
+    'vega': 'float64',
+}
+
+# Strategy -> result key; all of them are built from both sides of putTickers
+SPREADS = {
+    'put_credit_spread': 'put_spreads',
+    'call_credit_spread': 'call_spreads',
+    'short_strangle': 'strangles',
+    'iron_condor': 'iron_condors',
+}
+SPREAD_STRATEGIES = tuple(SPREADS)
+# Result key spreads are ranked by, best first
+SPREAD_RANK_COLUMN = 'returnOnRisk'
+# Verticals per side and (ticker, expiration) that iron condors are assembled from,
+# the best by return on risk; bounds the pairing of put and call spreads
+CONDOR_SIDE_CANDIDATES = 25
+
+# One side of the chains as arrays sorted by (group, strike), where group numbers
+# the (ticker, expiration) pairs. short / long: rows usable as the sold / bought leg.
+Legs = namedtuple('Legs', ['group', 'strike', 'sell', 'buy', 'short', 'long', 'symbol', 'greeks'])
+# Candidate verticals: leg positions into one Legs plus their economics per share
+Verticals = namedtuple('Verticals', ['group', 'short', 'long', 'credit', 'width', 'max_loss'])
+
+def _spread_limits(filters):
+    """
+    (width_min, width_max, min_credit, max_loss) from the SPREAD_* filters; widths
+    and credit per share, max_loss in dollars per position (100 shares).
+    """
+    return (
+        filters.get('SPREAD_WIDTH_MIN', 1.0),
+        filters.get('SPREAD_WIDTH_MAX', 10.0),
+        filters.get('SPREAD_MIN_CREDIT', 0.10),
+        filters.get('SPREAD_MAX_LOSS', 1000.0),
+    )
+
+def _expand(rows, start, stop):
+    """
+    Vectorized pairwise construction: pairs each rows[i] with every position in
+    [start[i], stop[i]). Returns the (rows, positions) pairs, in input order.
+    """
+    counts = np.maximum(stop - start, 0)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(rows, counts), np.repeat(start, counts) + offsets
+
+def _side_rows(superset, side, tickers):
+    """
+    A superset side's frame and greeks restricted to tickers, in ticker order.
+    """
+    frame, greeks, rows = superset.sides.get(side, (None, None, {}))
+    spans = [rows[s] for s in tickers if s in rows]
+    if not spans:
+        return None, None
+    positions = np.concatenate([np.arange(start, stop) for start, stop in spans])
+    return frame.iloc[positions].reset_index(drop=True), {name: values[positions] for name, values in greeks.items()}
+
+def _legs(chain, greeks, flag, group, filters, stage_counts):
+    """
+    Legs of one side: rows that pass DTE and liquidity, with the sell premium (as
+    in the income screen) and the ask as the buy premium. A row can be sold if it
+    passes the income delta/OTM% filter and has a premium; bought if it has an ask.
+    """
+    _count(stage_counts, 'chain', len(chain))
+    use_delta_filter = _delta_groups(chain, [chain['ticker'], chain['expirationDate']])
+    keep = np.flatnonzero((_dte_mask(chain, filters) & _liquidity_mask(chain, filters)).to_numpy())
+    chain = chain.iloc[keep]
+    _count(stage_counts, 'liquidity_dte', len(chain))
+    short_ok, _ = _income_mask(chain, flag, chain['currentPrice'], filters, use_delta_filter[keep])
+    sell = _sell_premium(chain).to_numpy(dtype=float)
+    buy = _column(chain, 'ask', np.nan).to_numpy(dtype=float)
+    strike = chain['strike'].to_numpy(dtype=float)
+    short = short_ok.to_numpy() & (sell > 0)
+    long = buy > 0
+    _count(stage_counts, 'short_legs', short.sum())
+    order = np.flatnonzero(short | long)
+    order = order[np.lexsort((strike[order], group[keep][order]))]
+    return Legs(
+        group[keep][order], strike[order], sell[order], buy[order], short[order], long[order],
+        _column(chain, 'contractSymbol', '').to_numpy(dtype=object)[order],
+        {name: values[keep][order] for name, values in greeks.items()},
+    )
+
+def _keys(legs, rows, span):
+    # Strikes offset per group, so one sorted array answers per-group range queries
+    return legs.group[rows] * span + legs.strike[rows]
+
+def _verticals(legs, flag, limits):
+    """
+    Credit spreads on one side: sell a short-eligible leg, buy a further OTM leg of
+    the same (ticker, expiration) width_min..width_max away. For each short leg the
+    admissible long strikes are one contiguous range of the sorted long legs, found
+    with two binary searches; the range is narrowed up front by the max-loss cap
+    (max loss = width - credit >= width - short premium). Only pairs inside those
+    bounds are built and then checked for credit and max loss.
+    """
+    width_min, width_max, min_credit, max_loss = limits
+    shorts = np.flatnonzero(legs.short & (legs.sell >= min_credit))
+    longs = np.flatnonzero(legs.long)
+    if len(shorts) == 0 or len(longs) == 0:
+        return Verticals(*(np.empty(0, dtype=dtype) for dtype in (int, int, int, float, float, float)))
+    span = 2 * (np.nanmax(legs.strike) + width_max) + 1
+    long_keys = _keys(legs, longs, span)
+    short_keys = _keys(legs, shorts, span)
+    reach = np.minimum(width_max, max_loss / 100 + legs.sell[shorts])
+    if flag == 'p':
+        low, high = short_keys - reach, short_keys - width_min
+    else:
+        low, high = short_keys + width_min, short_keys + reach
+    short, position = _expand(shorts, np.searchsorted(long_keys, low, 'left'), np.searchsorted(long_keys, high, 'right'))
+    long = longs[position]
+
+    # Quotes are in cents: rounding away float noise keeps a credit equal to the
+    # width from leaving a spurious max loss of 1e-15
+    credit = np.round(legs.sell[short] - legs.buy[long], 6)
+    width = np.abs(legs.strike[short] - legs.strike[long])
+    loss = np.round(width - credit, 6)
+    # A credit at or above the width is a stale quote, not a riskless trade
+    ok = (credit >= min_credit) & (loss > 0) & (loss * 100 <= max_loss)
+    return Verticals(legs.group[short][ok], short[ok], long[ok], credit[ok], width[ok], loss[ok])
+
+def _best_per_group(verticals, count):
+    """
+    The count verticals with the best return on risk in each group, ordered by
+    group and then short strike position.
+    """
+    order = np.lexsort((-verticals.credit / verticals.max_loss, verticals.group))
+    group = verticals.group[order]
+    rank = np.arange(len(order)) - np.searchsorted(group, group, 'left')
+    order = order[rank < count]
+    order = order[np.lexsort((verticals.short[order], verticals.group[order]))]
+    return Verticals(*(values[order] for values in verticals))
+
+def _net_greeks(*legs):
+    """
+    Net position greeks from (Legs, rows, sign) triples; sign -1 for sold legs.
+    """
+    return {name: sum(sign * side.greeks[name][rows] for side, rows, sign in legs) for name in GREEK_NAMES}
+
+def _spread_table(groups, group, symbols, strikes, width, credit, max_loss, risk, breakevens, greeks):
+    """
+    Assembles a SPREAD_COLUMNS table. groups: per-group (ticker, expirationDate,
+    DTE, currentPrice) arrays; group: each row's group; risk: capital at risk per
+    share that returnOnRisk is measured against.
+    """
+    n = len(group)
+    if n == 0:
+        return _result_table(None, SPREAD_COLUMNS)
+    ticker, expiration, dte, price = (values[group] for values in groups)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return_on_risk = np.where(risk > 0, credit / risk * 100, np.nan)
+        annualized = np.where(dte > 0, return_on_risk * 365 / dte, 0.0)
+    with metrics.timer('stage_seconds', stage='result_assembly'):
+        return _result_table(
+            pd.DataFrame(index=pd.RangeIndex(n)), SPREAD_COLUMNS,
+            ticker=ticker,
+            contractSymbol=symbols,
+            expirationDate=expiration,
+            DTE=dte,
+            currentPrice=price,
+            width=width,
+            credit=credit,
+            maxLoss=max_loss * 100,
+            breakevenLow=breakevens[0],
+            breakevenHigh=breakevens[1],
+            returnOnRisk=return_on_risk,
+            annualizedReturn=annualized,
+            **strikes,
+            **greeks,
+        )
+
+def _join_symbols(*columns):
+    symbols = columns[0].astype(str)
+    for column in columns[1:]:
+        symbols = np.char.add(np.char.add(symbols, '/'), column.astype(str))
+    return symbols.astype(object)
+
+def _vertical_table(groups, legs, verticals, flag):
+    short, long = verticals.short, verticals.long
+    side = 'Put' if flag == 'p' else 'Call'
+    short_strike = legs.strike[short]
+    breakeven = short_strike - verticals.credit if flag == 'p' else short_strike + verticals.credit
+    nan = np.full(len(short), np.nan)
+    return _spread_table(
+        groups, verticals.group, _join_symbols(legs.symbol[short], legs.symbol[long]),
+        {f'short{side}Strike': short_strike, f'long{side}Strike': legs.strike[long]},
+        verticals.width, verticals.credit, verticals.max_loss, verticals.max_loss,
+        (breakeven, nan) if flag == 'p' else (nan, breakeven),
+        _net_greeks((legs, short, -1), (legs, long, 1)),
+    )
+
+def _strangle_table(groups, puts, calls, limits):
+    """
+    Short strangles: every short-eligible put with every short-eligible call above
+    it in the same (ticker, expiration). The loss is unbounded, so returnOnRisk is
+    measured against the cash-secured put's collateral net of the credit.
+    """
+    _, _, min_credit, _ = limits
+    put_rows = np.flatnonzero(puts.short)
+    call_rows = np.flatnonzero(calls.short)
+    if len(put_rows) == 0 or len(call_rows) == 0:
+        return _result_table(None, SPREAD_COLUMNS)
+    span = 2 * max(np.nanmax(puts.strike), np.nanmax(calls.strike)) + 1
+    call_keys = _keys(calls, call_rows, span)
+    start = np.searchsorted(call_keys, _keys(puts, put_rows, span), 'right')
+    stop = np.searchsorted(calls.group[call_rows], puts.group[put_rows], 'right')
+    put, position = _expand(put_rows, start, stop)
+    call = call_rows[position]
+    credit = puts.sell[put] + calls.sell[call]
+    ok = credit >= min_credit
+    put, call, credit = put[ok], call[ok], credit[ok]
+    nan = np.full(len(put), np.nan)
+    return _spread_table(
+        groups, puts.group[put], _join_symbols(puts.symbol[put], calls.symbol[call]),
+        {'shortPutStrike': puts.strike[put], 'shortCallStrike': calls.strike[call]},
+        nan, credit, nan, puts.strike[put] - credit,
+        (puts.strike[put] - credit, calls.strike[call] + credit),
+        _net_greeks((puts, put, -1), (calls, call, -1)),
+    )
+
+def _condor_table(groups, puts, calls, put_spreads, call_spreads, limits):
+    """
+    Iron condors: a put credit spread plus a call credit spread whose short strike
+    is above the put's, in the same (ticker, expiration). Each side is limited to
+    its CONDOR_SIDE_CANDIDATES best verticals per group before they are paired.
+    Max loss is the wider side's width less the total credit.
+    """
+    _, _, min_credit, max_loss = limits
+    put_spreads = _best_per_group(put_spreads, CONDOR_SIDE_CANDIDATES)
+    call_spreads = _best_per_group(call_spreads, CONDOR_SIDE_CANDIDATES)
+    if len(put_spreads.group) == 0 or len(call_spreads.group) == 0:
+        return _result_table(None, SPREAD_COLUMNS)
+    span = 2 * max(np.nanmax(puts.strike), np.nanmax(calls.strike)) + 1
+    call_keys = call_spreads.group * span + calls.strike[call_spreads.short]
+    put_keys = put_spreads.group * span + puts.strike[put_spreads.short]
+    start = np.searchsorted(call_keys, put_keys, 'right')
+    stop = np.searchsorted(call_spreads.group, put_spreads.group, 'right')
+    p, c = _expand(np.arange(len(put_spreads.group)), start, stop)
+    credit = np.round(put_spreads.credit[p] + call_spreads.credit[c], 6)
+    width = np.maximum(put_spreads.width[p], call_spreads.width[c])
+    loss = np.round(width - credit, 6)
+    ok = (credit >= min_credit) & (loss > 0) & (loss * 100 <= max_loss)
+    p, c, credit, width, loss = p[ok], c[ok], credit[ok], width[ok], loss[ok]
+    legs = (put_spreads.short[p], put_spreads.long[p], call_spreads.short[c], call_spreads.long[c])
+    return _spread_table(
+        groups, put_spreads.group[p],
+        _join_symbols(puts.symbol[legs[0]], puts.symbol[legs[1]], calls.symbol[legs[2]], calls.symbol[legs[3]]),
+        {
+            'shortPutStrike': puts.strike[legs[0]], 'longPutStrike': puts.strike[legs[1]],
+            'shortCallStrike': calls.strike[legs[2]], 'longCallStrike': calls.strike[legs[3]],
+        },
+        width, credit, loss, loss,
+        (puts.strike[legs[0]] - credit, calls.strike[legs[2]] + credit),
+        _net_greeks((puts, legs[0], -1), (puts, legs[1], 1), (calls, legs[2], -1), (calls, legs[3], 1)),
+    )
+
+def screen_spreads(superset, params, strategies=SPREAD_STRATEGIES):
+    """
+    Builds and screens multi-leg positions on params['putTickers'] from a Superset
+    holding both sides of those tickers (see spread_params), in memory.
+    Short legs must pass the income filters (DTE, liquidity and the put/call
+    delta or OTM% ranges); long legs only DTE and liquidity. SPREAD_WIDTH_MIN /
+    SPREAD_WIDTH_MAX bound the strike distance between a short and its long leg,
+    SPREAD_MIN_CREDIT the net credit per share and SPREAD_MAX_LOSS the max loss in
+    dollars per position.
+    strategies: names from SPREADS
+    Returns one SPREAD_COLUMNS table per strategy, keyed like SPREADS, ranked by
+    returnOnRisk (credit / capital at risk) with the ranking params run_scan takes,
+    plus 'stageCounts'.
+    """
+    filters = params.get('filters', {})
+    limits = _spread_limits(filters)
+    tickers = list(dict.fromkeys(_split_tickers(params.get('putTickers', ''))))
+    put_chain, put_greeks = _side_rows(superset, 'puts', tickers)
+    call_chain, call_greeks = _side_rows(superset, 'calls', tickers)
+    results = {SPREADS[strategy]: _result_table(None, SPREAD_COLUMNS) for strategy in strategies}
+    stage_counts = {result_key: {} for result_key in results}
+    if put_chain is None and call_chain is None:
+        results['stageCounts'] = stage_counts
+        return results
+
+    with metrics.timer('stage_seconds', stage='filtering'):
+        # Number the (ticker, expiration) pairs across both sides, in ticker order
+        frames = [chain for chain in (put_chain, call_chain) if chain is not None]
+        stacked = pd.concat([chain[['ticker', 'expirationDate', 'DTE', 'currentPrice']] for chain in frames], ignore_index=True)
+        codes, _ = pd.factorize(pd.MultiIndex.from_frame(stacked[['ticker', 'expirationDate']]))
+        first = np.unique(codes, return_index=True)[1]
+        groups = tuple(stacked[name].to_numpy()[first] for name in ('ticker', 'expirationDate', 'DTE', 'currentPrice'))
+        put_codes = codes[:len(put_chain)] if put_chain is not None else None
+        call_codes = codes[len(stacked) - len(call_chain):] if call_chain is not None else None
+
+        side_counts = {}
+        puts = _legs(put_chain, put_greeks, 'p', put_codes, filters, side_counts.setdefault('puts', {})) if put_chain is not None else None
+        calls = _legs(call_chain, call_greeks, 'c', call_codes, filters, side_counts.setdefault('calls', {})) if call_chain is not None else None
+        put_spreads = _verticals(puts, 'p', limits) if puts is not None else None
+        call_spreads = _verticals(calls, 'c', limits) if calls is not None else None
+
+        for strategy in strategies:
+            result_key = SPREADS[strategy]
+            counts = stage_counts[result_key]
+            sides = {'put_credit_spread': ('puts',), 'call_credit_spread': ('calls',)}.get(strategy, ('puts', 'calls'))
+            if any(side not in side_counts for side in sides):
+                continue
+            for side in sides:
+                for stage, rows in side_counts[side].items():
+                    _count(counts, stage, rows)
+            if strategy == 'put_credit_spread':
+                table = _vertical_table(groups, puts, put_spreads, 'p')
+            elif strategy == 'call_credit_spread':
+                table = _vertical_table(groups, calls, call_spreads, 'c')
+            elif strategy == 'short_strangle':
+                table = _strangle_table(groups, puts, calls, limits)
+            else:
+                table = _condor_table(groups, puts, calls, put_spreads, call_spreads, limits)
+            _count(counts, 'selected', len(table))
+            results[result_key] = table
+
+    ranking = _ranking(params)
+    for result_key in stage_counts:
+        results[result_key] = rank_contracts(results[result_key], SPREAD_RANK_COLUMN, **(ranking or {}))
+    results['stageCounts'] = stage_counts
+    return results
+
+def spread_params(params):
+    """
+    Scan params that fetch both sides of the spread universe (putTickers).
+    """
+    return {**params, 'callTickers': params.get('putTickers', '')}
+
+def analyze_spread_options(params, context=None, provider=None):
+    """
+    Fetches both sides of params['putTickers'] (see build_superset) and screens
+    the multi-leg strategies on them; see screen_spreads for the filters and
+    the result tables.
+    """
+    dte_max = params.get('filters', {}).get('DTE_MAX', 60)
+    superset = build_superset(spread_params(params), INCOME_STRATEGIES, dte_max, context, provider)
+    results = screen_spreads(superset, params)
+    results['requestStats'] = superset.request_stats
+    logger.info(f"Spread analysis complete. Found {', '.join(f'{len(results[key])} {key}' for key in SPREADS.values())}.")
+    return results
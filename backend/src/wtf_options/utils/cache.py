@@ -0,0 +1,175 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+_MISSING = object()
+
+def estimate_size(value):
+    """
+    Rough in-memory size of a cached value in bytes. DataFrames are measured with
+    memory_usage(deep=True); containers (e.g. yfinance's option chain namedtuple)
+    are summed over their items.
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if isinstance(value, pd.DataFrame) else int(usage)
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with a separate time-to-live per kind of data.
+
+    ttls maps a kind (e.g. 'chain') to a (market_open_ttl, market_closed_ttl) pair in
+    seconds. market_clock is a callable returning (is_open, seconds_until_change), so
+    an entry never outlives the market session it was fetched in. Least recently used
+    entries are evicted once the estimated size exceeds max_bytes.
+    shared: optional second tier shared with other processes (see
+    shared_cache.SharedStore). Local misses are looked up there, and fetched values
+    are written through to it, so one replica's fetch serves every replica.
+    """
+
+    def __init__(self, ttls, market_clock, max_bytes=256 * 1024 * 1024, shared=None):
+        self.ttls = dict(ttls)
+        self.market_clock = market_clock
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = {}
+        self._misses = {}
+        self._shared_hits = {}
+        self._evictions = 0
+
+    def ttl(self, kind):
+        """
+        Seconds a freshly fetched value of this kind stays valid right now.
+        """
+        is_open, seconds_until_change = self.market_clock()
+        open_ttl, closed_ttl = self.ttls[kind]
+        return min(open_ttl if is_open else closed_ttl, seconds_until_change)
+
+    def get(self, kind, key, default=None):
+        with self._lock:
+            entry = self._entries.get((kind, key))
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end((kind, key))
+                self._hits[kind] = self._hits.get(kind, 0) + 1
+                return entry[2]
+            if entry is not None:
+                self._drop((kind, key))
+        if self.shared is not None:
+            found = self.shared.get(kind, key)
+            if found is not None:
+                value, fetched_at, expires_at = found
+                self._store(kind, key, value, expires_at - time.time(), fetched_at)
+                with self._lock:
+                    self._shared_hits[kind] = self._shared_hits.get(kind, 0) + 1
+                return value
+        with self._lock:
+            self._misses[kind] = self._misses.get(kind, 0) + 1
+        return default
+
+    def set(self, kind, key, value):
+        ttl = self.ttl(kind)
+        if ttl <= 0:
+            return
+        fetched_at = time.time()
+        self._store(kind, key, value, ttl, fetched_at)
+        if self.shared is not None:
+            self.shared.set(kind, key, value, ttl, fetched_at)
+
+    def _store(self, kind, key, value, ttl, fetched_at):
+        size = estimate_size(value)
+        with self._lock:
+            if (kind, key) in self._entries:
+                self._drop((kind, key))
+            if size > self.max_bytes or ttl <= 0:
+                return
+            self._entries[(kind, key)] = (time.monotonic() + ttl, size, value, fetched_at)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self._evictions += 1
+
+    def get_or_fetch(self, kind, key, fetch):
+        """
+        Returns the cached value for (kind, key), calling fetch() and caching its
+        result on a miss. Concurrent misses for the same key may both fetch.
+        """
+        value = self.get(kind, key, _MISSING)
+        if value is _MISSING:
+            value = fetch()
+            self.set(kind, key, value)
+        return value
+
+    def refresh(self, kind, key, fetch):
+        """
+        Calls fetch() and caches its result whether or not a live entry exists, so
+        background refreshes replace data before it expires. Returns the new value.
+        With a shared tier, an entry another replica fetched within the last half of
+        its TTL is adopted instead, so replicas do not all refresh the same data.
+        """
+        if self.shared is not None:
+            found = self.shared.get(kind, key)
+            if found is not None:
+                value, fetched_at, expires_at = found
+                if time.time() - fetched_at < self.ttl(kind) / 2:
+                    self._store(kind, key, value, expires_at - time.time(), fetched_at)
+                    return value
+        value = fetch()
+        self.set(kind, key, value)
+        return value
+
+    def fetched_at(self, kind, key):
+        """
+        Wall-clock time (epoch seconds) a cached value was stored, or None.
+        """
+        with self._lock:
+            entry = self._entries.get((kind, key))
+            return entry[3] if entry is not None else None
+
+    def ages(self, kind):
+        """
+        {key: seconds since it was fetched} for the live entries of one kind.
+        """
+        now_monotonic, now = time.monotonic(), time.time()
+        with self._lock:
+            return {
+                key: now - fetched
+                for (entry_kind, key), (expires, _, _, fetched) in self._entries.items()
+                if entry_kind == kind and expires > now_monotonic
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """
+        Hit/miss counters per kind plus current size, for logging and the dashboard.
+        sharedHits counts local misses served by the shared tier.
+        """
+        with self._lock:
+            return {
+                'hits': dict(self._hits),
+                'sharedHits': dict(self._shared_hits),
+                'misses': dict(self._misses),
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'maxBytes': self.max_bytes,
+                'evictions': self._evictions,
+            }
+
+    def _drop(self, entry_key):
+        # Caller holds the lock
+        _, size, _, _ = self._entries.pop(entry_key)
+        self._bytes -= size
@@ -0,0 +1,177 @@
+import logging
+import random
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+REQUEST_STATS = ('requests', 'retries', 'throttled', 'failed')
+
+# A 429 status in an error message ("HTTP Error 429", "status code: 429"); a bare
+# 429 may be a strike, a symbol or a duration
+_HTTP_429 = re.compile(r'\b(?:http|status)\b\D{0,12}\b429\b')
+
+def is_throttled(error):
+    """
+    True for Yahoo's rate-limit responses: yfinance's YFRateLimitError (matched by
+    class name, so yfinance stays unimported), an HTTP response with status 429, or
+    a message saying so.
+    """
+    if any('ratelimit' in cls.__name__.lower() for cls in type(error).__mro__):
+        return True
+    if getattr(getattr(error, 'response', None), 'status_code', None) == 429:
+        return True
+    text = str(error).lower()
+    return 'rate limit' in text or 'too many requests' in text or _HTTP_429.search(text) is not None
+
+def is_transient(error):
+    """
+    True for failures worth retrying: throttling, timeouts and dropped connections.
+    Anything else (e.g. a symbol without options) fails on the first attempt.
+    """
+    if is_throttled(error) or isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    name = type(error).__name__
+    return 'Timeout' in name or 'ConnectionError' in name
+
+class RequestGovernor:
+    """
+    Paces outgoing Yahoo requests so scans run at the highest rate Yahoo sustains
+    instead of losing tickers to throttling.
+
+    - Token bucket: at most rate requests per second on average (None: unlimited),
+      with bursts of up to burst requests.
+    - Adaptive concurrency (AIMD): at most limit requests in flight. A throttled
+      response halves both the limit and the rate; every success raises them
+      again, additively, up to max_concurrency and the configured rate.
+    - Retries: transient failures (see is_transient) are retried up to max_retries
+      times after a jittered exponential backoff, a uniform draw from
+      [0, min(backoff_max, backoff_base * 2**attempt)].
+    Counters per call label (see stats) report what each scan cost.
+    """
+
+    def __init__(self, rate=None, burst=20, max_concurrency=8, min_concurrency=1, max_retries=4,
+                 backoff_base=0.5, backoff_max=20.0, sleep=time.sleep, clock=time.monotonic):
+        self.sleep = sleep
+        self.clock = clock
+        self._cond = threading.Condition()
+        self._active = 0
+        self._stats = {}
+        self.configure(rate, burst, max_concurrency, min_concurrency, max_retries, backoff_base, backoff_max)
+
+    def configure(self, rate=None, burst=20, max_concurrency=8, min_concurrency=1, max_retries=4,
+                  backoff_base=0.5, backoff_max=20.0):
+        with self._cond:
+            self.max_rate = rate
+            self.rate = rate
+            self.burst = burst
+            self.max_concurrency = max_concurrency
+            self.min_concurrency = min(min_concurrency, max_concurrency)
+            self.limit = float(max_concurrency)
+            self.max_retries = max_retries
+            self.backoff_base = backoff_base
+            self.backoff_max = backoff_max
+            self._tokens = float(burst)
+            self._updated = self.clock()
+            self._cond.notify_all()
+
+    def call(self, fetch, label):
+        """
+        Runs fetch() under the governor and returns its result. Transient errors
+        are retried; the last error is raised once the retries are used up.
+        label: kind of request ('chain', 'expirations', ...) the counters use
+        """
+        attempt = 0
+        while True:
+            self._acquire()
+            try:
+                result = fetch()
+            except Exception as e:
+                throttled = is_throttled(e)
+                self._release(throttled, success=False)
+                self._count(label, 'requests', 'throttled' if throttled else None)
+                if attempt >= self.max_retries or not is_transient(e):
+                    self._count(label, 'failed')
+                    raise
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                logger.info(f"Retrying {label} request in {delay:.1f}s after: {e}")
+                self._count(label, 'retries')
+                self.sleep(delay)
+                attempt += 1
+                continue
+            self._release(False, success=True)
+            self._count(label, 'requests')
+            return result
+
+    def stats(self):
+        """
+        {label: {'requests', 'retries', 'throttled', 'failed'}} since the process
+        started, plus 'limit' and 'rate': the current concurrency limit and rate.
+        """
+        with self._cond:
+            stats = {label: dict(counts) for label, counts in self._stats.items()}
+            stats['limit'] = int(self.limit)
+            stats['rate'] = self.rate
+            return stats
+
+    def _acquire(self):
+        with self._cond:
+            while True:
+                self._refill()
+                if self._active < int(self.limit) and (self.rate is None or self._tokens >= 1):
+                    self._active += 1
+                    if self.rate is not None:
+                        self._tokens -= 1
+                    return
+                # Wake when the next token is due; releases notify earlier
+                timeout = (1 - self._tokens) / self.rate if self.rate is not None and self._tokens < 1 else None
+                self._cond.wait(timeout)
+
+    def _refill(self):
+        # Caller holds the lock
+        now = self.clock()
+        if self.rate is not None:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _release(self, throttled, success):
+        with self._cond:
+            self._active -= 1
+            if throttled:
+                before = (int(self.limit), self.rate)
+                self.limit = max(self.min_concurrency, self.limit / 2)
+                if self.rate is not None:
+                    self._refill()
+                    self.rate = max(self.max_rate / 16, self.rate / 2)
+                    # Pause the bucket: the next request waits for a fresh token
+                    self._tokens = min(self._tokens, 0.0)
+                if (int(self.limit), self.rate) != before:
+                    rate = 'unlimited' if self.rate is None else f"{self.rate:.1f}"
+                    logger.warning(f"Yahoo is throttling; backing off to {int(self.limit)} concurrent requests at {rate}/s")
+            elif success:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+                if self.rate is not None:
+                    self._refill()
+                    self.rate = min(self.max_rate, self.rate + self.max_rate / 50)
+            self._cond.notify_all()
+
+    def _count(self, label, *names):
+        with self._cond:
+            counts = self._stats.setdefault(label, dict.fromkeys(REQUEST_STATS, 0))
+            for name in names:
+                if name is not None:
+                    counts[name] += 1
+
+def stats_delta(before, after):
+    """
+    Request counters accrued between two stats() snapshots, summed over labels:
+    {'requests', 'retries', 'throttled', 'failed'}.
+    """
+    totals = dict.fromkeys(REQUEST_STATS, 0)
+    for label, counts in after.items():
+        if not isinstance(counts, dict):
+            continue
+        for name in REQUEST_STATS:
+            totals[name] += counts[name] - before.get(label, {}).get(name, 0)
+    return totals
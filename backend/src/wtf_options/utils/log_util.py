@@ -1,14 +1,16 @@
 import logging
+import os
 import sys
-from .. import config
 
-def setup_logging():
+def setup_logging(level=None):
     """
-    Configures the root logger for the application.
+    Configures the root logger for the application. Call it once from an entry
+    point; importing this module has no side effects.
+    level: log level name or number (default: $LOG_LEVEL, else INFO)
     """
     # Create a logger
     logger = logging.getLogger()
-    logger.setLevel(config.LOG_LEVEL)
+    logger.setLevel(level or os.environ.get('LOG_LEVEL', 'INFO').upper())
 
     # Prevent duplicate handlers
     if logger.hasHandlers():
@@ -35,6 +37,3 @@ def setup_logging():
     logging.getLogger('yfinance').setLevel(logging.INFO)
 
     return logger
-
-# Create and configure the logger when the module is imported
-log = setup_logging()
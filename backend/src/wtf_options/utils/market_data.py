@@ -1,20 +1,198 @@
-import yfinance as yf
+import numpy as np
 import pandas as pd
-from datetime import datetime, time
+from datetime import datetime, time, timedelta
 import pytz
-from py_vollib.black_scholes.greeks.analytical import delta, gamma, theta, vega
 import math
+import logging
+from collections import namedtuple
+from .cache import TTLCache
+from .governor import RequestGovernor
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# yfinance, scipy and py_vollib take most of the backend's import time, so they are
+# imported on first use: the dashboard and CLI start without them, and replayed or
+# synthetic scans never load yfinance at all
+
+def yahoo_finance():
+    """
+    The yfinance module, imported on first use.
+    """
+    import yfinance
+    return yfinance
+
+GREEK_NAMES = ("delta", "gamma", "theta", "vega")
+RATE_SYMBOL = "^IRX"
+
+# Spot prices ({symbol: (price, price_type)}) and the risk-free rate for one scan
+MarketContext = namedtuple('MarketContext', ['prices', 'risk_free_rate'])
+
+MARKET_TZ = pytz.timezone('America/New_York')
+MARKET_OPEN = time(9, 30)
+MARKET_CLOSE = time(16, 0)
+
+# Seconds each kind of data stays fresh: (market open, market closed).
+# Expirations only change daily and the T-bill rate barely moves intraday.
+DEFAULT_CACHE_TTLS = {
+    'expirations': (4 * 3600, 12 * 3600),
+    'spot': (60, 12 * 3600),
+    'chain': (120, 12 * 3600),
+    'rate': (3600, 12 * 3600),
+}
+DEFAULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+def is_market_hours(now_et=None):
+    """
+    Returns True during regular US equity trading hours (weekdays 9:30-16:00 ET).
+    """
+    # FIX: Use timezone-aware datetime objects to avoid DeprecationWarning
+    now_et = now_et or datetime.now(MARKET_TZ)
+    return (MARKET_OPEN <= now_et.time() <= MARKET_CLOSE) and (0 <= now_et.weekday() <= 4)
+
+def market_clock(now_et=None):
+    """
+    Returns (is_open, seconds until the market next opens or closes).
+    Cached data never outlives the session it was fetched in.
+    """
+    now_et = now_et or datetime.now(MARKET_TZ)
+    is_open = is_market_hours(now_et)
+    if is_open:
+        change = MARKET_TZ.localize(datetime.combine(now_et.date(), MARKET_CLOSE))
+    else:
+        day = now_et.date()
+        if now_et.weekday() > 4 or now_et.time() > MARKET_CLOSE:
+            day += timedelta(days=1)
+        while day.weekday() > 4:
+            day += timedelta(days=1)
+        change = MARKET_TZ.localize(datetime.combine(day, MARKET_OPEN))
+    return is_open, max((change - now_et).total_seconds(), 1)
+
+market_cache = TTLCache(DEFAULT_CACHE_TTLS, market_clock, DEFAULT_CACHE_MAX_BYTES)
+
+def configure_cache(ttls=None, max_bytes=None, shared=None):
+    """
+    Overrides cache TTLs ({kind: (open_seconds, closed_seconds)}) and/or the memory bound.
+    shared: a shared_cache.SharedStore all replicas use as a second tier.
+    """
+    if ttls:
+        market_cache.ttls.update(ttls)
+    if max_bytes:
+        market_cache.max_bytes = max_bytes
+    if shared is not None:
+        market_cache.shared = shared
+
+def cache_stats():
+    return market_cache.stats()
+
+def data_ages(kind):
+    """
+    Seconds since each live cached value of one kind ('spot', 'chain', ...) was
+    fetched, keyed like the cache (symbol, or (symbol, expiration) for chains).
+    """
+    return market_cache.ages(kind)
+
+def data_ttl(kind):
+    """
+    Seconds a value of one kind fetched now stays fresh (see TTLCache.ttl).
+    """
+    return market_cache.ttl(kind)
+
+def _cache_samples():
+    stats = market_cache.stats()
+    for kind, hits in stats['hits'].items():
+        yield 'cache_hits_total', {'kind': kind}, hits
+    for kind, misses in stats['misses'].items():
+        yield 'cache_misses_total', {'kind': kind}, misses
+    for kind, hits in stats['sharedHits'].items():
+        yield 'cache_shared_hits_total', {'kind': kind}, hits
+    yield 'cache_bytes', {}, stats['bytes']
+
+metrics.add_collector(_cache_samples)
+
+# Every Yahoo request goes through one governor per process (see RequestGovernor).
+# Unlimited until configure_governor sets a rate.
+request_governor = RequestGovernor()
+
+def configure_governor(rate_per_second=None, burst=None, max_concurrency=None, max_retries=None, backoff=None):
+    """
+    Sets the Yahoo request budget: rate_per_second (0 or None: unlimited), burst,
+    max_concurrency (requests in flight), max_retries and backoff, a
+    (base_seconds, max_seconds) pair for the jittered exponential backoff.
+    Omitted settings keep their current value.
+    """
+    g = request_governor
+    base, cap = backoff or (g.backoff_base, g.backoff_max)
+    g.configure(
+        rate=(rate_per_second or None) if rate_per_second is not None else g.max_rate,
+        burst=burst or g.burst,
+        max_concurrency=max_concurrency or g.max_concurrency,
+        max_retries=max_retries if max_retries is not None else g.max_retries,
+        backoff_base=base, backoff_max=cap,
+    )
+
+def request_stats():
+    """
+    Yahoo request counters per call ('requests', 'retries', 'throttled', 'failed')
+    since the process started, plus the governor's current 'limit' and 'rate'.
+    """
+    return request_governor.stats()
+
+def _yahoo(fetch, call):
+    # One governed Yahoo request; call labels the counters
+    return request_governor.call(fetch, call)
+
+def _request_samples():
+    stats = request_governor.stats()
+    yield 'yahoo_concurrency_limit', {}, stats.pop('limit')
+    stats.pop('rate')
+    for call, counts in stats.items():
+        for outcome in ('requests', 'throttled', 'failed'):
+            yield 'yahoo_requests_total', {'call': call, 'outcome': outcome}, counts[outcome]
+        yield 'yahoo_retries_total', {'call': call}, counts['retries']
+
+metrics.add_collector(_request_samples)
+
+def get_expirations(ticker, refresh=False):
+    """
+    Returns the ticker's option expiration dates, cached per symbol.
+    refresh: fetch and re-cache even if a live entry exists (background prefetch).
+    """
+    def fetch():
+        with metrics.timer('stage_seconds', stage='expiration_listing'):
+            return _yahoo(lambda: ticker.options, 'expirations')
+    if refresh:
+        return market_cache.refresh('expirations', ticker.ticker, fetch)
+    return market_cache.get_or_fetch('expirations', ticker.ticker, fetch)
+
+def get_option_chain(ticker, exp_str, refresh=False):
+    """
+    Returns the option chain for one expiration, cached per (symbol, expiration).
+    Cached chains are shared between scans, so callers must not modify them in place.
+    refresh: fetch and re-cache even if a live entry exists (background prefetch).
+    """
+    def fetch():
+        with metrics.timer('stage_seconds', stage='chain_fetch'):
+            return _yahoo(lambda: ticker.option_chain(exp_str), 'chain')
+    if refresh:
+        return market_cache.refresh('chain', (ticker.ticker, exp_str), fetch)
+    return market_cache.get_or_fetch('chain', (ticker.ticker, exp_str), fetch)
 
 def get_risk_free_rate():
     """
     Fetches the risk-free interest rate from the 13-week Treasury bill (^IRX).
     """
+    cached = market_cache.get('rate', RATE_SYMBOL)
+    if cached is not None:
+        return cached
     try:
-        irx = yf.Ticker("^IRX")
+        irx = yahoo_finance().Ticker(RATE_SYMBOL)
         # The price is given as a percentage, so divide by 100
-        risk_free_rate = irx.history(period='1d')['Close'].iloc[-1] / 100
+        risk_free_rate = _yahoo(lambda: irx.history(period='1d'), 'history')['Close'].iloc[-1] / 100
         if pd.isna(risk_free_rate):
             return 0.05 # Fallback to 5%
+        # Only real quotes are cached; the fallback is retried on the next scan
+        market_cache.set('rate', RATE_SYMBOL, risk_free_rate)
         return risk_free_rate
     except Exception:
         return 0.05 # Fallback to 5% if fetch fails
@@ -29,6 +207,8 @@ def calculate_greeks(flag, S, K, t, r, iv):
     r: Risk-free rate
     iv: Implied volatility
     """
+    from py_vollib.black_scholes.greeks.analytical import delta, gamma, theta, vega
+
     try:
         greeks = {
             "delta": delta(flag, S, K, t, r, iv),
@@ -49,30 +229,233 @@ def calculate_greeks(flag, S, K, t, r, iv):
             "vega": None
         }
 
+def calculate_greeks_batch(flag, S, K, t, r, iv):
+    """
+    Calculates the greeks for a whole option chain in one vectorized pass.
+    Takes the same arguments as calculate_greeks, but each may be a scalar or an array
+    (flag may be an array of 'c'/'p'); arrays are broadcast together.
+    Returns a dict of float arrays keyed like calculate_greeks. Entries where
+    calculate_greeks would return None (e.g. NaN IV or a non-positive price) are NaN,
+    so callers map NaN back to None when they materialize rows.
+    """
+    from scipy.special import ndtr
+
+    is_put = np.asarray(flag) == 'p'
+    S, K, t, r, iv = (np.asarray(a, dtype=float) for a in (S, K, t, r, iv))
+
+    # Same formulas as py_vollib's analytical greeks, so zero IV or zero DTE
+    # degrade exactly like the scalar path (inf d1, NaN gamma) instead of raising
+    with np.errstate(all='ignore'):
+        sqrt_t = np.sqrt(t)
+        d1 = (np.log(S / K) + (r + iv * iv / 2.) * t) / (iv * sqrt_t)
+        d2 = d1 - iv * sqrt_t
+        pdf_d1 = np.exp(-d1 * d1 / 2.) / math.sqrt(2 * math.pi)
+        discounted_k = r * K * np.exp(-r * t)
+        first_term = (-S * pdf_d1 * iv) / (2 * sqrt_t)
+
+        greeks = {
+            "delta": np.where(is_put, ndtr(d1) - 1.0, ndtr(d1)),
+            "gamma": pdf_d1 / (S * iv * sqrt_t),
+            "theta": np.where(is_put, first_term + discounted_k * ndtr(-d2), first_term - discounted_k * ndtr(d2)) / 365.0,
+            "vega": S * pdf_d1 * sqrt_t * 0.01,
+        }
+    shape = np.broadcast(is_put, S, K, t, r, iv).shape
+    return {name: np.broadcast_to(values, shape).astype(float) for name, values in greeks.items()}
+
+def calculate_price_batch(flag, S, K, t, r, iv):
+    """
+    Black-Scholes option prices, vectorized like calculate_greeks_batch.
+    Returns a float array; degenerate rows (non-positive price, IV or expiry) are NaN.
+    """
+    from scipy.special import ndtr
+
+    is_put = np.asarray(flag) == 'p'
+    S, K, t, r, iv = (np.asarray(a, dtype=float) for a in (S, K, t, r, iv))
+    with np.errstate(all='ignore'):
+        sqrt_t = np.sqrt(t)
+        d1 = (np.log(S / K) + (r + iv * iv / 2.) * t) / (iv * sqrt_t)
+        d2 = d1 - iv * sqrt_t
+        discounted_k = K * np.exp(-r * t)
+        price = np.where(is_put, discounted_k * ndtr(-d2) - S * ndtr(-d1), S * ndtr(d1) - discounted_k * ndtr(d2))
+    degenerate = ~((S > 0) & (K > 0) & (t > 0) & (iv > 0))
+    return np.where(degenerate, np.nan, price).astype(float)
+
+# Quoted IVs outside this range are treated as stale (yfinance reports ~1e-5 off-hours)
+STALE_IV_RANGE = (0.01, 5.0)
+# Volatilities implied_volatility_batch searches
+IV_SOLVER_RANGE = (1e-4, 10.0)
+
+def implied_volatility_batch(flag, price, S, K, t, r, max_iter=50, tol=1e-6):
+    """
+    Backs the Black-Scholes implied volatility out of option prices for a whole
+    chain at once, vectorized like calculate_greeks_batch.
+    Safeguarded Newton: each row keeps a bracket within IV_SOLVER_RANGE, takes the
+    Newton step while it stays inside and bisects otherwise, so rows with vanishing
+    vega (deep in or out of the money) still converge.
+    tol: relative price error at which a row counts as solved
+    Returns a float array; NaN where the price violates the no-arbitrage bounds
+    (at or below intrinsic value, at or above the spot or discounted strike), the
+    inputs are degenerate or no volatility in IV_SOLVER_RANGE reproduces the price.
+    """
+    from scipy.special import ndtr
+
+    arrays = np.broadcast_arrays(np.asarray(flag) == 'p', *(np.asarray(a, dtype=float) for a in (price, S, K, t, r)))
+    shape = arrays[0].shape
+    is_put, price, S, K, t, r = (a.ravel() for a in arrays)
+    with np.errstate(all='ignore'):
+        discounted_k = K * np.exp(-r * t)
+        lower = np.where(is_put, np.maximum(discounted_k - S, 0.0), np.maximum(S - discounted_k, 0.0))
+        upper = np.where(is_put, discounted_k, S)
+        solvable = (S > 0) & (K > 0) & (t > 0) & (price > lower) & (price < upper)
+
+        # Brenner-Subrahmanyam starting point, close for near-the-money options
+        sigma = np.clip(np.sqrt(2 * math.pi / t) * price / S, *IV_SOLVER_RANGE)
+        sigma = np.where(np.isfinite(sigma), sigma, 0.5)
+        solved = np.zeros(price.shape, dtype=bool)
+        # Iterate on the unsolved rows only; most converge in a handful of steps
+        rows = np.flatnonzero(solvable)
+        low = np.full(len(rows), IV_SOLVER_RANGE[0])
+        high = np.full(len(rows), IV_SOLVER_RANGE[1])
+        for _ in range(max_iter):
+            if len(rows) == 0:
+                break
+            v, p, s, k, dk, sqrt_t = sigma[rows], price[rows], S[rows], K[rows], discounted_k[rows], np.sqrt(t[rows])
+            d1 = (np.log(s / k) + (r[rows] + v * v / 2.) * t[rows]) / (v * sqrt_t)
+            d2 = d1 - v * sqrt_t
+            diff = np.where(is_put[rows], dk * ndtr(-d2) - s * ndtr(-d1), s * ndtr(d1) - dk * ndtr(d2)) - p
+            converged = np.abs(diff) <= tol * p
+            solved[rows[converged]] = True
+            # The price rises with volatility, so the root stays inside [low, high]
+            high = np.where(diff > 0, v, high)
+            low = np.where(diff < 0, v, low)
+            vega = s * np.exp(-d1 * d1 / 2.) / math.sqrt(2 * math.pi) * sqrt_t
+            newton = v - diff / vega
+            sigma[rows] = np.where(converged, v, np.where((newton > low) & (newton < high), newton, (low + high) / 2.))
+            keep = ~converged & (high - low > 1e-12)
+            rows, low, high = rows[keep], low[keep], high[keep]
+    return np.where(solved, sigma, np.nan).reshape(shape)
+
+def delta_strike_bounds(flag, S, t, r, iv, delta_min, delta_max, slack=1e-6):
+    """
+    Strike window [strike_min, strike_max] inside which a contract's Black-Scholes
+    delta can fall in [delta_min, delta_max], given its time to expiry and IV.
+    Inverts the delta range to a d1 range once (two ndtri calls) and maps it to
+    strikes with a single exp per row, so it is much cheaper than the greeks.
+    slack widens the d1 range so rounding never excludes a contract that the exact
+    delta would keep. Rows with zero/NaN IV or expiry get NaN bounds.
+    """
+    from scipy.special import ndtri
+
+    offset = 1.0 if flag == 'p' else 0.0  # put delta = N(d1) - 1
+    t = np.asarray(t, dtype=float)
+    iv = np.asarray(iv, dtype=float)
+    with np.errstate(all='ignore'):
+        d1_min = ndtri(np.clip(delta_min + offset, 0.0, 1.0)) - slack
+        d1_max = ndtri(np.clip(delta_max + offset, 0.0, 1.0)) + slack
+        vol_t = iv * np.sqrt(t)
+        drift = (r + iv * iv / 2.) * t
+        # d1 falls as the strike rises, so the upper d1 bound gives the lower strike
+        strike_min = S * np.exp(drift - d1_max * vol_t)
+        strike_max = S * np.exp(drift - d1_min * vol_t)
+    degenerate = ~(np.isfinite(vol_t) & (vol_t > 0))
+    return np.where(degenerate, np.nan, strike_min), np.where(degenerate, np.nan, strike_max)
+
 def get_live_or_close_price(ticker):
     """
     Checks if the market is open. If so, fetches the live price.
     Otherwise, returns the last closing price.
     """
-    market_tz = pytz.timezone('America/New_York')
-    market_open = time(9, 30)
-    market_close = time(16, 0)
-
-    # FIX: Use timezone-aware datetime objects to avoid DeprecationWarning
-    now_et = datetime.now(market_tz)
+    cached = market_cache.get('spot', ticker.ticker)
+    if cached is not None:
+        return cached
 
-    is_market_hours = (market_open <= now_et.time() <= market_close) and (0 <= now_et.weekday() <= 4)
     price_type = "UNKNOWN"
 
-    if is_market_hours:
+    if is_market_hours():
         try:
-            live_price = ticker.history(period='1d', interval='1m')['Close'].iloc[-1]
+            live_price = _yahoo(lambda: ticker.history(period='1d', interval='1m'), 'history')['Close'].iloc[-1]
             if not pd.isna(live_price):
                 price_type = "LIVE"
+                market_cache.set('spot', ticker.ticker, (live_price, price_type))
                 return live_price, price_type
         except Exception:
             pass
 
-    close_price = ticker.history(period='1d')['Close'].iloc[-1]
+    close_price = _yahoo(lambda: ticker.history(period='1d'), 'history')['Close'].iloc[-1]
     price_type = "CLOSE"
+    if not pd.isna(close_price):
+        market_cache.set('spot', ticker.ticker, (close_price, price_type))
     return close_price, price_type
+
+def _last_close(data, symbol):
+    """
+    Last non-NaN close for one symbol out of a yf.download(group_by='ticker') frame.
+    """
+    try:
+        closes = data[symbol]['Close'] if isinstance(data.columns, pd.MultiIndex) else data['Close']
+        closes = closes.dropna()
+        return closes.iloc[-1] if not closes.empty else np.nan
+    except (KeyError, AttributeError, TypeError):
+        return np.nan
+
+def get_market_context(ticker_symbols, refresh=False):
+    """
+    Resolves spot prices for a whole ticker universe plus the risk-free rate with a
+    single bulk yf.download request (1-minute bars while the market is open, daily
+    bars otherwise), instead of one or two history() calls per ticker.
+    Cached values are reused. Tickers the bulk response leaves NaN fall back to
+    get_live_or_close_price, and a missing rate falls back to get_risk_free_rate.
+    refresh: skip cached values and re-fetch everything (background prefetch).
+    Returns a MarketContext.
+    """
+    with metrics.timer('stage_seconds', stage='price_fetch'):
+        return _fetch_market_context(ticker_symbols, refresh)
+
+def _fetch_market_context(ticker_symbols, refresh=False):
+    ticker_symbols = [s for s in dict.fromkeys(ticker_symbols) if s]
+    prices = {}
+    risk_free_rate = None
+    if not refresh:
+        for ticker_symbol in ticker_symbols:
+            cached = market_cache.get('spot', ticker_symbol)
+            if cached is not None:
+                prices[ticker_symbol] = cached
+        risk_free_rate = market_cache.get('rate', RATE_SYMBOL)
+
+    to_fetch = [s for s in ticker_symbols if s not in prices]
+    if risk_free_rate is None:
+        to_fetch.append(RATE_SYMBOL)
+    if to_fetch:
+        live = is_market_hours()
+        price_type = "LIVE" if live else "CLOSE"
+        try:
+            data = _yahoo(lambda: yahoo_finance().download(
+                to_fetch, period='1d', interval='1m' if live else '1d',
+                group_by='ticker', auto_adjust=False, progress=False,
+            ), 'download')
+        except Exception as e:
+            logger.warning(f"Bulk price download failed, falling back to per-ticker requests: {e}")
+            data = None
+
+        for ticker_symbol in to_fetch:
+            close = _last_close(data, ticker_symbol) if data is not None else np.nan
+            if pd.isna(close):
+                continue
+            if ticker_symbol == RATE_SYMBOL:
+                # The price is given as a percentage, so divide by 100
+                risk_free_rate = close / 100
+                market_cache.set('rate', RATE_SYMBOL, risk_free_rate)
+            else:
+                prices[ticker_symbol] = (close, price_type)
+                market_cache.set('spot', ticker_symbol, prices[ticker_symbol])
+
+    for ticker_symbol in ticker_symbols:
+        if ticker_symbol not in prices:
+            try:
+                prices[ticker_symbol] = get_live_or_close_price(yahoo_finance().Ticker(ticker_symbol))
+            except Exception as e:
+                logger.warning(f"Could not get current price for {ticker_symbol}: {e}")
+                prices[ticker_symbol] = (np.nan, "UNKNOWN")
+    if risk_free_rate is None:
+        risk_free_rate = get_risk_free_rate()
+    return MarketContext(prices, risk_free_rate)
@@ -0,0 +1,244 @@
+import bisect
+import logging
+import threading
+import time
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in seconds, from single-chain screens to full scans
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# name -> (prometheus type, help text); names are exported with the registry prefix
+METRICS = {
+    'stage_seconds': ('histogram', "Time spent per scan stage: price_fetch, expiration_listing and chain_fetch (network, cache misses only), iv_repair, greeks, filtering (whole per-chain screen, including its greeks and result_assembly)."),
+    'iv_repaired_total': ('counter', "Stale implied volatilities re-solved from option prices (repairIv)."),
+    'filter_rows_total': ('counter', "Rows left after each screening stage, per result list."),
+    'ticker_seconds': ('histogram', "Per-ticker latency: from the ticker's first request starting (not the wait before it) until its results were ready."),
+    'tickers_total': ('counter', "Tickers scanned, by outcome (ok, skipped, failed)."),
+    'scans_total': ('counter', "Completed scans."),
+    'scan_seconds': ('histogram', "Wall time of complete scans."),
+    'cache_hits_total': ('counter', "Market data cache hits, by kind."),
+    'cache_misses_total': ('counter', "Market data cache misses, by kind."),
+    'cache_shared_hits_total': ('counter', "In-process cache misses served by the shared cache, by kind."),
+    'cache_bytes': ('gauge', "Estimated size of the market data cache."),
+    'yahoo_requests_total': ('counter', "Yahoo request attempts by call, with those throttled and those that failed for good."),
+    'yahoo_retries_total': ('counter', "Yahoo requests retried after a transient error or throttling, by call."),
+    'yahoo_concurrency_limit': ('gauge', "Yahoo requests allowed in flight; halves on throttling and recovers on success."),
+}
+
+# Shared by every timer() call while metrics are disabled
+_NOOP_TIMER = nullcontext()
+
+class _Timer:
+    __slots__ = ('registry', 'name', 'labels', 'start')
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.registry.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+class MetricsRegistry:
+    """
+    In-process counters, gauges and histograms for scan instrumentation.
+
+    Every recording method returns immediately while the registry is disabled, and
+    timer() hands out one shared no-op context manager, so instrumented code pays
+    about one attribute check per call. Values are keyed by metric name and a sorted
+    tuple of label pairs; snapshot() exposes them as plain dicts and
+    render_prometheus() in the Prometheus text exposition format.
+    """
+
+    def __init__(self, prefix='wtf_options', enabled=False, buckets=DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._collectors = []
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges.setdefault(name, {})[tuple(sorted(labels.items()))] = value
+
+    def observe(self, name, seconds, **labels):
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                # [per-bucket counts (last one is +Inf), sum, count]
+                histogram = series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            histogram[0][bisect.bisect_left(self.buckets, seconds)] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def timer(self, name, **labels):
+        """
+        Context manager observing the wall time of its block into histogram name.
+        """
+        if not self.enabled:
+            return _NOOP_TIMER
+        return _Timer(self, name, labels)
+
+    def add_collector(self, collect):
+        """
+        Registers a callable polled at export time, returning an iterable of
+        (name, labels, value) samples for metrics owned elsewhere (e.g. cache stats).
+        """
+        self._collectors.append(collect)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+    def _collected(self):
+        gauges = {}
+        for collect in self._collectors:
+            try:
+                for name, labels, value in collect():
+                    gauges.setdefault(name, {})[tuple(sorted(labels.items()))] = value
+            except Exception as e:
+                logger.warning(f"Metrics collector failed: {e}")
+        return gauges
+
+    def snapshot(self):
+        """
+        Current values as plain dicts: {'counters': {name: {labels: value}},
+        'gauges': {...}, 'histograms': {name: {labels: {'count', 'sum', 'buckets'}}}},
+        where labels is a tuple of (label, value) pairs.
+        """
+        collected = self._collected()
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            gauges = {name: dict(series) for name, series in self._gauges.items()}
+            histograms = {
+                name: {
+                    key: {'count': count, 'sum': total, 'buckets': dict(zip(self.buckets + (float('inf'),), buckets))}
+                    for key, (buckets, total, count) in series.items()
+                }
+                for name, series in self._histograms.items()
+            }
+        for name, series in collected.items():
+            target = counters if METRICS.get(name, ('gauge',))[0] == 'counter' else gauges
+            target.setdefault(name, {}).update(series)
+        return {'counters': counters, 'gauges': gauges, 'histograms': histograms}
+
+    def stage_summary(self):
+        """
+        {stage: {'count', 'seconds', 'mean'}} from stage_seconds, for display.
+        """
+        summary = {}
+        for key, histogram in self.snapshot()['histograms'].get('stage_seconds', {}).items():
+            stage = dict(key).get('stage', '')
+            summary[stage] = {
+                'count': histogram['count'],
+                'seconds': histogram['sum'],
+                'mean': histogram['sum'] / histogram['count'] if histogram['count'] else 0.0,
+            }
+        return summary
+
+    def render_prometheus(self):
+        """
+        All metrics in the Prometheus text exposition format (version 0.0.4).
+        """
+        snapshot = self.snapshot()
+        series_by_name = {}
+        for group in ('counters', 'gauges', 'histograms'):
+            series_by_name.update(snapshot[group])
+
+        lines = []
+        for name in sorted(series_by_name):
+            full_name = f"{self.prefix}_{name}"
+            kind, help_text = METRICS.get(name, ('untyped', name))
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            for key, value in sorted(series_by_name[name].items()):
+                if name not in snapshot['histograms']:
+                    lines.append(f"{full_name}{_labels(key)} {_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in value['buckets'].items():
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else _number(bound)
+                    lines.append(f"{full_name}_bucket{_labels(key + (('le', le),))} {cumulative}")
+                lines.append(f"{full_name}_sum{_labels(key)} {_number(value['sum'])}")
+                lines.append(f"{full_name}_count{_labels(key)} {value['count']}")
+        return "\n".join(lines) + "\n"
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(key):
+    if not key:
+        return ""
+    return "{" + ",".join(f'{label}="{_escape(value)}"' for label, value in key) + "}"
+
+def _number(value):
+    return repr(float(value)) if not isinstance(value, int) else str(value)
+
+metrics = MetricsRegistry()
+
+def configure_metrics(enabled):
+    """
+    Turns recording on or off for the shared registry.
+    """
+    metrics.enabled = bool(enabled)
+
+_server = None
+_server_lock = threading.Lock()
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body = metrics.render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"metrics endpoint: {format % args}")
+
+def start_metrics_server(port, host='0.0.0.0'):
+    """
+    Serves the shared registry at http://<host>:<port>/metrics from a daemon thread.
+    Safe to call repeatedly (e.g. on every Streamlit rerun); only the first call binds.
+    Returns the server.
+    """
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name='metrics-server', daemon=True).start()
+            logger.info(f"Serving Prometheus metrics on {host}:{port}/metrics")
+        return _server
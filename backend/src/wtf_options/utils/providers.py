@@ -0,0 +1,206 @@
+import threading
+import time
+import zlib
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from .market_data import (
+    MARKET_TZ, MarketContext, calculate_greeks_batch, calculate_price_batch, get_expirations, get_market_context,
+    get_option_chain, yahoo_finance,
+)
+from .snapshots import OptionChain, Snapshot
+
+# A data provider is any object with these methods, which is all a scan needs:
+#     market_context(ticker_symbols) -> MarketContext for the scan universe
+#     expirations(ticker_symbol)     -> option expiration strings ('YYYY-MM-DD')
+#     option_chain(ticker_symbol, exp_str) -> object with .calls and .puts DataFrames
+#     today()                        -> date that DTE is measured from
+# expirations and option_chain are called from worker threads.
+
+class YahooProvider:
+    """
+    Live data from Yahoo Finance, through the market_data TTL cache.
+    """
+
+    def __init__(self):
+        self._tickers = {}
+        self._lock = threading.Lock()
+
+    def _ticker(self, ticker_symbol):
+        # One yf.Ticker per symbol, so the chain requests reuse the expiration
+        # map its options call already downloaded
+        with self._lock:
+            if ticker_symbol not in self._tickers:
+                self._tickers[ticker_symbol] = yahoo_finance().Ticker(ticker_symbol)
+            return self._tickers[ticker_symbol]
+
+    def market_context(self, ticker_symbols):
+        return get_market_context(ticker_symbols)
+
+    def expirations(self, ticker_symbol):
+        return get_expirations(self._ticker(ticker_symbol))
+
+    def option_chain(self, ticker_symbol, exp_str):
+        return get_option_chain(self._ticker(ticker_symbol), exp_str)
+
+    def today(self):
+        return date.today()
+
+class SnapshotProvider:
+    """
+    Replays a recorded snapshot directory (see SnapshotStore). DTE is measured from
+    the snapshot's date, so replays are reproducible.
+    """
+
+    def __init__(self, path):
+        self.snapshot = Snapshot(path)
+
+    def market_context(self, ticker_symbols):
+        return MarketContext(self.snapshot.prices, self.snapshot.risk_free_rate)
+
+    def expirations(self, ticker_symbol):
+        return self.snapshot.expirations(ticker_symbol)
+
+    def option_chain(self, ticker_symbol, exp_str):
+        return self.snapshot.option_chain(ticker_symbol, exp_str)
+
+    def today(self):
+        return self.snapshot.as_of.astimezone(MARKET_TZ).date()
+
+# First day of SyntheticProvider's spot random walk
+SPOT_WALK_START = date(2020, 1, 1)
+
+def synthetic_tickers(count):
+    """
+    count distinct made-up symbols ('SYN0000', 'SYN0001', ...) for SyntheticProvider.
+    """
+    return [f"SYN{i:04d}" for i in range(count)]
+
+class SyntheticProvider:
+    """
+    Generates realistic, deterministic option chains locally, for benchmarks and
+    offline development. Any symbol can be requested; the same (seed, symbol,
+    expiration) always produces the same chain, whatever order threads ask in.
+
+    Chains have yfinance's columns, weekly expirations, a strike ladder around spot,
+    an IV smile, Black-Scholes bid/ask/last and liquidity that decays away from the
+    money.
+    expirations: weekly expirations per ticker
+    strikes: strikes per expiration (each has a call and a put)
+    nan_volume / nan_open_interest: fraction of rows with NaN volume / open interest
+    quoted_delta: fraction of rows carrying a quoted 'delta'; 0 (like Yahoo) omits the
+        column entirely, otherwise the remaining rows are NaN (missing delta)
+    stale_iv: fraction of rows quoting a near-zero impliedVolatility, as yfinance does
+        off-hours (prices still follow the true IV)
+    latency: seconds each expirations/option_chain call sleeps, to mimic the network
+    spot_volatility: annualized volatility of a daily random walk the spot follows
+        from SPOT_WALK_START to the as-of date (0: the same spot on every date), so
+        providers for successive dates make a price history (e.g. for backtests)
+    """
+
+    def __init__(self, expirations=8, strikes=40, nan_volume=0.05, nan_open_interest=0.05,
+                 quoted_delta=0.0, risk_free_rate=0.045, as_of=None, seed=0, latency=0.0, stale_iv=0.0,
+                 spot_volatility=0.0):
+        self.n_expirations = expirations
+        self.n_strikes = strikes
+        self.nan_volume = nan_volume
+        self.nan_open_interest = nan_open_interest
+        self.quoted_delta = quoted_delta
+        self.risk_free_rate = risk_free_rate
+        self.as_of = as_of or datetime.now(MARKET_TZ)
+        self.seed = seed
+        self.latency = latency
+        self.stale_iv = stale_iv
+        self.spot_volatility = spot_volatility
+
+    def _rng(self, *keys):
+        return np.random.default_rng([self.seed, *keys])
+
+    def _profile(self, ticker_symbol):
+        """
+        (spot, base IV) for a symbol.
+        """
+        rng = self._rng(zlib.crc32(ticker_symbol.encode()))
+        spot, base_iv = float(np.exp(rng.uniform(np.log(5), np.log(800)))), float(rng.uniform(0.15, 0.7))
+        days = (self.today() - SPOT_WALK_START).days
+        if self.spot_volatility and days > 0:
+            # The same steps for every as-of date, so successive dates share one path
+            steps = self._rng(zlib.crc32(ticker_symbol.encode()), 0).normal(0.0, self.spot_volatility / np.sqrt(365), days)
+            spot *= float(np.exp(steps.sum()))
+        return spot, base_iv
+
+    def market_context(self, ticker_symbols):
+        prices = {s: (round(self._profile(s)[0], 2), "CLOSE") for s in dict.fromkeys(ticker_symbols) if s}
+        return MarketContext(prices, self.risk_free_rate)
+
+    def today(self):
+        return self.as_of.astimezone(MARKET_TZ).date()
+
+    def expirations(self, ticker_symbol):
+        if self.latency:
+            time.sleep(self.latency)
+        today = self.today()
+        first_friday = today + timedelta(days=(4 - today.weekday()) % 7)
+        return tuple((first_friday + timedelta(weeks=i)).isoformat() for i in range(self.n_expirations))
+
+    def option_chain(self, ticker_symbol, exp_str):
+        if self.latency:
+            time.sleep(self.latency)
+        spot, base_iv = self._profile(ticker_symbol)
+        spot = round(spot, 2)
+        exp_date = date.fromisoformat(exp_str)
+        rng = self._rng(zlib.crc32(ticker_symbol.encode()), exp_date.toordinal())
+
+        step = 0.5 if spot < 25 else 1.0 if spot < 100 else 2.5 if spot < 250 else 5.0
+        first = max(round(spot / step) - self.n_strikes // 2, 1)
+        strike = (first + np.arange(self.n_strikes)) * step
+        dte = (exp_date - self.today()).days
+        t = max(dte, 0.5) / 365.0
+        log_moneyness = np.log(strike / spot)
+        iv = base_iv * (1 + 1.5 * log_moneyness ** 2 - 0.3 * log_moneyness) * (1 + 0.1 / np.sqrt(t * 52))
+        last_trade = pd.Timestamp(self.as_of).tz_convert('UTC')
+        return OptionChain(
+            calls=self._side(rng, 'c', ticker_symbol, exp_date, spot, strike, t, iv, log_moneyness, last_trade),
+            puts=self._side(rng, 'p', ticker_symbol, exp_date, spot, strike, t, iv, log_moneyness, last_trade),
+        )
+
+    def _side(self, rng, flag, ticker_symbol, exp_date, spot, strike, t, iv, log_moneyness, last_trade):
+        n = len(strike)
+        iv = iv * rng.normal(1.0, 0.02, n)
+        mid = calculate_price_batch(flag, spot, strike, t, self.risk_free_rate, iv)
+        spread = np.maximum(0.01, np.round(mid * 0.04, 2))
+        bid = np.maximum(np.round(mid - spread / 2, 2), 0.0)
+        ask = np.round(bid + spread, 2)
+        last_price = np.maximum(np.round(mid * rng.normal(1.0, 0.03, n), 2), 0.01)
+        liquidity = np.exp(-8 * np.abs(log_moneyness)) / np.sqrt(t * 52)
+        volume = rng.poisson(1500 * liquidity).astype(float)
+        open_interest = rng.poisson(8000 * liquidity).astype(float)
+        volume[rng.random(n) < self.nan_volume] = np.nan
+        open_interest[rng.random(n) < self.nan_open_interest] = np.nan
+        in_the_money = strike < spot if flag == 'c' else strike > spot
+
+        frame = pd.DataFrame({
+            'contractSymbol': [f"{ticker_symbol}{exp_date:%y%m%d}{flag.upper()}{int(k * 1000):08d}" for k in strike],
+            'lastTradeDate': last_trade,
+            'strike': strike,
+            'lastPrice': last_price,
+            'bid': bid,
+            'ask': ask,
+            'change': 0.0,
+            'percentChange': 0.0,
+            'volume': volume,
+            'openInterest': open_interest,
+            'impliedVolatility': iv,
+            'inTheMoney': in_the_money,
+            'contractSize': 'REGULAR',
+            'currency': 'USD',
+        })
+        if self.quoted_delta > 0:
+            delta = calculate_greeks_batch(flag, spot, strike, t, self.risk_free_rate, iv)['delta']
+            delta[rng.random(n) >= self.quoted_delta] = np.nan
+            frame['delta'] = delta
+        if self.stale_iv > 0:
+            frame.loc[rng.random(n) < self.stale_iv, 'impliedVolatility'] = 1e-5
+        return frame
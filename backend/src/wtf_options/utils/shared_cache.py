@@ -0,0 +1,191 @@
+import hashlib
+import json
+import logging
+import os
+import struct
+import tempfile
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+
+from .snapshots import OptionChain
+
+logger = logging.getLogger(__name__)
+
+# Entry header: wall-clock (epoch) time the value was fetched and expires
+_HEADER = struct.Struct('>dd')
+_IPC_OPTIONS = pa.ipc.IpcWriteOptions(compression='zstd')
+
+def encode(kind, value):
+    """
+    Serializes a market data value: option chains as one zstd-compressed Arrow IPC
+    stream (both sides, tagged with 'side'), everything else as JSON.
+    """
+    if kind == 'chain':
+        frame = pd.concat([value.calls.assign(side='c'), value.puts.assign(side='p')], ignore_index=True)
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema, options=_IPC_OPTIONS) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    if kind == 'spot':
+        price, price_type = value
+        value = [None if pd.isna(price) else float(price), price_type]
+    return json.dumps(value).encode()
+
+def decode(kind, data):
+    """
+    Inverse of encode. Chains come back as an OptionChain of two DataFrames.
+    """
+    if kind == 'chain':
+        frame = pa.ipc.open_stream(data).read_all().to_pandas()
+        side = frame.pop('side')
+        return OptionChain(
+            calls=frame.loc[side == 'c'].reset_index(drop=True),
+            puts=frame.loc[side == 'p'].reset_index(drop=True),
+        )
+    value = json.loads(data)
+    if kind == 'expirations':
+        return tuple(value)
+    if kind == 'spot':
+        return (float('nan') if value[0] is None else value[0], value[1])
+    return value
+
+def _entry_name(kind, key):
+    key = key if isinstance(key, tuple) else (key,)
+    return ':'.join([kind, *map(str, key)])
+
+class SharedStore:
+    """
+    Market data cache shared by several processes or pods, behind the in-process
+    TTLCache (see TTLCache.shared). Values are stored encoded, with the time they
+    were fetched and a per-entry TTL, so one replica's fetch serves the others
+    until it expires. Subclasses implement _read / _write on raw bytes.
+    A failing store is logged and treated as a miss; scans then fetch from Yahoo.
+    """
+
+    def get(self, kind, key):
+        """
+        Returns (value, fetched_at, expires_at) for a live entry, or None.
+        """
+        try:
+            data = self._read(_entry_name(kind, key))
+            if data is None:
+                return None
+            fetched_at, expires_at = _HEADER.unpack_from(data)
+            if expires_at <= time.time():
+                return None
+            return decode(kind, data[_HEADER.size:]), fetched_at, expires_at
+        except Exception as e:
+            logger.warning(f"Shared cache read failed for {kind} {key}: {e}")
+            return None
+
+    def set(self, kind, key, value, ttl, fetched_at):
+        try:
+            data = _HEADER.pack(fetched_at, fetched_at + ttl) + encode(kind, value)
+            self._write(_entry_name(kind, key), data, ttl)
+        except Exception as e:
+            logger.warning(f"Shared cache write failed for {kind} {key}: {e}")
+
+class DiskStore(SharedStore):
+    """
+    Shared store on a directory every replica mounts (e.g. a ReadWriteMany volume).
+    One file per entry, named by a hash of the key and replaced atomically; expired
+    files are removed when read.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.root, hashlib.sha1(name.encode()).hexdigest())
+
+    def _read(self, name):
+        try:
+            with open(self._path(name), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        if _HEADER.unpack_from(data)[1] <= time.time():
+            try:
+                os.remove(self._path(name))
+            except FileNotFoundError:
+                pass
+            return None
+        return data
+
+    def _write(self, name, data, ttl):
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, self._path(name))
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+class RedisStore(SharedStore):
+    """
+    Shared store on a Redis-compatible server; entries expire server-side (SET EX).
+    client: any object with redis-py's get(name) / set(name, value, ex=seconds),
+    e.g. redis.Redis.from_url(url) or LocalRedis for tests.
+    """
+
+    def __init__(self, client, prefix='wtf:'):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url, prefix='wtf:'):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("cache.shared.backend 'redis' needs the redis package (uv sync --extra redis)") from e
+        return cls(redis.Redis.from_url(url, socket_timeout=2), prefix)
+
+    def _read(self, name):
+        return self.client.get(self.prefix + name)
+
+    def _write(self, name, data, ttl):
+        self.client.set(self.prefix + name, data, ex=max(int(ttl), 1))
+
+class LocalRedis:
+    """
+    In-process stand-in for a Redis server: the get / set(ex=) subset RedisStore
+    uses, with expiry. For tests and single-process development.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            value, expires = self._data.get(name, (None, 0))
+            if expires <= time.monotonic():
+                self._data.pop(name, None)
+                return None
+            return value
+
+    def set(self, name, value, ex=None):
+        with self._lock:
+            self._data[name] = (value, time.monotonic() + ex if ex else float('inf'))
+        return True
+
+def make_shared_store(config):
+    """
+    Builds the shared store the cache.shared config section asks for:
+    {'backend': 'disk', 'path': ...}, {'backend': 'redis', 'url': ...} or
+    {'backend': 'none'} / empty for none (returns None).
+    """
+    backend = (config or {}).get('backend', 'none')
+    if backend in (None, 'none'):
+        return None
+    if backend == 'disk':
+        return DiskStore(config['path'])
+    if backend == 'redis':
+        return RedisStore.from_url(config['url'], config.get('prefix', 'wtf:'))
+    raise ValueError(f"Unknown cache.shared.backend {backend!r} (expected none, disk or redis)")
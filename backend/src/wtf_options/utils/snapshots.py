@@ -0,0 +1,155 @@
+import json
+import logging
+import os
+from collections import namedtuple
+from datetime import datetime
+
+# pandas and pyarrow are imported where chains are read or written: listing
+# snapshots (the dashboard's sidebar) must not pay for them
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = "%Y%m%dT%H%M%S"
+
+# Stand-in for yfinance's option_chain() result when replaying
+OptionChain = namedtuple('OptionChain', ['calls', 'puts'])
+
+class SnapshotStore:
+    """
+    Timestamped on-disk snapshots of the market data a scan fetched, so screens can
+    be re-run against the exact same market state without hitting Yahoo.
+
+    Each snapshot is a directory under root:
+        <root>/<YYYYmmddTHHMMSS>/context.json          as-of time, spot prices, risk-free rate
+        <root>/<YYYYmmddTHHMMSS>/chains/<SYMBOL>.arrow  all fetched chains for one ticker
+
+    Snapshots taken within the same second get a counter suffix
+    (<YYYYmmddTHHMMSS>-001, -002, ...), which still sorts by time.
+
+    Chains are stored as uncompressed Arrow IPC files (one row per contract, tagged
+    with side and expirationDate) so replay can memory-map them instead of parsing.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def names(self):
+        """
+        Snapshot names, oldest first.
+        """
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root) if os.path.isfile(os.path.join(self.root, name, 'context.json')))
+
+    def latest(self):
+        names = self.names()
+        return os.path.join(self.root, names[-1]) if names else None
+
+    def _create(self, name):
+        """
+        Creates a new, empty snapshot directory (with its chains/ subdirectory)
+        and returns its path. Creation is exclusive, so a snapshot never shares a
+        directory with another one taken in the same second.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        suffix = 0
+        while True:
+            path = os.path.join(self.root, name if suffix == 0 else f"{name}-{suffix:03d}")
+            try:
+                os.mkdir(path)
+            except FileExistsError:
+                suffix += 1
+                continue
+            os.mkdir(os.path.join(path, 'chains'))
+            return path
+
+    def write(self, as_of, prices, risk_free_rate, universe):
+        """
+        Persists one scan's market data.
+        as_of: timezone-aware datetime the data was fetched at
+        prices: {symbol: (price, price_type)}
+        universe: [(symbol, current_price, [(exp_str, dte, opt_chain), ...]), ...]
+        Returns the snapshot directory.
+        """
+        import pandas as pd
+        import pyarrow as pa
+
+        path = self._create(as_of.strftime(SNAPSHOT_FORMAT))
+
+        for ticker_symbol, _, chains in universe:
+            frames = []
+            for exp_str, _, opt_chain in chains:
+                for side, frame in (('c', opt_chain.calls), ('p', opt_chain.puts)):
+                    frames.append(frame.assign(side=side, expirationDate=exp_str))
+            if not frames:
+                continue
+            table = pa.Table.from_pandas(pd.concat(frames, ignore_index=True), preserve_index=False)
+            with pa.OSFile(os.path.join(path, 'chains', f"{ticker_symbol}.arrow"), 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+
+        context = {
+            'asOf': as_of.isoformat(),
+            'riskFreeRate': float(risk_free_rate),
+            'prices': {symbol: [None if pd.isna(price) else float(price), price_type] for symbol, (price, price_type) in prices.items()},
+        }
+        # context.json is written last and marks the snapshot as complete
+        with open(os.path.join(path, 'context.json'), 'w') as f:
+            json.dump(context, f, indent=2)
+        logger.info(f"Wrote market snapshot {path}")
+        return path
+
+class Snapshot:
+    """
+    Read side of one snapshot directory. Chain files are memory-mapped, so only the
+    pages a scan touches are read from disk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'context.json')) as f:
+            context = json.load(f)
+        self.as_of = datetime.fromisoformat(context['asOf'])
+        self.risk_free_rate = context['riskFreeRate']
+        self.prices = {
+            symbol: (float('nan') if price is None else price, price_type)
+            for symbol, (price, price_type) in context['prices'].items()
+        }
+        self._tables = {}
+
+    def _table(self, ticker_symbol):
+        if ticker_symbol not in self._tables:
+            chain_path = os.path.join(self.path, 'chains', f"{ticker_symbol}.arrow")
+            if os.path.exists(chain_path):
+                import pyarrow as pa
+                # Zero-copy: the table's buffers point straight into the mapped file
+                self._tables[ticker_symbol] = pa.ipc.open_file(pa.memory_map(chain_path, 'r')).read_all()
+            else:
+                self._tables[ticker_symbol] = None
+        return self._tables[ticker_symbol]
+
+    def table(self, ticker_symbol):
+        """
+        All of a ticker's recorded contracts as one Arrow table (the chain columns
+        plus 'side' and 'expirationDate'), or None when the snapshot lacks it.
+        """
+        return self._table(ticker_symbol)
+
+    def expirations(self, ticker_symbol):
+        table = self._table(ticker_symbol)
+        if table is None:
+            return ()
+        return tuple(sorted(set(table.column('expirationDate').to_pylist())))
+
+    def option_chain(self, ticker_symbol, exp_str):
+        table = self._table(ticker_symbol)
+        if table is None:
+            raise KeyError(f"No snapshot data for {ticker_symbol}")
+        import pyarrow.compute as pc
+
+        frame = table.filter(pc.equal(table.column('expirationDate'), exp_str)).to_pandas()
+        sides = frame.pop('side')
+        frame = frame.drop(columns='expirationDate')
+        return OptionChain(
+            calls=frame[sides == 'c'].reset_index(drop=True),
+            puts=frame[sides == 'p'].reset_index(drop=True),
+        )
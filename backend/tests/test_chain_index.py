@@ -0,0 +1,76 @@
+"""
+ChainIndex.nearest against a brute-force pass over the same rows.
+"""
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from wtf_options.services.chain_index import ChainIndex  # noqa: E402
+from wtf_options.services.options_service import build_superset, screen_target_delta  # noqa: E402
+from wtf_options.utils.market_data import MARKET_TZ  # noqa: E402
+from wtf_options.utils.providers import SyntheticProvider, synthetic_tickers  # noqa: E402
+
+
+def _brute_force(index, target, count):
+    # The count smallest |abs(delta) - target| per group
+    distance = np.abs(np.abs(index.delta) - target)
+    return {
+        group: np.sort(distance[(index.group == group) & np.isfinite(distance)])[:count]
+        for group in np.unique(index.group)
+    }
+
+
+def _assert_nearest(index, target, count):
+    slots, distance = index.nearest(target, count)
+    expected = _brute_force(index, target, count)
+    for group, reference in expected.items():
+        np.testing.assert_allclose(np.sort(distance[index.group[slots] == group]), reference)
+
+
+@pytest.mark.parametrize('flag', ['p', 'c'])
+@pytest.mark.parametrize('seed', range(20))
+def test_random_non_monotone_deltas(flag, seed):
+    # Smooth deltas with a random share replaced by 0 or 1 (what zero DTE computes)
+    rng = np.random.default_rng(seed)
+    n = 60
+    strike = np.tile(np.arange(80.0, 80.0 + n // 3), 3)
+    delta = np.clip(1 - (strike - 80) / 20 + rng.normal(0, 0.05, n), 0, 1)
+    jumps = rng.random(n) < 0.3
+    delta[jumps] = rng.integers(0, 2, jumps.sum())
+    delta = -delta if flag == 'p' else delta
+    if flag == 'p':
+        delta = delta[::-1]
+    frame = pd.DataFrame({
+        'ticker': 'X', 'expirationDate': np.repeat(['a', 'b', 'c'], n // 3), 'strike': strike, 'currentPrice': 90.0,
+    })
+    index = ChainIndex(frame, delta, flag)
+    for target in (0.05, 0.2, 0.5, 0.9):
+        for count in (1, 3):
+            _assert_nearest(index, target, count)
+
+
+@pytest.mark.parametrize('flag, result_key', [('p', 'puts'), ('c', 'calls')])
+def test_target_delta_with_mixed_deltas_at_zero_dte(flag, result_key):
+    # On an expiration day quoted deltas sit next to computed ones of 0 or 1
+    tickers = ','.join(synthetic_tickers(4))
+    filters = {'DTE_MIN': 0, 'DTE_MAX': 10, 'MIN_VOLUME': 0, 'MIN_OPEN_INTEREST': 0,
+               'TARGET_PUT_DELTA': 0.2, 'TARGET_CALL_DELTA': 0.2, 'TARGET_STRIKES': 3}
+    params = {'putTickers': tickers, 'callTickers': tickers, 'filters': filters}
+    provider = SyntheticProvider(expirations=2, quoted_delta=0.6, as_of=MARKET_TZ.localize(datetime(2025, 1, 3, 10)))
+    superset = build_superset(params, dte_max=10, provider=provider)
+    table = screen_target_delta(superset, params)[result_key]
+    assert (table['DTE'] == 0).any()
+
+    frame, greeks, _ = superset.sides[result_key]
+    quoted = frame['delta'].to_numpy(dtype=float)
+    delta = np.where(np.isnan(quoted) | (quoted == 0), greeks['delta'], quoted)
+    frame = frame.assign(distance=np.abs(np.abs(delta) - 0.2))
+    picked = frame['contractSymbol'].isin(table['contractSymbol'])
+    for _, group in frame.groupby(['ticker', 'expirationDate']):
+        reference = np.sort(group['distance'].dropna().to_numpy())[:3]
+        np.testing.assert_allclose(np.sort(group.loc[picked[group.index], 'distance'].to_numpy()), reference)
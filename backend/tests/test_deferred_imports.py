@@ -0,0 +1,53 @@
+"""
+yfinance, scipy and py_vollib must stay unimported until a scan needs them, so the
+dashboard's first paint and the CLI start fast. Each case imports in a fresh
+interpreter, since this process may already have loaded them.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+BACKEND = os.path.join(ROOT, "backend", "src")
+
+# The same entry points benchmarks/bench_import.py times. "dashboard" is what
+# dashboard.py imports before the first paint (Streamlit aside)
+CASES = {
+    "dashboard": ["yaml", "wtf_options.utils.metrics", "wtf_options.utils.snapshots"],
+    "cli": ["wtf_options.cli"],
+    "options_service": ["wtf_options.services.options_service"],
+}
+DEFERRED = ("yfinance", "scipy", "py_vollib")
+
+_SCAN = """
+from wtf_options.services.options_service import INCOME_STRATEGIES, run_scan
+from wtf_options.utils.providers import SyntheticProvider, synthetic_tickers
+
+tickers = ",".join(synthetic_tickers(2))
+run_scan({"putTickers": tickers, "callTickers": tickers, "filters": FILTERS}, INCOME_STRATEGIES, provider=SyntheticProvider())
+"""
+
+
+def _loaded(code):
+    """
+    Runs code in a fresh interpreter and returns the deferred libraries it left
+    in sys.modules.
+    """
+    probe = f"{code}\nimport json, sys\nprint(json.dumps([name for name in {DEFERRED!r} if name in sys.modules]))"
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [BACKEND, os.environ.get("PYTHONPATH")]))}
+    output = subprocess.run([sys.executable, "-c", probe], check=True, capture_output=True, text=True, env=env, cwd=ROOT).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("modules", CASES.values(), ids=CASES.keys())
+def test_startup_defers_heavy_imports(modules):
+    assert _loaded("\n".join(f"import {name}" for name in modules)) == []
+
+
+def test_scan_loads_pricing_libraries():
+    # Guards the test above against passing because the probe never sees a load
+    filters = "import yaml\nFILTERS = {k.upper(): v for k, v in yaml.safe_load(open('config.yaml'))['filters'].items()}"
+    assert "scipy" in _loaded(f"{filters}\n{_SCAN}")
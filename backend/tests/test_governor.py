@@ -0,0 +1,41 @@
+"""
+What the request governor treats as Yahoo throttling.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from wtf_options.utils.governor import is_throttled  # noqa: E402
+
+
+class YFRateLimitError(Exception):
+    pass
+
+
+class HTTPError(Exception):
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.response = type('Response', (), {'status_code': status_code})()
+
+
+@pytest.mark.parametrize('error', [
+    YFRateLimitError("Rate limited. Try after a while."),
+    HTTPError("Client Error", 429),
+    Exception("HTTP Error 429: Too Many Requests"),
+    Exception("unexpected status code: 429"),
+])
+def test_rate_limits(error):
+    assert is_throttled(error)
+
+
+@pytest.mark.parametrize('error', [
+    Exception("No options for ticker 429"),
+    Exception("Read timed out after 1429 ms"),
+    Exception("no chain at strike 429.0"),
+    Exception("https://query2.finance.yahoo.com/v7/finance/options/X?date=1742947200&strike=429"),
+    HTTPError("Not Found", 404),
+])
+def test_other_errors(error):
+    assert not is_throttled(error)
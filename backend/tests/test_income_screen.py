@@ -0,0 +1,60 @@
+"""
+The income screen's delta/OTM% choice, per expiration, against what the
+per-contract screen decided.
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from wtf_options.services.options_service import _screen_income_chain, run_scan  # noqa: E402
+from wtf_options.utils.providers import SyntheticProvider, synthetic_tickers  # noqa: E402
+
+FILTERS = {
+    'DTE_MIN': 0, 'DTE_MAX': 60, 'MIN_VOLUME': 10, 'MIN_OPEN_INTEREST': 0,
+    'PUT_DELTA_MIN': 0.1, 'PUT_DELTA_MAX': 0.3, 'PUT_OTM_PERCENT_MIN': 0, 'PUT_OTM_PERCENT_MAX': 20,
+}
+
+
+def _chain(delta, volume):
+    strike = np.array([90.0, 95.0])
+    return pd.DataFrame({
+        'contractSymbol': ['X250117P00090000', 'X250117P00095000'],
+        'strike': strike,
+        'bid': [0.5, 1.0],
+        'ask': [0.6, 1.1],
+        'lastPrice': [0.55, 1.05],
+        'volume': volume,
+        'openInterest': [100.0, 100.0],
+        'impliedVolatility': [0.3, 0.3],
+        'delta': delta,
+        'expirationDate': '2025-01-17',
+        'DTE': 14,
+    })
+
+
+def test_delta_choice_ignores_liquidity():
+    # The expiration's only quoted delta sits on an illiquid row: the expiration is
+    # still checked by delta, so the liquid 95 put without one fails (OTM% would pass it)
+    chain = _chain([-0.2, np.nan], [0.0, 100.0])
+    table = _screen_income_chain(chain, 'p', 'X', 100.0, 0.045, FILTERS, {})
+    assert table.empty
+
+
+def test_otm_fallback_without_any_delta():
+    chain = _chain([np.nan, np.nan], [0.0, 100.0])
+    table = _screen_income_chain(chain, 'p', 'X', 100.0, 0.045, FILTERS, {})
+    assert list(table['strike']) == [95.0]
+
+
+def test_repaired_iv_drives_the_delta_filter():
+    # Off-hours chains: no quoted delta (as from Yahoo) and stale IVs. With repairIv
+    # the deltas computed from the re-solved IVs are filtered on, not OTM%
+    params = {'putTickers': ','.join(synthetic_tickers(3)), 'filters': {**FILTERS, 'MIN_VOLUME': 0}}
+    provider = SyntheticProvider(expirations=3, stale_iv=1.0)
+    repaired = run_scan({**params, 'repairIv': True}, ('csp',), provider=provider)['puts']
+    assert len(repaired) and repaired['delta'].abs().between(0.1, 0.3).all()
+    stale = run_scan(params, ('csp',), provider=provider)['puts']
+    assert not stale['delta'].abs().between(0.1, 0.3).all()
@@ -0,0 +1,52 @@
+"""
+Greek reuse across rescans with a ScanState.
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from wtf_options.services.incremental import ScanState  # noqa: E402
+from wtf_options.services.options_service import _screen_buy_chain  # noqa: E402
+
+FILTERS = {'DTE_MIN': 0, 'DTE_MAX': 60, 'BUY_CALL_DELTA_MIN': 0.4, 'BUY_CALL_DELTA_MAX': 1.0}
+
+
+def _chain(delta):
+    return pd.DataFrame({
+        'contractSymbol': ['X250131C00100000'],
+        'strike': [100.0],
+        'ask': [3.0],
+        'volume': [100.0],
+        'openInterest': [100.0],
+        'impliedVolatility': [0.3],
+        'delta': [delta],
+        'expirationDate': '2025-01-31',
+        'DTE': 28,
+    })
+
+
+def _rescan(state, chain):
+    stage_counts = {}
+    memory = state.memory('bullish_calls', 'X', 100.0, 0.045)
+    table = _screen_buy_chain(chain, 'c', 'X', 100.0, 0.045, FILTERS, stage_counts, memory)
+    state.store('bullish_calls', 'X', 100.0, 0.045, memory, table)
+    return table, stage_counts
+
+
+def test_quoted_delta_rows_are_not_remembered():
+    state = ScanState()
+    table, _ = _rescan(state, _chain(0.55))
+    assert table['gamma'].isna().all()  # quoted delta: no greeks computed
+
+    # The quote is gone: the greeks must be computed, not the NaNs carried over
+    table, stage_counts = _rescan(state, _chain(np.nan))
+    assert stage_counts.get('reused', 0) == 0 and stage_counts['greeks'] == 1
+    assert table['gamma'].notna().all()
+
+    # Unchanged inputs now reuse what was computed
+    again, stage_counts = _rescan(state, _chain(np.nan))
+    assert stage_counts['reused'] == 1 and stage_counts['greeks'] == 0
+    pd.testing.assert_frame_equal(again, table)
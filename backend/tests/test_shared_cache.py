@@ -0,0 +1,113 @@
+"""
+Round trips through the shared market data stores: DiskStore, and RedisStore on
+the in-process LocalRedis.
+"""
+import math
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from wtf_options.utils.shared_cache import DiskStore, LocalRedis, RedisStore  # noqa: E402
+from wtf_options.utils.snapshots import OptionChain  # noqa: E402
+
+
+@pytest.fixture(params=['disk', 'redis'])
+def store(request, tmp_path):
+    if request.param == 'disk':
+        return DiskStore(str(tmp_path / 'shared'))
+    return RedisStore(LocalRedis())
+
+
+def _chain():
+    def side(flag):
+        return pd.DataFrame({
+            'contractSymbol': [f'X250117{flag.upper()}0000{strike}000' for strike in (90, 95, 100)],
+            'strike': [90.0, 95.0, 100.0],
+            'bid': [1.0, 1.5, np.nan],
+            'volume': [10.0, np.nan, 3.0],
+            'inTheMoney': [False, False, True],
+        })
+    return OptionChain(calls=side('c'), puts=side('p'))
+
+
+def test_chain_round_trip(store):
+    chain = _chain()
+    fetched_at = time.time()
+    store.set('chain', ('X', '2025-01-17'), chain, 60, fetched_at)
+    value, stored_at, expires_at = store.get('chain', ('X', '2025-01-17'))
+    pd.testing.assert_frame_equal(value.calls, chain.calls, check_dtype=False)
+    pd.testing.assert_frame_equal(value.puts, chain.puts, check_dtype=False)
+    assert (stored_at, expires_at) == (fetched_at, fetched_at + 60)
+
+
+@pytest.mark.parametrize('kind, key, value', [
+    ('expirations', 'X', ('2025-01-17', '2025-01-24')),
+    ('spot', 'X', (101.5, 'live')),
+    ('rate', '^IRX', 0.0432),
+])
+def test_json_round_trip(store, kind, key, value):
+    store.set(kind, key, value, 60, time.time())
+    assert store.get(kind, key)[0] == value
+
+
+def test_missing_spot_round_trips_as_nan(store):
+    store.set('spot', 'X', (float('nan'), None), 60, time.time())
+    price, price_type = store.get('spot', 'X')[0]
+    assert math.isnan(price) and price_type is None
+
+
+def test_expired_entries_miss(store):
+    # Fetched long enough ago that its TTL has run out
+    store.set('spot', 'X', (101.5, 'live'), 5, time.time() - 10)
+    assert store.get('spot', 'X') is None
+    assert store.get('spot', 'unknown') is None
+
+
+def test_disk_store_removes_expired_files(tmp_path):
+    store = DiskStore(str(tmp_path))
+    store.set('spot', 'X', (101.5, 'live'), 5, time.time() - 10)
+    assert store.get('spot', 'X') is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_local_redis_expires_server_side(monkeypatch):
+    client = LocalRedis()
+    client.set('key', b'value', ex=5)
+    assert client.get('key') == b'value'
+    now = time.monotonic()
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 6)
+    assert client.get('key') is None
+
+
+class _BrokenRedis:
+    def get(self, name):
+        raise ConnectionError("connection refused")
+
+    def set(self, name, value, ex=None):
+        raise ConnectionError("connection refused")
+
+
+def test_redis_errors_are_misses():
+    store = RedisStore(_BrokenRedis())
+    store.set('chain', ('X', '2025-01-17'), _chain(), 60, time.time())  # logged, not raised
+    assert store.get('chain', ('X', '2025-01-17')) is None
+
+
+def test_disk_errors_are_misses(tmp_path):
+    store = DiskStore(str(tmp_path / 'shared'))
+    store.set('spot', 'X', (101.5, 'live'), 60, time.time())
+    # A corrupt entry reads as a miss
+    for name in os.listdir(store.root):
+        with open(os.path.join(store.root, name), 'r+b') as f:
+            f.truncate(20)
+    assert store.get('spot', 'X') is None
+    # So does a volume that went away, and writing to it does not raise
+    shutil.rmtree(store.root)
+    store.set('spot', 'X', (101.5, 'live'), 60, time.time())
+    assert store.get('spot', 'X') is None
@@ -0,0 +1,109 @@
+"""Offline backtest benchmark on synthetic snapshots.
+
+Records --days weekdays of SyntheticProvider market state (spots following a random
+walk) as snapshots, then times run_backtest over them against replaying the income
+screen day by day with run_scan, the loop the backtest replaces. The day-by-day time
+is measured on --loop-days evenly spaced days and extrapolated.
+
+    uv run python benchmarks/bench_backtest.py                   # 250 days x 20 tickers
+    uv run python benchmarks/bench_backtest.py --days 60 --tickers 50
+    uv run python benchmarks/bench_backtest.py --dir /tmp/bt     # keep the snapshots
+
+Also checks that both pick the same contracts on the sampled days; exits non-zero
+when they differ.
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "backend", "src"))
+from wtf_options.services.backtest import run_backtest  # noqa: E402
+from wtf_options.services.options_service import INCOME_STRATEGIES, run_scan  # noqa: E402
+from wtf_options.utils.market_data import MARKET_TZ  # noqa: E402
+from wtf_options.utils.providers import SyntheticProvider, synthetic_tickers  # noqa: E402
+from wtf_options.utils.snapshots import SnapshotStore  # noqa: E402
+
+# Fixed first day so the recorded history, and therefore the work done, never drifts
+START = datetime(2025, 1, 2, 15, 55)
+
+
+def _filters() -> dict:
+    with open(os.path.join(ROOT, "config.yaml")) as f:
+        return {key.upper(): value for key, value in yaml.safe_load(f)["filters"].items()}
+
+
+def record(root: str, days: int, tickers: list[str], expirations: int) -> list[str]:
+    """Writes one snapshot per weekday from START on; returns their paths."""
+    store = SnapshotStore(root)
+    paths = []
+    day = START
+    while len(paths) < days:
+        if day.weekday() < 5:
+            as_of = MARKET_TZ.localize(day)
+            provider = SyntheticProvider(expirations=expirations, quoted_delta=0.9, as_of=as_of, spot_volatility=0.35)
+            context = provider.market_context(tickers)
+            universe = [
+                (s, context.prices[s][0], [(exp_str, None, provider.option_chain(s, exp_str)) for exp_str in provider.expirations(s)])
+                for s in tickers
+            ]
+            paths.append(store.write(as_of, context.prices, context.risk_free_rate, universe))
+        day += timedelta(days=1)
+    return paths
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=250, help="trading days recorded")
+    parser.add_argument("--tickers", type=int, default=20, help="synthetic tickers, each sold as puts and calls")
+    parser.add_argument("--expirations", type=int, default=6, help="weekly expirations per ticker and day")
+    parser.add_argument("--picks", type=int, default=5)
+    parser.add_argument("--loop-days", type=int, default=10, help="days replayed one by one for comparison")
+    parser.add_argument("--dir", help="snapshot directory to (re)use; default: a temporary one")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    tickers = synthetic_tickers(args.tickers)
+    params = {"putTickers": ",".join(tickers), "callTickers": ",".join(tickers), "filters": _filters()}
+    with tempfile.TemporaryDirectory() as scratch:
+        root = args.dir or scratch
+        started = time.perf_counter()
+        existing = SnapshotStore(root).names()
+        paths = [os.path.join(root, name) for name in existing] if existing else record(root, args.days, tickers, args.expirations)
+        print(f"{len(paths)} snapshots x {args.tickers} tickers ready in {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        result = run_backtest(root, params, picks=args.picks)
+        vectorized = time.perf_counter() - started
+
+        step = max(len(paths) // max(args.loop_days, 1), 1)
+        sample = result.days.index[::step][:args.loop_days]
+        mismatches = 0
+        started = time.perf_counter()
+        for day in sample:
+            scan = run_scan({**params, "replaySnapshot": result.days.loc[day, "path"], "topK": args.picks}, INCOME_STRATEGIES)
+            for result_key in ("puts", "calls"):
+                picked = result.trades.loc[(result.trades["entryDate"] == day) & (result.trades["list"] == result_key)]
+                mismatches += list(scan[result_key]["contractSymbol"]) != list(picked["contractSymbol"])
+        per_day = (time.perf_counter() - started) / max(len(sample), 1)
+
+    print(f"{'':<22}{'seconds':>10}{'days/s':>10}")
+    print(f"{'run_backtest':<22}{vectorized:>10.2f}{len(result.days) / vectorized:>10.1f}")
+    print(f"{'run_scan per day':<22}{per_day * len(result.days):>10.2f}{1 / per_day:>10.1f}  (extrapolated)")
+    print(f"{len(result.trades)} trades, {int(result.summary.loc['all', 'settled'])} settled")
+    if mismatches:
+        print(f"MISMATCH picks differ from run_scan on {mismatches} sampled lists")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
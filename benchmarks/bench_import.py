@@ -0,0 +1,109 @@
+"""Cold-start import benchmarks.
+
+Times how long each entry point takes to import in a fresh interpreter (best of
+--repeat runs) and checks that the heavy libraries stay deferred: yfinance, scipy
+and py_vollib must not be imported until a scan needs them. Compares each case with
+benchmarks/import_baseline.json like bench_scan.py does.
+
+    uv run python benchmarks/bench_import.py                     # compare with baseline
+    uv run python benchmarks/bench_import.py --update-baseline   # record new baseline
+
+Exits non-zero when a deferred library is imported at startup, or a case is slower
+than its baseline by more than --tolerance. Baselines are machine-specific.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND = os.path.join(ROOT, "backend", "src")
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "import_baseline.json")
+
+# What each entry point imports before it can serve its first request. "dashboard"
+# is what dashboard.py imports at module load, before the first paint (Streamlit
+# itself aside, which is not installed in every environment this runs in).
+CASES = {
+    "dashboard": ["yaml", "wtf_options.utils.metrics", "wtf_options.utils.snapshots"],
+    "cli": ["wtf_options.cli"],
+    "options_service": ["wtf_options.services.options_service"],
+}
+# Loaded on first use only (see market_data.yahoo_finance and the pricing functions)
+DEFERRED = ("yfinance", "scipy", "py_vollib")
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+for name in sys.argv[1:]:
+    __import__(name)
+seconds = time.perf_counter() - start
+print(json.dumps({"seconds": seconds, "modules": sorted({m.split('.')[0] for m in sys.modules})}))
+"""
+
+
+def measure(modules: list[str], repeat: int) -> dict:
+    """
+    Best-of-repeat import time of modules in fresh interpreters, plus the deferred
+    libraries the import pulled in.
+    """
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [BACKEND, os.environ.get("PYTHONPATH")]))}
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", _PROBE, *modules], check=True, capture_output=True, text=True, env=env,
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        "seconds": round(min(run["seconds"] for run in runs), 4),
+        "deferredLoaded": [name for name in DEFERRED if name in runs[-1]["modules"]],
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per case; the fastest counts")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f).get("cases", {})
+
+    print(f"{'case':<18}{'seconds':>10}{'time':>8}  deferred imports")
+    cases = {}
+    failures = []
+    for name in args.cases:
+        current = measure(CASES[name], args.repeat)
+        cases[name] = current
+        base = baseline.get(name)
+        change = f"{(current['seconds'] / base['seconds'] - 1) * 100:+.0f}%" if base and base.get("seconds") else "—"
+        print(f"{name:<18}{current['seconds']:>10.3f}{change:>8}  {', '.join(current['deferredLoaded']) or 'none'}")
+        if current["deferredLoaded"]:
+            failures.append(f"{name}: imports {', '.join(current['deferredLoaded'])} at startup")
+        if base and base.get("seconds") and current["seconds"] > base["seconds"] * (1 + args.tolerance):
+            failures.append(f"{name}: seconds {current['seconds']} vs baseline {base['seconds']}")
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "machine": {"python": platform.python_version(), "platform": platform.platform()},
+                "cases": {**baseline, **cases},
+            }, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+"""Offline scan benchmarks on synthetic option chains.
+
+Runs analyze_income_options and analyze_buy_options against SyntheticProvider at
+several universe sizes, reports wall time, throughput and peak memory, and compares
+each case with benchmarks/baseline.json. Every case runs in a fresh interpreter, so
+caches and allocator state never leak from one case into the next.
+
+    uv run python benchmarks/bench_scan.py                     # compare with baseline
+    uv run python benchmarks/bench_scan.py --sizes 10 100      # subset
+    uv run python benchmarks/bench_scan.py --update-baseline   # record new baseline
+
+Exits non-zero when a case is slower or uses more memory than its baseline by more
+than --tolerance. Baselines are machine-specific; re-record them on the machine that
+runs the comparison.
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "backend", "src"))
+from wtf_options.services.options_service import analyze_buy_options, analyze_income_options  # noqa: E402
+from wtf_options.utils.market_data import MARKET_TZ  # noqa: E402
+from wtf_options.utils.providers import SyntheticProvider, synthetic_tickers  # noqa: E402
+
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baseline.json")
+DEFAULT_SIZES = (10, 100, 1000)
+# From this many tickers up a case is timed once; a run already takes long enough
+# that repeating it adds little but wall time
+SINGLE_RUN_SIZE = 1000
+MODES = {"income": analyze_income_options, "buy": analyze_buy_options}
+
+# Fixed market date so DTE windows, and therefore the work done, never drift
+AS_OF = MARKET_TZ.localize(datetime(2025, 1, 6, 16, 0))
+
+
+def _filters() -> dict:
+    with open(os.path.join(ROOT, "config.yaml")) as f:
+        return {key.upper(): value for key, value in yaml.safe_load(f)["filters"].items()}
+
+
+def _params(mode: str, size: int, max_workers: int) -> dict:
+    tickers = ",".join(synthetic_tickers(size))
+    params = {"putTickers": tickers, "filters": _filters(), "maxWorkers": max_workers}
+    if mode == "income":
+        params["callTickers"] = tickers
+    return params
+
+
+def _run(mode: str, size: int, max_workers: int) -> dict:
+    provider = SyntheticProvider(as_of=AS_OF)
+    results = MODES[mode](_params(mode, size, max_workers), provider=provider)
+    stage_counts = results.pop("stageCounts")
+    results.pop("requestStats")
+    return {
+        "contracts": sum(stages.get("chain", 0) for stages in stage_counts.values()),
+        "results": sum(len(rows) for rows in results.values()),
+    }
+
+
+def _max_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / 1e6 if sys.platform == "darwin" else max_rss / 1e3
+
+
+def measure(mode: str, size: int, repeat: int, max_workers: int) -> dict:
+    """
+    Best-of-repeat wall time plus memory, measured in this process. scanMb is how
+    far the scan pushed peak RSS above the post-import footprint.
+    """
+    if size >= SINGLE_RUN_SIZE:
+        repeat = 1
+    rss_before = _max_rss_mb()
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        counts = _run(mode, size, max_workers)
+        timings.append(time.perf_counter() - start)
+    peak_rss = _max_rss_mb()
+
+    seconds = min(timings)
+    return {
+        "seconds": round(seconds, 4),
+        "tickersPerSecond": round(size / seconds, 1),
+        "contractsPerSecond": round(counts["contracts"] / seconds, 1),
+        "peakRssMb": round(peak_rss, 1),
+        "scanMb": round(peak_rss - rss_before, 1),
+        **counts,
+    }
+
+
+def measure_isolated(mode: str, size: int, repeat: int, max_workers: int) -> dict:
+    """
+    Runs measure() for one case in a child interpreter and returns its result.
+    """
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--case", mode, str(size),
+         "--repeat", str(repeat), "--max-workers", str(max_workers)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def compare(name: str, current: dict, baseline: dict | None, tolerance: float) -> list[str]:
+    if not baseline:
+        return []
+    regressions = []
+    for metric in ("seconds", "scanMb"):
+        if baseline.get(metric) and current[metric] > baseline[metric] * (1 + tolerance):
+            regressions.append(f"{name}: {metric} {current[metric]} vs baseline {baseline[metric]}")
+    return regressions
+
+
+def _change(current: float, baseline: dict | None, metric: str) -> str:
+    if not baseline or not baseline.get(metric):
+        return "—"
+    return f"{(current / baseline[metric] - 1) * 100:+.0f}%"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case; the fastest counts")
+    parser.add_argument("--max-workers", type=int, default=8)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown/growth vs baseline (0.25 = 25%%)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--case", nargs=2, metavar=("MODE", "SIZE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        mode, size = args.case
+        print(json.dumps(measure(mode, int(size), args.repeat, args.max_workers)))
+        return 0
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f).get("cases", {})
+
+    print(f"{'case':<14}{'seconds':>10}{'tickers/s':>12}{'contracts/s':>14}{'scan MB':>10}{'results':>10}{'time':>8}{'mem':>8}")
+    cases = {}
+    regressions = []
+    for mode in args.modes:
+        for size in args.sizes:
+            name = f"{mode}-{size}"
+            current = measure_isolated(mode, size, args.repeat, args.max_workers)
+            cases[name] = current
+            base = baseline.get(name)
+            print(
+                f"{name:<14}{current['seconds']:>10.3f}{current['tickersPerSecond']:>12.1f}"
+                f"{current['contractsPerSecond']:>14.0f}{current['scanMb']:>10.1f}{current['results']:>10}"
+                f"{_change(current['seconds'], base, 'seconds'):>8}{_change(current['scanMb'], base, 'scanMb'):>8}"
+            )
+            regressions.extend(compare(name, current, base, args.tolerance))
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "machine": {"python": platform.python_version(), "platform": platform.platform()},
+                "cases": {**baseline, **cases},
+            }, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
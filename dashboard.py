@@ -1,16 +1,26 @@
 """Options Screener — Streamlit dashboard."""
 from __future__ import annotations
 
+import importlib
 import logging
 import os
+import statistics
 import sys
+import threading
+import time
+from typing import TYPE_CHECKING
 
-import pandas as pd
 import streamlit as st
 import yaml
 
 sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend", "src"))
-from wtf_options.services.options_service import analyze_buy_options, analyze_income_options  # noqa: E402
+# Only stdlib-light modules here: the screener backend (pandas, yfinance, the pricing
+# stack) is imported on first use by _backend(), after the first paint
+from wtf_options.utils.metrics import configure_metrics, metrics, start_metrics_server  # noqa: E402
+from wtf_options.utils.snapshots import SnapshotStore  # noqa: E402
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 logging.basicConfig(level=logging.WARNING)
 
@@ -29,6 +39,98 @@ with open(_cfg_path) as _f:
 
 FILTERS = _CFG["filters"]
 SCREENER = _CFG["screener"]
+SCAN = _CFG.get("scan", {})
+CACHE = _CFG.get("cache", {})
+SNAPSHOTS = _CFG.get("snapshots", {})
+METRICS = _CFG.get("metrics", {})
+PREFETCH = _CFG.get("prefetch", {})
+RESULTS = _CFG.get("results", {})
+SCENARIOS = _CFG.get("scenarios", {})
+SUPERSET_DTE_MAX = int(SCAN.get("superset_dte_max", 60))
+SNAPSHOT_STORE = SnapshotStore(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), SNAPSHOTS.get("dir", "snapshots"))
+)
+
+configure_metrics(METRICS.get("enabled", False))
+if metrics.enabled:
+    start_metrics_server(int(METRICS.get("port", 9464)))
+
+BACKEND_MODULE = "wtf_options.services.options_service"
+SPREADS_MODULE = "wtf_options.services.spreads"
+SCENARIOS_MODULE = "wtf_options.services.scenarios"
+INCREMENTAL_MODULE = "wtf_options.services.incremental"
+
+
+@st.cache_resource
+def _backend():
+    """Imports the screener backend and configures its cache and request governor from
+    config.yaml, once per server process. Returns the (options_service, market_data)
+    modules."""
+    from wtf_options.utils import market_data
+    from wtf_options.utils.shared_cache import make_shared_store
+
+    market_data.configure_cache(
+        ttls={kind: tuple(ttl) for kind, ttl in CACHE.get("ttl_seconds", {}).items()},
+        max_bytes=int(CACHE.get("max_mb", 256)) * 1024 * 1024,
+        shared=make_shared_store(CACHE.get("shared")),
+    )
+    market_data.configure_governor(
+        rate_per_second=SCAN.get("rate_per_second"),
+        burst=SCAN.get("burst"),
+        max_concurrency=SCAN.get("max_workers"),
+        max_retries=SCAN.get("max_retries"),
+        backoff=SCAN.get("backoff_seconds"),
+    )
+    return importlib.import_module(BACKEND_MODULE), market_data
+
+
+@st.cache_resource
+def _warm_backend() -> threading.Thread:
+    # Imports the backend in the background once the first page is out, so the first
+    # scan rarely waits for it; _backend() then only configures. Python's import lock
+    # makes a concurrent import from the script thread wait instead of importing twice.
+    thread = threading.Thread(target=importlib.import_module, args=(BACKEND_MODULE,), daemon=True)
+    thread.start()
+    return thread
+
+
+@st.cache_resource
+def _prefetch_scheduler():
+    # One scheduler per server process, shared by every session
+    from wtf_options.services.prefetch import PrefetchScheduler
+
+    _backend()
+    universe = ",".join([
+        SCREENER["income"]["put_tickers"], SCREENER["income"]["call_tickers"], SCREENER["buy"]["tickers"],
+    ])
+    return PrefetchScheduler(
+        [s.strip().upper() for s in universe.split(",")],
+        dte_max=max(SUPERSET_DTE_MAX, int(FILTERS["dte_max"])),
+        intervals=tuple(PREFETCH.get("interval_seconds", (90, 3600))),
+        jitter=float(PREFETCH.get("jitter", 0.2)),
+        budget_per_minute=int(PREFETCH.get("budget_per_minute", 120)),
+        max_workers=int(PREFETCH.get("max_workers", 4)),
+    ).start()
+
+
+def _fmt_age(seconds: float) -> str:
+    if seconds < 120:
+        return f"{seconds:.0f}s"
+    if seconds < 7200:
+        return f"{seconds / 60:.0f}m"
+    return f"{seconds / 3600:.1f}h"
+
+
+def _data_age_summary(tickers: set[str]) -> str | None:
+    spot_ages = [age for symbol, age in market_data.data_ages("spot").items() if symbol in tickers]
+    chain_ages = [age for (symbol, _), age in market_data.data_ages("chain").items() if symbol in tickers]
+    if not chain_ages:
+        return None
+    spot = f"spots up to {_fmt_age(max(spot_ages))} old · " if spot_ages else ""
+    return (
+        f"Data age at scan time · {spot}chains median {_fmt_age(statistics.median(chain_ages))}, "
+        f"oldest {_fmt_age(max(chain_ages))}"
+    )
 
 # ── CSS ─────────────────────────────────────────────────────────────────────
 st.markdown("""
@@ -131,6 +233,13 @@ INCOME_COLS = [
     "weeklyReturn", "annualizedReturn",
 ]
 
+SPREAD_COLS = [
+    "ticker", "expirationDate", "DTE", "currentPrice",
+    "shortPutStrike", "longPutStrike", "shortCallStrike", "longCallStrike",
+    "credit", "maxLoss", "breakevenLow", "breakevenHigh", "delta", "theta",
+    "returnOnRisk", "annualizedReturn",
+]
+
 BUY_COLS = [
     "buyScore", "ticker", "expirationDate", "DTE", "strike",
     "currentPrice", "premium", "delta", "impliedVolatility",
@@ -183,36 +292,79 @@ def _col_config(df: pd.DataFrame, sort_col: str) -> dict:
             max_value=max_val,
             help="Delta×100 + Volume÷100 + Open Interest÷1000",
         ),
+        "shortPutStrike": st.column_config.NumberColumn("Short P", format="$%.2f"),
+        "longPutStrike": st.column_config.NumberColumn("Long P", format="$%.2f"),
+        "shortCallStrike": st.column_config.NumberColumn("Short C", format="$%.2f"),
+        "longCallStrike": st.column_config.NumberColumn("Long C", format="$%.2f"),
+        "credit": st.column_config.NumberColumn("Credit", format="$%.2f", help="Net premium collected per share."),
+        "maxLoss": st.column_config.NumberColumn(
+            "Max Loss", format="$%.0f",
+            help="Per position (100 shares): widest side's width − credit. Unbounded for strangles.",
+        ),
+        "breakevenLow": st.column_config.NumberColumn("BE Low", format="$%.2f"),
+        "breakevenHigh": st.column_config.NumberColumn("BE High", format="$%.2f"),
+        "theta": st.column_config.NumberColumn("Θ", format="%.3f", help="Net time decay per share per day."),
+        "returnOnRisk": st.column_config.ProgressColumn(
+            "RoR%",
+            format="%.1f%%",
+            min_value=0.0,
+            max_value=max_val,
+            width="medium",
+            help="Credit / Max Loss (strangles: put strike − credit) — primary spread metric.",
+        ),
         "volume": st.column_config.NumberColumn("Volume", format="%d"),
         "openInterest": st.column_config.NumberColumn("Open Int.", format="%d"),
     }
 
 
-def render_table(data: list[dict], cols: list[str], sort_col: str, label: str) -> None:
-    if not data:
-        st.info(f"No {label} found. Try widening your delta range or DTE window.", icon="📭")
+def render_table(data: pd.DataFrame, cols: list[str], sort_col: str, label: str, streaming: bool = False) -> None:
+    if data.empty:
+        if streaming:
+            st.caption(f"No {label} yet…")
+        else:
+            st.info(f"No {label} found. Try widening your delta range or DTE window.", icon="📭")
         return
 
-    available = [c for c in cols if c in data[0]]
-    df = (
-        pd.DataFrame(data)[available]
-        .sort_values(sort_col, ascending=False)
-        .reset_index(drop=True)
-    )
+    if streaming:
+        # Partial results are redrawn per ticker: only the first page, and no widgets
+        # (their keys must be unique within a run)
+        page_size = int(RESULTS.get("page_size", 50))
+        available = [c for c in cols if c in data.columns]
+        df = options_service.rank_contracts(data, sort_col, top_k=page_size)[available]
+        st.dataframe(df, column_config=_col_config(data, sort_col), use_container_width=True, hide_index=True)
+        st.caption(f"{len(data)} contracts so far")
+        return
 
-    st.dataframe(df, column_config=_col_config(df, sort_col), use_container_width=True, hide_index=True)
+    # Only the current page is ranked in full and sent to the browser
+    page_size = int(RESULTS.get("page_size", 50))
+    pages = -(-len(data) // page_size)
+    page = 1
+    if pages > 1:
+        if st.session_state.get(f"page_{label}", 1) > pages:
+            # The result set shrank since the page was picked
+            st.session_state[f"page_{label}"] = pages
+        page = st.number_input(f"Page (of {pages})", 1, pages, 1, key=f"page_{label}")
+    start = (page - 1) * page_size
+    available = [c for c in cols if c in data.columns]
+    df = options_service.rank_contracts(data, sort_col, top_k=page * page_size).iloc[start:][available].reset_index(drop=True)
+
+    st.dataframe(df, column_config=_col_config(data, sort_col), use_container_width=True, hide_index=True)
 
     col_dl, col_ct, _ = st.columns([1, 1, 5])
     with col_dl:
-        st.download_button(
-            "Export CSV",
-            data=df.to_csv(index=False),
-            file_name=f"{label.lower().replace(' ', '-')}.csv",
-            mime="text/csv",
-            key=f"dl_{label}",
-        )
+        # The full CSV is only built in the rerun the Prepare click starts, so paging
+        # stays proportional to the page; the download itself doesn't rerun
+        if st.button("Prepare CSV", key=f"prep_{label}"):
+            st.download_button(
+                "Export CSV",
+                data=options_service.rank_contracts(data, sort_col)[available].to_csv(index=False),
+                file_name=f"{label.lower().replace(' ', '-')}.csv",
+                mime="text/csv",
+                key=f"dl_{label}",
+                on_click="ignore",
+            )
     with col_ct:
-        st.caption(f"{len(df)} contracts")
+        st.caption(f"{start + 1}–{start + len(df)} of {len(data)} contracts")
 
 
 # ── Sidebar ──────────────────────────────────────────────────────────────────
@@ -226,7 +378,7 @@ with st.sidebar:
         unsafe_allow_html=True,
     )
 
-    screener_type = st.radio("Mode", ["Income", "Buy"], horizontal=True, label_visibility="collapsed")
+    screener_type = st.radio("Mode", ["Income", "Spreads", "Buy"], horizontal=True, label_visibility="collapsed")
 
     st.markdown('<span class="sidebar-label">Tickers</span>', unsafe_allow_html=True)
     if screener_type == "Income":
@@ -242,6 +394,14 @@ with st.sidebar:
             height=68,
             help="Sell covered calls on these. Comma-separated.",
         )
+    elif screener_type == "Spreads":
+        put_tickers_raw = st.text_area(
+            "Tickers to trade spreads on",
+            SCREENER["income"]["put_tickers"],
+            height=90,
+            help="Put and call spreads, strangles and iron condors. Comma-separated.",
+        )
+        call_tickers_raw = ""
     else:
         put_tickers_raw = st.text_area("Tickers to scan", SCREENER["buy"]["tickers"], height=90)
         call_tickers_raw = ""
@@ -259,7 +419,7 @@ with st.sidebar:
         min_oi = st.number_input("Min OI", min_value=0, value=int(FILTERS["min_open_interest"]))
 
     st.markdown('<span class="sidebar-label">Δ Delta — Primary Filter</span>', unsafe_allow_html=True)
-    if screener_type == "Income":
+    if screener_type in ("Income", "Spreads"):
         c5, c6 = st.columns(2)
         with c5:
             put_delta_min = st.number_input("Put Δ Min", 0.0, 1.0, float(FILTERS["put_delta_min"]), 0.01, "%.2f")
@@ -276,7 +436,34 @@ with st.sidebar:
             with c8:
                 put_otm_max = st.number_input("Put OTM% Max", 0.0, 100.0, float(FILTERS["put_otm_percent_max"]), 0.5, "%.1f")
                 call_otm_max = st.number_input("Call OTM% Max", 0.0, 100.0, float(FILTERS["call_otm_percent_max"]), 0.5, "%.1f")
-    else:
+    target_delta = False
+    if screener_type == "Income":
+        target_delta = st.toggle(
+            "Nearest to target Δ",
+            help="Instead of the ranges above: the strikes nearest a target delta in every expiration.",
+        )
+        if target_delta:
+            c13, c14, c15 = st.columns(3)
+            with c13:
+                target_put_delta = st.number_input("Put Δ", 0.0, 1.0, float(FILTERS.get("target_put_delta", 0.20)), 0.01, "%.2f")
+            with c14:
+                target_call_delta = st.number_input("Call Δ", 0.0, 1.0, float(FILTERS.get("target_call_delta", 0.20)), 0.01, "%.2f")
+            with c15:
+                target_strikes = st.number_input("Per expiry", 1, 20, int(FILTERS.get("target_strikes", 3)))
+    if screener_type == "Spreads":
+        st.markdown('<span class="sidebar-label">Spread</span>', unsafe_allow_html=True)
+        st.caption("Short legs use the delta filters above; long legs only DTE and liquidity.")
+        c11, c12 = st.columns(2)
+        with c11:
+            spread_width_min = st.number_input("Width Min", 0.0, 500.0, float(FILTERS.get("spread_width_min", 1.0)), 0.5, "%.1f")
+            spread_min_credit = st.number_input("Min Credit", 0.0, 100.0, float(FILTERS.get("spread_min_credit", 0.10)), 0.05, "%.2f")
+        with c12:
+            spread_width_max = st.number_input("Width Max", 0.0, 500.0, float(FILTERS.get("spread_width_max", 10.0)), 0.5, "%.1f")
+            spread_max_loss = st.number_input(
+                "Max Loss $", 0.0, 100000.0, float(FILTERS.get("spread_max_loss", 1000)), 50.0, "%.0f",
+                help="Per position (100 shares).",
+            )
+    elif screener_type == "Buy":
         c5, c6 = st.columns(2)
         with c5:
             buy_call_delta_min = st.number_input("Call Δ Min", 0.0, 1.0, float(FILTERS["buy_call_delta_min"]), 0.01, "%.2f")
@@ -285,6 +472,28 @@ with st.sidebar:
             buy_call_delta_max = st.number_input("Call Δ Max", 0.0, 1.0, float(FILTERS["buy_call_delta_max"]), 0.01, "%.2f")
             buy_put_delta_min = st.number_input("Put Δ Min", -1.0, 0.0, float(FILTERS["buy_put_delta_min"]), 0.01, "%.2f")
 
+    st.markdown('<span class="sidebar-label">Ranking</span>', unsafe_allow_html=True)
+    top_k = st.number_input(
+        "Top results", min_value=0, value=int(RESULTS.get("top_k", 0)), step=100,
+        help="Keep only the best N contracts per list (0 = all).",
+    )
+    c9, c10 = st.columns(2)
+    with c9:
+        per_ticker_cap = st.number_input("Max / ticker", min_value=0, value=int(RESULTS.get("per_ticker", 0)), help="0 = no cap")
+    with c10:
+        per_expiry_cap = st.number_input("Max / expiry", min_value=0, value=int(RESULTS.get("per_expiry", 0)), help="Per ticker and expiration; 0 = no cap")
+
+    replay_snapshot = None
+    _snapshot_names = SNAPSHOT_STORE.names()
+    if _snapshot_names:
+        st.markdown('<span class="sidebar-label">Market Data</span>', unsafe_allow_html=True)
+        _source = st.selectbox(
+            "Source", ["Live"] + _snapshot_names[::-1], label_visibility="collapsed",
+            help="Replay a recorded snapshot instead of fetching from Yahoo Finance.",
+        )
+        if _source != "Live":
+            replay_snapshot = os.path.join(SNAPSHOT_STORE.root, _source)
+
     st.markdown("<br>", unsafe_allow_html=True)
     run_btn = st.button("▶  Run Scan", type="primary", use_container_width=True)
 
@@ -297,7 +506,7 @@ def _build_params() -> dict:
         "MIN_VOLUME": min_volume,
         "MIN_OPEN_INTEREST": min_oi,
     }
-    if screener_type == "Income":
+    if screener_type in ("Income", "Spreads"):
         filters.update({
             "PUT_DELTA_MIN": put_delta_min,
             "PUT_DELTA_MAX": put_delta_max,
@@ -308,75 +517,312 @@ def _build_params() -> dict:
             "CALL_OTM_PERCENT_MIN": call_otm_min,
             "CALL_OTM_PERCENT_MAX": call_otm_max,
         })
-    else:
+    if target_delta:
+        filters.update({
+            "TARGET_PUT_DELTA": target_put_delta,
+            "TARGET_CALL_DELTA": target_call_delta,
+            "TARGET_PUT_OTM_PERCENT": float(FILTERS.get("target_put_otm_percent", 10.0)),
+            "TARGET_CALL_OTM_PERCENT": float(FILTERS.get("target_call_otm_percent", 10.0)),
+            "TARGET_STRIKES": int(target_strikes),
+        })
+    if screener_type == "Spreads":
+        filters.update({
+            "SPREAD_WIDTH_MIN": spread_width_min,
+            "SPREAD_WIDTH_MAX": spread_width_max,
+            "SPREAD_MIN_CREDIT": spread_min_credit,
+            "SPREAD_MAX_LOSS": spread_max_loss,
+        })
+    elif screener_type == "Buy":
         filters.update({
             "BUY_CALL_DELTA_MIN": buy_call_delta_min,
             "BUY_CALL_DELTA_MAX": buy_call_delta_max,
             "BUY_PUT_DELTA_MIN": buy_put_delta_min,
             "BUY_PUT_DELTA_MAX": buy_put_delta_max,
         })
-    return {
+    params = {
         "screenerType": screener_type.lower(),
         "putTickers": put_tickers_raw.upper().replace(" ", "").strip(","),
         "callTickers": call_tickers_raw.upper().replace(" ", "").strip(",") if call_tickers_raw else "",
         "filters": filters,
+        "maxWorkers": int(SCAN.get("max_workers", 8)),
+        "repairIv": bool(SCAN.get("repair_iv", False)),
+        "topK": int(top_k),
+        "perTickerCap": int(per_ticker_cap),
+        "perExpiryCap": int(per_expiry_cap),
     }
+    if screener_type == "Spreads":
+        # Spreads need both sides of the same tickers (see spreads.spread_params)
+        params["callTickers"] = params["putTickers"]
+    if replay_snapshot:
+        params["replaySnapshot"] = replay_snapshot
+    elif SNAPSHOTS.get("record"):
+        params["snapshotDir"] = SNAPSHOT_STORE.root
+    return params
+
+
+# ── Results rendering ─────────────────────────────────────────────────────────
+def _best(tables: list[pd.DataFrame], col: str) -> float | None:
+    values = [table[col].max() for table in tables if not table.empty]
+    values = [value for value in values if pd.notna(value) and value]
+    return max(values) if values else None
+
+
+def render_scenarios(results: dict, lists: dict[str, str], risk_free_rate: float) -> None:
+    """P&L of one result list's contracts across the spot × IV × time grid in config.yaml,
+    repriced in one pass by services/scenarios.py."""
+    scenarios = importlib.import_module(SCENARIOS_MODULE)
+    vol_shifts = SCENARIOS.get("vol_shifts", list(scenarios.DEFAULT_VOL_SHIFTS))
+    days = SCENARIOS.get("days", list(scenarios.DEFAULT_DAYS))
+    c1, c2, c3 = st.columns(3)
+    with c1:
+        result_key = st.selectbox("List", list(lists), format_func=lists.get, key="scenario_list")
+    with c2:
+        vol_shift = st.select_slider(
+            "IV shift", options=vol_shifts, value=0.0 if 0.0 in vol_shifts else vol_shifts[0],
+            format_func=lambda shift: f"{shift * 100:+.0f} pts",
+        )
+    with c3:
+        days_passed = st.select_slider("Days passed", options=days, value=days[0])
+    table = results.get(result_key)
+    if table is None or table.empty:
+        st.info(f"No {lists[result_key].lower()} to reprice.", icon="📭")
+        return
 
+    cube = scenarios.scenario_cube(
+        {result_key: table}, risk_free_rate,
+        spot_moves=SCENARIOS.get("spot_moves", scenarios.DEFAULT_SPOT_MOVES),
+        vol_shifts=vol_shifts, days=days, result_keys=(result_key,),
+    )
+    total = scenarios.portfolio_pnl(cube).xs(vol_shift, level="volShift", axis=1)
+    total.index = [f"{move:+.1%}" for move in total.index]
+    total.columns = [f"{int(day)}d" for day in total.columns]
+    st.caption(
+        f"Total P&L of one contract of each of the {len(table)} {lists[result_key].lower()}, "
+        f"by underlying move ({vol_shift * 100:+.0f} IV pts)"
+    )
+    st.line_chart(total)
+    st.caption(f"P&L per contract after {days_passed} days — sold contracts gain as they lose value, bought ones as they gain")
+    st.dataframe(
+        scenarios.pnl_table(cube, vol_shift, days_passed),
+        column_config={
+            "ticker": st.column_config.TextColumn("Ticker", width="small"),
+            "contractSymbol": st.column_config.TextColumn("Contract"),
+            "list": None,
+            **{f"{move:+.1%}": st.column_config.NumberColumn(f"{move:+.1%}", format="$%.0f") for move in cube.spot_moves},
+        },
+        use_container_width=True,
+        hide_index=True,
+    )
 
-# ── Run analysis ──────────────────────────────────────────────────────────────
-if run_btn:
-    with st.spinner("Fetching option chains from Yahoo Finance…"):
-        try:
-            params = _build_params()
-            if screener_type == "Income":
-                results = analyze_income_options(params)
-            else:
-                results = analyze_buy_options(params)
-            st.session_state["results"] = results
-            st.session_state["last_screener"] = screener_type
-        except Exception as exc:
-            st.error(f"Analysis failed: {exc}", icon="🛑")
-
-
-# ── Results ───────────────────────────────────────────────────────────────────
-if "results" in st.session_state:
-    results = st.session_state["results"]
-    last_screener = st.session_state["last_screener"]
 
-    if last_screener == "Income":
-        puts = results.get("puts", [])
-        calls = results.get("calls", [])
-        all_returns = [r["annualizedReturn"] for r in puts + calls if r.get("annualizedReturn")]
+def render_results(results: dict, screener: str, risk_free_rate: float | None = None, streaming: bool = False) -> None:
+    if screener == "Income":
+        puts = results.get("puts", pd.DataFrame())
+        calls = results.get("calls", pd.DataFrame())
+        best_return = _best([puts, calls], "annualizedReturn")
 
         m1, m2, m3, m4 = st.columns(4)
         m1.metric("Total", len(puts) + len(calls))
         m2.metric("Puts", len(puts))
         m3.metric("Calls", len(calls))
-        m4.metric("Best Annual%", f"{max(all_returns):.1f}%" if all_returns else "—")
+        m4.metric("Best Annual%", f"{best_return:.1f}%" if best_return else "—")
 
         st.markdown("<br>", unsafe_allow_html=True)
-        t1, t2 = st.tabs(["Cash-Secured Puts", "Covered Calls"])
-        with t1:
-            render_table(puts, INCOME_COLS, "annualizedReturn", "puts")
-        with t2:
-            render_table(calls, INCOME_COLS, "annualizedReturn", "covered calls")
+        tabs = st.tabs(["Cash-Secured Puts", "Covered Calls"] + ([] if streaming else ["Scenarios"]))
+        with tabs[0]:
+            render_table(puts, INCOME_COLS, "annualizedReturn", "puts", streaming)
+        with tabs[1]:
+            render_table(calls, INCOME_COLS, "annualizedReturn", "covered calls", streaming)
+        if not streaming:
+            with tabs[2]:
+                render_scenarios(results, {"puts": "Cash-Secured Puts", "calls": "Covered Calls"}, risk_free_rate)
+    elif screener == "Spreads":
+        tables = {
+            key: results.get(key, pd.DataFrame())
+            for key in ("put_spreads", "call_spreads", "strangles", "iron_condors")
+        }
+        best_ror = _best([tables["put_spreads"], tables["call_spreads"], tables["iron_condors"]], "returnOnRisk")
+
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("Total", sum(len(table) for table in tables.values()))
+        m2.metric("Verticals", len(tables["put_spreads"]) + len(tables["call_spreads"]))
+        m3.metric("Condors", len(tables["iron_condors"]))
+        m4.metric("Best RoR%", f"{best_ror:.1f}%" if best_ror else "—")
+
+        st.markdown("<br>", unsafe_allow_html=True)
+        labels = {
+            "put_spreads": ("Put Credit Spreads", "put spreads"),
+            "call_spreads": ("Call Credit Spreads", "call spreads"),
+            "strangles": ("Short Strangles", "strangles"),
+            "iron_condors": ("Iron Condors", "iron condors"),
+        }
+        for tab, (key, (_, label)) in zip(st.tabs([title for title, _ in labels.values()]), labels.items()):
+            with tab:
+                render_table(tables[key], SPREAD_COLS, "returnOnRisk", label)
     else:
-        bull = results.get("bullish_calls", [])
-        bear = results.get("bearish_puts", [])
-        all_scores = [r["buyScore"] for r in bull + bear if r.get("buyScore")]
+        bull = results.get("bullish_calls", pd.DataFrame())
+        bear = results.get("bearish_puts", pd.DataFrame())
+        best_score = _best([bull, bear], "buyScore")
 
         m1, m2, m3, m4 = st.columns(4)
         m1.metric("Total", len(bull) + len(bear))
         m2.metric("Bullish Calls", len(bull))
         m3.metric("Bearish Puts", len(bear))
-        m4.metric("Best Score", f"{max(all_scores):.0f}" if all_scores else "—")
+        m4.metric("Best Score", f"{best_score:.0f}" if best_score else "—")
 
         st.markdown("<br>", unsafe_allow_html=True)
-        t1, t2 = st.tabs(["Bullish — Calls to Buy", "Bearish — Puts to Buy"])
-        with t1:
-            render_table(bull, BUY_COLS, "buyScore", "bullish calls")
-        with t2:
-            render_table(bear, BUY_COLS, "buyScore", "bearish puts")
+        tabs = st.tabs(["Bullish — Calls to Buy", "Bearish — Puts to Buy"] + ([] if streaming else ["Scenarios"]))
+        with tabs[0]:
+            render_table(bull, BUY_COLS, "buyScore", "bullish calls", streaming)
+        with tabs[1]:
+            render_table(bear, BUY_COLS, "buyScore", "bearish puts", streaming)
+        if not streaming:
+            with tabs[2]:
+                render_scenarios(results, {"bullish_calls": "Bullish Calls", "bearish_puts": "Bearish Puts"}, risk_free_rate)
+
+
+def _accumulate(results: dict, update: dict) -> None:
+    for key, table in update["results"].items():
+        if key not in results:
+            results[key] = table
+        elif not table.empty:
+            results[key] = pd.concat([results[key], table], ignore_index=True)
+
+
+def _scan_state(screener: str):
+    # One ScanState per screener, so a refetch only recomputes the greeks of
+    # contracts whose inputs changed while the results stream in
+    states = st.session_state.setdefault("scan_states", {})
+    if screener not in states:
+        states[screener] = importlib.import_module(INCREMENTAL_MODULE).ScanState()
+    return states[screener]
+
+
+def _superset_key(params: dict) -> tuple:
+    return (screener_type, params["putTickers"], params["callTickers"], params.get("replaySnapshot"))
+
+
+def _refetch_reason(cached: tuple | None, params: dict) -> str | None:
+    # Filters are applied to the cached superset in memory; only these need Yahoo again
+    if cached is None:
+        return "no data yet"
+    key, superset, expires_at = cached
+    if key != _superset_key(params):
+        return "tickers changed"
+    if params["filters"]["DTE_MAX"] > superset.dte_max:
+        return f"DTE Max is beyond the {superset.dte_max} days fetched"
+    if not superset.replay and time.time() > expires_at:
+        return "data is stale"
+    return None
+
+
+# ── Run analysis ──────────────────────────────────────────────────────────────
+params = _build_params()
+supersets = st.session_state.setdefault("supersets", {})
+if run_btn or screener_type in supersets:
+    # Backend modules; everything below that renders results runs inside this branch
+    options_service, market_data = _backend()
+    import pandas as pd  # loaded with the backend, so this costs nothing extra
+
+    strategies = options_service.BUY_STRATEGIES if screener_type == "Buy" else options_service.INCOME_STRATEGIES
+if run_btn and _refetch_reason(supersets.get(screener_type), params):
+    progress = st.progress(0.0, text="Fetching option chains from Yahoo Finance…")
+    live = st.empty()
+    streamed: dict = {}
+
+    def _stream(update: dict) -> None:
+        # Each ticker's results are screened as its chains arrive and shown right away
+        _accumulate(streamed, update)
+        with live.container():
+            render_results(streamed, screener_type, streaming=True)
+
+    # Spreads and target-delta lookups only run on the whole superset
+    streaming = screener_type != "Spreads" and not target_delta
+    try:
+        superset = options_service.build_superset(
+            params, strategies, max(SUPERSET_DTE_MAX, params["filters"]["DTE_MAX"]),
+            progress=lambda completed, total, ticker: progress.progress(
+                completed / max(total, 1), text=f"Fetched {ticker} · {completed}/{total} tickers",
+            ),
+            stream=_stream if streaming else None,
+            state=_scan_state(screener_type) if streaming else None,
+        )
+        supersets[screener_type] = (_superset_key(params), superset, superset.fetched_at + market_data.data_ttl("chain"))
+        st.session_state.setdefault("data_age", {})[screener_type] = None if replay_snapshot else _data_age_summary(
+            set(params["putTickers"].split(",")) | set(params["callTickers"].split(","))
+        )
+    except Exception as exc:
+        st.error(f"Analysis failed: {exc}", icon="🛑")
+    finally:
+        progress.empty()
+        live.empty()
+
+# Every rerun re-screens the cached superset with the current sidebar filters
+results = None
+if screener_type in supersets:
+    if screener_type == "Spreads":
+        results = importlib.import_module(SPREADS_MODULE).screen_spreads(supersets[screener_type][1], params)
+    elif target_delta:
+        results = options_service.screen_target_delta(supersets[screener_type][1], params, strategies)
+    else:
+        results = options_service.screen_superset(supersets[screener_type][1], params, strategies)
+    scanned = st.session_state.setdefault("scanned", {})
+    if run_btn:
+        # Entered/left is reported between Run Scan clicks, not per filter tweak
+        if screener_type in scanned:
+            st.session_state.setdefault("changes", {})[screener_type] = options_service.result_changes(scanned[screener_type], results)
+        scanned[screener_type] = results
+
+
+# ── Results ───────────────────────────────────────────────────────────────────
+if results is not None:
+    _superset = supersets[screener_type][1]
+    _reason = _refetch_reason(supersets[screener_type], params)
+    if _reason and _reason != "data is stale":
+        st.caption(f"{_reason[0].upper()}{_reason[1:]} — showing the last fetched data; Run Scan to refetch.")
+    render_results(results, screener_type, _superset.risk_free_rate)
+
+    stage_counts = results.get("stageCounts", {})
+    if stage_counts:
+        with st.expander("Filter funnel"):
+            st.caption("Contracts left after each screening stage, applied in memory to the fetched chains.")
+            st.dataframe(pd.DataFrame(stage_counts).T, use_container_width=True)
+
+    changes = st.session_state.get("changes", {}).get(screener_type)
+    if changes:
+        entered = [dict(c, list=key) for key, moved in changes.items() for c in moved["entered"]]
+        left = [dict(c, list=key) for key, moved in changes.items() for c in moved["left"]]
+        with st.expander(f"{len(entered)} entered · {len(left)} left since the last scan"):
+            for label, rows in (("Entered", entered), ("Left", left)):
+                if rows:
+                    st.markdown(f"**{label}**")
+                    st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+
+    if metrics.enabled:
+        stage_summary = metrics.stage_summary()
+        if stage_summary:
+            with st.expander("Stage timings"):
+                st.caption("Cumulative since the app started. Fetch stages only count cache misses; filtering includes greeks and result assembly.")
+                st.dataframe(pd.DataFrame(stage_summary).T, use_container_width=True)
+
+    _age = "" if _superset.replay else f"Chains fetched {_fmt_age(time.time() - _superset.fetched_at)} ago · "
+    st.caption(f"{_age}filters apply instantly; Run Scan refetches once the data is stale or the tickers change.")
+    if st.session_state.get("data_age", {}).get(screener_type):
+        st.caption(st.session_state["data_age"][screener_type])
+    _requests = _superset.request_stats
+    if _requests["retries"] or _requests["droppedTickers"]:
+        _dropped = ", ".join(_requests["droppedTickers"]) or "none"
+        st.caption(
+            f"Yahoo requests · {_requests['requests']} made · {_requests['retries']} retried · "
+            f"{_requests['throttled']} throttled · dropped tickers: {_dropped}"
+        )
+
+    _stats = market_data.cache_stats()
+    st.caption(
+        f"Market data cache · {sum(_stats['hits'].values())} hits · "
+        f"{sum(_stats['sharedHits'].values())} from shared · "
+        f"{sum(_stats['misses'].values())} misses · {_stats['bytes'] / 1e6:.1f} MB"
+    )
 
     with st.expander("Glossary"):
         for term, defn in [
@@ -389,6 +835,7 @@ if "results" in st.session_state:
             ("Annual%", "Premium / Collateral × (365/DTE) — primary income metric"),
             ("Collateral", "Cash required: 100 shares × strike price"),
             ("Score", "Buy screener: Delta×100 + Volume÷100 + OI÷1000"),
+            ("RoR%", "Spreads: credit / max loss (strangles: put strike − credit)"),
         ]:
             st.markdown(f"**`{term}`** — {defn}")
 
@@ -404,6 +851,15 @@ else:
         unsafe_allow_html=True,
     )
 
+if PREFETCH.get("enabled"):
+    # Started after the page is out; the caption lands at the bottom of the sidebar
+    _prefetch = _prefetch_scheduler().status()
+    _last = f"refreshed {_fmt_age(time.time() - _prefetch['lastRefresh'])} ago" if _prefetch["lastRefresh"] else "warming up"
+    _next = f" · next in {_fmt_age(_prefetch['nextRefreshIn'])}" if _prefetch["nextRefreshIn"] is not None else ""
+    st.sidebar.caption(f"Prefetch · {_prefetch['tickers']} tickers · {_last}{_next}")
+elif BACKEND_MODULE not in sys.modules:
+    _warm_backend()
+
 st.markdown(
     "<div style='text-align:center;font-size:11px;opacity:0.25;margin-top:48px;"
     "padding-top:16px;border-top:1px solid rgba(255,255,255,0.05);'>"
@@ -51,6 +51,38 @@ def k8s_restart(c):
     c.run(f"kubectl rollout restart deployment/{NS} -n {NS}")
 
 
+@task
+def bench(c, sizes="", update_baseline=False):
+    """Run the offline scan benchmarks (synthetic chains) and compare with the stored baseline."""
+    args = f" --sizes {sizes.replace(',', ' ')}" if sizes else ""
+    if update_baseline:
+        args += " --update-baseline"
+    c.run(f"uv run python benchmarks/bench_scan.py{args}")
+
+
+@task(name="bench-import")
+def bench_import(c, update_baseline=False):
+    """Time cold-start imports and check that yfinance/scipy/py_vollib stay deferred."""
+    c.run(f"uv run python benchmarks/bench_import.py{' --update-baseline' if update_baseline else ''}")
+
+
+@task(name="bench-backtest")
+def bench_backtest(c, days=250, tickers=20):
+    """Time run_backtest on synthetic snapshots against replaying the screen day by day."""
+    c.run(f"uv run python benchmarks/bench_backtest.py --days {days} --tickers {tickers}")
+
+
+@task
+def scan(c, tickers, out, mode="income", processes=0, restart=False):
+    """Headless batch screen of a ticker file, sharded across processes (resumes after a crash)."""
+    args = f" --mode {mode} --out {out}"
+    if processes:
+        args += f" --processes {processes}"
+    if restart:
+        args += " --restart"
+    c.run(f"uv run wtf-scan {tickers}{args}")
+
+
 @task(name="lock-update")
 def lock_update(c):
     """Regenerate requirements.lock for Bazel pip.parse()."""